@@ -0,0 +1,294 @@
+"""Keep ``TransactionAggregate`` in step with ``Transaction``.
+
+Every ORM flush that inserts, updates or deletes transactions applies the
+matching (user, day, type, category) deltas to the rollup table inside the
+same database transaction, using an atomic upsert so concurrent workers
+cannot lose updates. Bulk ``Query.update()``/``Query.delete()`` calls bypass
+the ORM unit of work; callers using them must ``rebuild()`` afterwards, and
+bulk inserts should go through ``bulk_insert()``.
+
+The same writes bump the user's ``DataVersion``, which the API uses for
+ETags and to key its response cache.
+"""
+
+import secrets
+from collections import defaultdict
+
+from sqlalchemy import and_, delete, event, func, insert, inspect, or_, select
+from sqlalchemy.orm import Session
+
+import database
+
+from models.aggregate_model import TransactionAggregate
+from models.data_version_model import DataVersion
+from models.transaction_model import Transaction
+
+KEY_FIELDS = ("user_id", "date", "type", "category")
+TOLERANCE = 0.005
+# Rows per multi-row INSERT; keeps bound parameters under SQLite's limit
+INSERT_CHUNK = 500
+
+aggregate_table = TransactionAggregate.__table__
+transaction_table = Transaction.__table__
+version_table = DataVersion.__table__
+
+
+def _old_value(state, name):
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(state.obj(), name)
+
+
+def _key(values):
+    return tuple(values[name] for name in KEY_FIELDS)
+
+
+def collect_deltas(session):
+    """Return {(user_id, day, type, category): [total, count]} for a pending flush."""
+    deltas = defaultdict(lambda: [0.0, 0])
+
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            delta = deltas[_key({n: getattr(obj, n) for n in KEY_FIELDS})]
+            delta[0] += obj.amount
+            delta[1] += 1
+
+    for obj in session.dirty:
+        if not isinstance(obj, Transaction) or not session.is_modified(obj):
+            continue
+        state = inspect(obj)
+        old = {n: _old_value(state, n) for n in KEY_FIELDS + ("amount",)}
+        delta = deltas[_key(old)]
+        delta[0] -= old["amount"]
+        delta[1] -= 1
+        delta = deltas[_key({n: getattr(obj, n) for n in KEY_FIELDS})]
+        delta[0] += obj.amount
+        delta[1] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            state = inspect(obj)
+            old = {n: _old_value(state, n) for n in KEY_FIELDS + ("amount",)}
+            delta = deltas[_key(old)]
+            delta[0] -= old["amount"]
+            delta[1] -= 1
+
+    return {key: delta for key, delta in deltas.items() if delta[1] or delta[0]}
+
+
+def apply_deltas(conn, deltas):
+    """Atomically add ``deltas`` to the rollup table on ``conn``."""
+    if not deltas:
+        return
+    rows = [
+        {
+            "user_id": user_id,
+            "day": day,
+            "type": type_,
+            "category": category,
+            "total": total,
+            "count": count,
+        }
+        for (user_id, day, type_, category), (total, count) in deltas.items()
+    ]
+    stmt = database.upsert_insert(conn.dialect.name)(aggregate_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[c.name for c in aggregate_table.primary_key],
+        set_={
+            "total": aggregate_table.c.total + stmt.excluded.total,
+            "count": aggregate_table.c.count + stmt.excluded.count,
+        },
+    )
+    conn.execute(stmt, rows)
+
+    emptied = [row for row in rows if row["count"] < 0]
+    if emptied:
+        conn.execute(
+            delete(aggregate_table).where(
+                aggregate_table.c.count <= 0,
+                or_(
+                    *[
+                        and_(
+                            aggregate_table.c.user_id == row["user_id"],
+                            aggregate_table.c.day == row["day"],
+                            aggregate_table.c.type == row["type"],
+                            aggregate_table.c.category == row["category"],
+                        )
+                        for row in emptied
+                    ]
+                ),
+            )
+        )
+
+
+def bump_versions(conn, user_ids):
+    """Give every user in ``user_ids`` a new data version.
+
+    Versions are random rather than counters so they never repeat, even after
+    the table is recreated or restored from a backup while workers still hold
+    responses cached under old versions.
+    """
+    rows = [
+        {"user_id": user_id, "version": secrets.randbits(62)}
+        for user_id in sorted(set(user_ids))
+    ]
+    if not rows:
+        return
+    stmt = database.upsert_insert(conn.dialect.name)(version_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[version_table.c.user_id],
+        set_={"version": stmt.excluded.version},
+    )
+    conn.execute(stmt, rows)
+
+
+def data_version(conn, user_id):
+    """Return the user's current data version (0 before their first write)."""
+    version = conn.execute(
+        select(version_table.c.version).where(version_table.c.user_id == user_id)
+    ).scalar()
+    return version or 0
+
+
+def _touched_users(session):
+    users = set()
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            users.add(obj.user_id)
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and session.is_modified(obj):
+            state = inspect(obj)
+            users.update((obj.user_id, _old_value(state, "user_id")))
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            users.add(_old_value(inspect(obj), "user_id"))
+    users.discard(None)
+    return users
+
+
+def deltas_for_rows(rows):
+    """Return rollup deltas for plain transaction dicts about to be inserted."""
+    deltas = defaultdict(lambda: [0.0, 0])
+    for row in rows:
+        delta = deltas[_key(row)]
+        delta[0] += row["amount"]
+        delta[1] += 1
+    return dict(deltas)
+
+
+def bulk_insert(session, rows):
+    """Insert transaction dicts with multi-row INSERTs and update the rollup.
+
+    Bypasses the ORM unit of work, which on SQLite would issue one INSERT per
+    row. Returns the inserted rows (including ids) in insertion order.
+    """
+    created = []
+    for start in range(0, len(rows), INSERT_CHUNK):
+        chunk = rows[start : start + INSERT_CHUNK]
+        result = session.execute(
+            insert(transaction_table).values(chunk).returning(*transaction_table.c)
+        )
+        created.extend(sorted(result.all(), key=lambda row: row.id))
+    conn = session.connection()
+    apply_deltas(conn, deltas_for_rows(rows))
+    bump_versions(conn, (row["user_id"] for row in rows))
+    return created
+
+
+@event.listens_for(Session, "before_flush")
+def _load_deleted(session, flush_context, instances):
+    # Make sure rows being deleted have their values loaded while they still exist
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            for name in KEY_FIELDS + ("amount",):
+                getattr(obj, name)
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_aggregates(session, flush_context):
+    # new/dirty/deleted and attribute history still show the pre-flush state here
+    conn = session.connection()
+    apply_deltas(conn, collect_deltas(session))
+    bump_versions(conn, _touched_users(session))
+
+
+def _grouped_transactions(user_id=None):
+    t = transaction_table.c
+    stmt = select(
+        t.user_id,
+        t.date,
+        t.type,
+        t.category,
+        func.sum(t.amount),
+        func.count(),
+    ).group_by(t.user_id, t.date, t.type, t.category)
+    if user_id is not None:
+        stmt = stmt.where(t.user_id == user_id)
+    return stmt
+
+
+def rebuild(conn, user_id=None):
+    """Recompute the rollup from scratch for one user, or everyone."""
+    clear = delete(aggregate_table)
+    if user_id is not None:
+        clear = clear.where(aggregate_table.c.user_id == user_id)
+    conn.execute(clear)
+    # Rebuilds follow bulk changes the rollup never saw, so cached responses are stale
+    if user_id is not None:
+        bump_versions(conn, [user_id])
+    else:
+        users = select(transaction_table.c.user_id).union(select(version_table.c.user_id))
+        bump_versions(conn, conn.execute(users).scalars())
+    result = conn.execute(
+        insert(aggregate_table).from_select(
+            ["user_id", "day", "type", "category", "total", "count"],
+            _grouped_transactions(user_id),
+        )
+    )
+    return result.rowcount
+
+
+def check(conn, user_id=None):
+    """Compare the rollup with the transaction table; return a list of mismatches."""
+    expected = {
+        tuple(row[:4]): (row[4], row[5])
+        for row in conn.execute(_grouped_transactions(user_id))
+    }
+    a = aggregate_table.c
+    stmt = select(a.user_id, a.day, a.type, a.category, a.total, a.count)
+    if user_id is not None:
+        stmt = stmt.where(a.user_id == user_id)
+    actual = {tuple(row[:4]): (row[4], row[5]) for row in conn.execute(stmt)}
+
+    mismatches = []
+    for key in expected.keys() | actual.keys():
+        want = expected.get(key, (0.0, 0))
+        got = actual.get(key, (0.0, 0))
+        if want[1] != got[1] or abs(want[0] - got[0]) > TOLERANCE:
+            mismatches.append({"key": key, "expected": want, "actual": got})
+    return mismatches
+
+
+def window_totals(conn, user_id, start, end):
+    """Return [(type, category, total, count)] for days in [start, end]."""
+    a = aggregate_table.c
+    stmt = (
+        select(a.type, a.category, func.sum(a.total), func.sum(a.count))
+        .where(a.user_id == user_id, a.day >= start, a.day <= end)
+        .group_by(a.type, a.category)
+    )
+    return conn.execute(stmt).all()
+
+
+def window_totals_from_transactions(conn, user_id, start, end):
+    """Same result as ``window_totals`` computed with GROUP BY on raw transactions."""
+    t = transaction_table.c
+    stmt = (
+        select(t.type, t.category, func.sum(t.amount), func.count())
+        .where(t.user_id == user_id, t.date >= start, t.date <= end)
+        .group_by(t.type, t.category)
+    )
+    return conn.execute(stmt).all()
@@ -0,0 +1,392 @@
+"""ASGI serving mode.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 4
+
+``GET``/``POST /transactions`` and ``GET /predict`` are async handlers on an
+async SQLAlchemy engine, and model inference and the /predict forecast run
+on a small bounded thread pool so the event loop never waits on
+scikit-learn or NumPy. Every other route
+(login, registration, batch upload, import/export, ...) is the unchanged
+Flask app mounted through a2wsgi's WSGI adapter, which runs it on a pool of
+``FLASK_THREADS`` plain threads.
+
+The async handlers read the same signed Flask session cookie as the Flask
+routes. Requests they cannot authenticate from the cookie alone (no session,
+an expired session with a remember-me cookie, a session-protection mismatch)
+are handed to Flask, which answers them exactly as in WSGI mode.
+With ``SHARD_DATABASE_URLS`` (see shards.py) or ``INGEST_LOG_DIR`` (see
+ingest.py) set the Flask app serves every route.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import make_url, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags
+
+import aggregates
+import categorizer
+import database
+import ingest
+import instrumentation
+import overrides
+import pagination
+import personal_models
+import response_cache
+import shards
+from app import (
+    CORS_EXPOSE_HEADERS,
+    CORS_HEADERS,
+    CORS_METHODS,
+    CORS_ORIGINS,
+    app as flask_app,
+    build_prediction,
+    responses,
+)
+from extensions import db, login_manager
+from models.transaction_model import Transaction, parse_date
+from models.user_model import User
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+psycopg"}
+# Threads running model inference, and how many more requests may queue for them
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", "2"))
+INFERENCE_QUEUE = int(os.environ.get("INFERENCE_QUEUE", "32"))
+# Threads serving the routes handed to the Flask app
+FLASK_THREADS = int(os.environ.get("FLASK_THREADS", "10"))
+
+flask_asgi = WSGIMiddleware(flask_app, workers=FLASK_THREADS)
+_write_lock = (
+    threading.Lock()
+    if flask_app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite")
+    else contextlib.nullcontext()
+)
+
+
+def async_url(url):
+    """Map a sync database URL onto the matching async driver."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {backend!r} databases")
+    if backend == "sqlite" and url.database in (None, "", ":memory:"):
+        raise ValueError("ASGI mode needs a file or server database, not in-memory SQLite")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+class Runtime:
+    """Per-process resources, created on startup inside the serving event loop."""
+
+    def __init__(self):
+        # The Flask engine's URL, with relative SQLite paths already resolved
+        with flask_app.app_context():
+            url = db.engine.url.render_as_string(hide_password=False)
+        self.engine = create_async_engine(
+            async_url(url), **database.engine_options(url)
+        )
+        self.pool_metrics = database.instrument(self.engine.sync_engine)
+        instrumentation.instrument_engine(self.engine.sync_engine)
+        self.executor = ThreadPoolExecutor(
+            max_workers=INFERENCE_THREADS, thread_name_prefix="inference"
+        )
+        self.inference_slots = asyncio.Semaphore(INFERENCE_THREADS + INFERENCE_QUEUE)
+
+    async def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        await self.engine.dispose()
+
+
+runtime = None
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    global runtime
+    runtime = Runtime()
+    # Load the model before taking traffic: a lazy first load takes seconds,
+    # and every request queued on the inference pool would wait behind it
+    if os.path.exists(categorizer.MODEL_PATH):
+        await asyncio.get_running_loop().run_in_executor(
+            runtime.executor, categorizer.get_model
+        )
+    try:
+        yield
+    finally:
+        await runtime.close()
+        runtime = None
+
+
+class FlaskFallback:
+    """An ASGI "response" that lets the Flask app answer the request instead."""
+
+    async def __call__(self, scope, receive, send):
+        await flask_asgi(scope, receive, send)
+
+
+def _session_user(request):
+    """Return (user id, Set-Cookie headers) from the Flask session, or None.
+
+    Runs Flask's own session loading and flask-login's session protection in
+    a request context built from the incoming headers; nothing touches the
+    database.
+    """
+    from flask import session
+
+    client = request.client.host if request.client else None
+    with flask_app.test_request_context(
+        request.url.path,
+        headers=list(request.headers.items()),
+        environ_base={"REMOTE_ADDR": client},
+    ):
+        user_id = session.get("_user_id")
+        if user_id is None or login_manager._session_protection_failed():
+            return None
+        # Re-issue the cookie as Flask would, so permanent sessions keep sliding
+        carrier = flask_app.response_class()
+        flask_app.session_interface.save_session(flask_app, session, carrier)
+        return int(user_id), carrier.headers.getlist("Set-Cookie")
+
+
+async def authenticate(request, conn):
+    """Return (id, username, data version, cookies) for the logged-in user, or None.
+
+    The data version comes back with the username so a cached read costs a
+    single round trip.
+    """
+    with instrumentation.stage("user_load"):
+        found = _session_user(request)
+        if found is None:
+            return None
+        user_id, cookies = found
+        row = (
+            await conn.execute(
+                select(User.username, aggregates.version_table.c.version)
+                .outerjoin(
+                    aggregates.version_table,
+                    aggregates.version_table.c.user_id == User.id,
+                )
+                .where(User.id == user_id)
+            )
+        ).first()
+    if row is None:
+        return None
+    return user_id, row.username, row.version or 0, cookies
+
+
+def json_response(payload, status=200, headers=None, cookies=()):
+    with instrumentation.stage("serialize"):
+        body = flask_app.json.dumps(payload) + "\n"
+    response = Response(body, status, headers, media_type="application/json")
+    for cookie in cookies:
+        response.headers.append("Set-Cookie", cookie)
+    return response
+
+
+async def conditional_get(request, conn, user, build, *parts):
+    """Async twin of ``app.conditional_get``; ETags and cache entries are shared."""
+    user_id, username, version, cookies = user
+    full_path = f"{request.url.path}?{request.url.query}"
+    etag = response_cache.etag_for(user_id, version, username, full_path, *parts)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+
+    if parse_etags(request.headers.get("If-None-Match")).contains(etag):
+        response = Response(status_code=304, headers=headers)
+    else:
+        cached = responses.get(etag)
+        if cached is None:
+            response = await build()
+            if response.status_code != 200:
+                return response
+            responses.put(
+                etag,
+                (response.body, response.status_code, list(response.headers.items())),
+            )
+        else:
+            body, status, cached_headers = cached
+            response = Response(body, status, dict(cached_headers))
+        response.headers.update(headers)
+    for cookie in cookies:
+        response.headers.append("Set-Cookie", cookie)
+    return response
+
+
+def timed(route):
+    """Record a handler in the same request histogram as the Flask routes."""
+
+    def decorate(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            token = instrumentation.set_route(route)
+            started = time.perf_counter()
+            try:
+                response = await handler(request)
+            finally:
+                instrumentation.reset_route(token)
+            # Flask times the requests handed back to it itself
+            if not isinstance(response, FlaskFallback):
+                instrumentation.observe_request(
+                    request.method, route, response.status_code,
+                    time.perf_counter() - started,
+                )
+            return response
+
+        return wrapper
+
+    return decorate
+
+
+@timed("/transactions")
+async def get_transactions(request):
+    async with runtime.engine.connect() as conn:
+        user = await authenticate(request, conn)
+        if user is None:
+            return FlaskFallback()
+        user_id, username, _version, cookies = user
+
+        async def build():
+            try:
+                query = pagination.parse_page_args(request.query_params)
+            except ValueError as e:
+                return json_response({"error": str(e)}, 400, cookies=cookies)
+            try:
+                rows = (
+                    await conn.execute(pagination.page_statement(user_id, query))
+                ).all()
+                items, next_cursor = pagination.render_page(rows, query)
+                headers = {"X-User-Info": json.dumps({"username": username, "id": user_id})}
+                if next_cursor:
+                    headers["X-Next-Cursor"] = next_cursor
+                return json_response(items, headers=headers)
+            except Exception as e:
+                print(f"Error fetching transactions: {str(e)}")
+                return json_response({"error": str(e)}, 500, cookies=cookies)
+
+        return await conditional_get(request, conn, user, build)
+
+
+def _create_transaction(row, user_id):
+    """Categorize and store one transaction; runs on the inference pool.
+
+    The write happens on the same worker thread as the model call: a single
+    hop off the event loop instead of one per statement of the flush, which
+    on a busy loop costs more than the write itself.
+    """
+    with flask_app.app_context():
+        category = categorizer.categorize(
+            [row],
+            override_index=overrides.index_for(user_id),
+            personal_model=personal_models.model_for(user_id),
+        )[0]
+        new_transaction = Transaction(**row, category=category, user_id=user_id)
+        # SQLite allows one writer at a time; queueing this process's writes on
+        # a lock is far cheaper than having them poll busy_timeout
+        with _write_lock:
+            db.session.add(new_transaction)
+            db.session.commit()
+        return new_transaction.to_dict()
+
+
+async def run_inference(fn, *args):
+    """Run ``fn`` on the bounded pool; callers beyond its queue wait their turn."""
+    async with runtime.inference_slots:
+        loop = asyncio.get_running_loop()
+        # Carry the route label over so stage timings on the pool are attributed
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            runtime.executor, functools.partial(context.run, fn, *args)
+        )
+
+
+@timed("/transactions")
+async def add_transaction(request):
+    async with runtime.engine.connect() as conn:
+        user = await authenticate(request, conn)
+    if user is None:
+        return FlaskFallback()
+    user_id, _username, _version, cookies = user
+
+    try:
+        data = await request.json()
+        try:
+            date = parse_date(data.get("date"))
+        except ValueError as e:
+            return json_response({"error": str(e)}, 400, cookies=cookies)
+        row = {
+            "amount": data.get("amount"),
+            "description": data.get("description"),
+            "date": date,
+            "type": data.get("type", "spending"),
+        }
+        created = await run_inference(_create_transaction, row, user_id)
+        return json_response(created, 201, cookies=cookies)
+    except Exception as e:
+        print(f"Error adding transaction: {str(e)}")
+        return json_response({"error": str(e)}, 500, cookies=cookies)
+
+
+def _build_prediction(user_id, today):
+    """``build_prediction`` on a sync connection; runs on the inference pool."""
+    with flask_app.app_context():
+        with db.engine.connect() as conn:
+            return build_prediction(conn, user_id, today)
+
+
+@timed("/predict")
+async def predict(request):
+    today = datetime.now(timezone.utc)
+    async with runtime.engine.connect() as conn:
+        user = await authenticate(request, conn)
+        if user is None:
+            return FlaskFallback()
+
+        async def build():
+            try:
+                result = await run_inference(_build_prediction, user[0], today)
+                return json_response(result)
+            except Exception as e:
+                print(f"Error generating prediction: {str(e)}")
+                return json_response({"error": str(e)}, 500, cookies=user[3])
+
+        return await conditional_get(request, conn, user, build, today.date().isoformat())
+
+
+cors = [
+    Middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ORIGINS,
+        allow_credentials=True,
+        allow_headers=CORS_HEADERS,
+        allow_methods=CORS_METHODS,
+        expose_headers=CORS_EXPOSE_HEADERS,
+    )
+]
+
+# Method mismatches (e.g. CORS preflight OPTIONS) fall through to the Flask mount
+async_routes = [
+    Route("/transactions", get_transactions, methods=["GET"], middleware=cors),
+    Route("/transactions", add_transaction, methods=["POST"], middleware=cors),
+    Route("/predict", predict, methods=["GET"], middleware=cors),
+]
+# The async handlers read the main database only and commit every write;
+# with sharded storage or write-behind ingestion the Flask routes answer
+# everything
+if shards.shards is not None or ingest.writer is not None:
+    async_routes = []
+application = Starlette(
+    routes=[*async_routes, Mount("/", app=flask_asgi)],
+    lifespan=lifespan,
+)
@@ -0,0 +1,95 @@
+"""Compare importing N transactions one POST at a time against one batch POST.
+
+    python benchmarks/bench_batch.py --rows 1000
+
+Runs the Flask app in-process against a throwaway SQLite database.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir.name, 'bench.db')}"
+
+from sqlalchemy import event
+
+from app import app, db
+from generate_training_data import generate_history
+from models.user_model import User
+
+
+def make_rows(n, seed=7):
+    end = datetime(2025, 12, 31)
+    rng = random.Random(seed)
+    rows = []
+    while len(rows) < n:
+        rows.extend(generate_history(end - timedelta(days=365), end, rng=rng))
+    return [
+        {k: row[k] for k in ("description", "amount", "type", "date")}
+        for row in rows[:n]
+    ]
+
+
+def login(client, username):
+    with app.app_context():
+        user = User(username=username)
+        user.set_password("bench")
+        db.session.add(user)
+        db.session.commit()
+    client.post("/login", json={"username": username, "password": "bench"})
+
+
+def count_inserts():
+    counter = {"n": 0}
+
+    def before_execute(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith('INSERT INTO "TRANSACTION"'):
+            counter["n"] += 1
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", before_execute)
+    return counter
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark POST /transactions/batch")
+    parser.add_argument("--rows", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    app.config["TESTING"] = True
+    rows = make_rows(args.rows)
+    inserts = count_inserts()
+
+    with app.test_client() as client:
+        login(client, "bench-single")
+        started = time.perf_counter()
+        for row in rows:
+            assert client.post("/transactions", json=row).status_code == 201
+        single = time.perf_counter() - started
+        single_inserts = inserts["n"]
+
+    with app.test_client() as client:
+        login(client, "bench-batch")
+        inserts["n"] = 0
+        started = time.perf_counter()
+        response = client.post("/transactions/batch", json=rows)
+        assert response.status_code == 201, response.get_json()
+        batch = time.perf_counter() - started
+
+    print(f"{args.rows} rows")
+    print(f"  single POSTs: {single:8.3f}s  {args.rows / single:10.0f} rows/s  "
+          f"{single_inserts} INSERT statements")
+    print(f"  batch POST:   {batch:8.3f}s  {args.rows / batch:10.0f} rows/s  "
+          f"{inserts['n']} INSERT statements")
+    print(f"  speedup:      {single / batch:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Compare the categorizer engines on the same training and held-out data.
+
+    python benchmarks/bench_engines.py --users 20 --noise 0.5
+
+Training rows are synthetic histories from generate_training_data plus
+transactions.csv. ``--noise`` is the share of descriptions rewritten the
+way bank exports show them (upper-cased, a reference number or a city
+appended), so the held-out fifth contains descriptions neither engine saw
+verbatim. For each engine (see engines.py) it reports:
+
+* accuracy   - on the held-out fifth (train_expense_model.split_holdout)
+* size       - of the saved model file
+* load       - joblib.load plus compiling the serving predictor
+* memory     - bytes allocated by that load (tracemalloc)
+* single row - median latency of one compiled features + predict call
+* batch      - predictions per second in batches of 256
+"""
+
+import argparse
+import csv
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import joblib
+
+import engines
+import train_expense_model as training
+from generate_training_data import generate_history
+
+BACKEND = os.path.join(os.path.dirname(__file__), "..")
+CITIES = ["SOFIA", "PLOVDIV", "VARNA", "BURGAS", "RUSE"]
+
+
+def noisy(description, rng):
+    choice = rng.randrange(3)
+    if choice == 0:
+        return description.upper()
+    if choice == 1:
+        return f"{description} #{rng.randrange(10000):04d}"
+    return f"{description} {rng.choice(CITIES)}"
+
+
+def make_columns(users, noise, seed=7):
+    rng = random.Random(seed)
+    end = datetime(2025, 12, 31)
+    rows = []
+    for _ in range(users):
+        rows.extend(generate_history(end - timedelta(days=365), end, rng=rng))
+    with open(os.path.join(BACKEND, "transactions.csv")) as f:
+        rows.extend(csv.DictReader(f))
+    columns = training.Columns()
+    columns.extend(
+        (
+            i + 1,
+            noisy(row["description"], rng) if rng.random() < noise else row["description"],
+            float(row["amount"]),
+            row["category"],
+            date.fromisoformat(row["date"]),
+        )
+        for i, row in enumerate(row for row in rows if row["category"] != "income")
+    )
+    return columns
+
+
+def as_rows(columns):
+    return [
+        {"description": d, "amount": a, "date": day}
+        for d, a, day in zip(columns.descriptions, columns.amounts, columns.dates)
+    ]
+
+
+def bench(engine, columns, directory, singles=2000):
+    pipeline, metadata = training.fit_full(columns, engine)
+    path = os.path.join(directory, f"{engine.name}.joblib")
+    training.save(pipeline, metadata, path, engine)
+
+    loads = []
+    for _ in range(5):
+        started = time.perf_counter()
+        predictor = engines.compile_pipeline(joblib.load(path))
+        loads.append(time.perf_counter() - started)
+    tracemalloc.start()
+    engines.compile_pipeline(joblib.load(path))
+    memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    _, test = training.split_holdout(columns)
+    rows = as_rows(test)
+    predicted = [
+        category
+        for start in range(0, len(rows), 256)
+        for category in predictor.predict(predictor.features(rows[start : start + 256]))
+    ]
+    accuracy = sum(p == c for p, c in zip(predicted, test.categories)) / len(rows)
+
+    latencies = []
+    for row in rows[:singles]:
+        started = time.perf_counter()
+        predictor.predict(predictor.features([row]))
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for start in range(0, len(rows), 256):
+        predictor.predict(predictor.features(rows[start : start + 256]))
+    batch = len(rows) / (time.perf_counter() - started)
+    return {
+        "engine": engine.name,
+        "accuracy": accuracy,
+        "train_s": metadata["train_seconds"],
+        "size_kb": os.path.getsize(path) / 1024,
+        "load_ms": statistics.median(loads) * 1000,
+        "memory_kb": memory / 1024,
+        "single_us": statistics.median(latencies) * 1e6,
+        "batch_rps": batch,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="synthetic one-year histories")
+    parser.add_argument("--noise", type=float, default=0.5, help="share of rewritten descriptions")
+    parser.add_argument(
+        "--engine", action="append", choices=sorted(engines.ENGINES), help="default: all"
+    )
+    args = parser.parse_args(argv)
+
+    columns = make_columns(args.users, args.noise)
+    _, test = training.split_holdout(columns)
+    print(f"{len(columns)} rows, {len(test)} held out, noise {args.noise:.0%}")
+    print(
+        f"{'engine':<8} {'accuracy':>8} {'train s':>8} {'size KB':>8} {'load ms':>8} "
+        f"{'mem KB':>8} {'1-row us':>9} {'batch rows/s':>13}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.engine or sorted(engines.ENGINES):
+            r = bench(engines.get(name), columns, directory)
+            print(
+                f"{r['engine']:<8} {r['accuracy']:>8.4f} {r['train_s']:>8.2f} "
+                f"{r['size_kb']:>8.1f} {r['load_ms']:>8.1f} {r['memory_kb']:>8.0f} "
+                f"{r['single_us']:>9.1f} {r['batch_rps']:>13,.0f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""Measure peak Python memory of GET /transactions/export as history grows.
+
+    python benchmarks/bench_export.py --rows 10000 --rows 100000
+
+Each size is seeded into a throwaway SQLite database; the export is consumed
+chunk by chunk, as a client would, under tracemalloc. A flat peak across sizes
+means nothing proportional to the history is held in memory.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir.name, 'bench.db')}"
+
+from app import app, db
+from benchmarks.bench_predict import seed
+from models.user_model import User
+
+
+def measure(client, query):
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(f"/transactions/export?{query}", buffered=False)
+    size = 0
+    for chunk in response.response:
+        size += len(chunk)
+    response.close()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark GET /transactions/export")
+    parser.add_argument("--rows", type=int, action="append")
+    args = parser.parse_args(argv)
+
+    app.config["TESTING"] = True
+    for rows in args.rows or [10_000, 100_000]:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            user_id = seed(db.engine, rows)
+            user = db.session.get(User, user_id)
+            user.set_password("bench")
+            db.session.commit()
+            username = user.username
+
+        with app.test_client() as client:
+            client.post("/login", json={"username": username, "password": "bench"})
+            print(f"{rows} rows")
+            for query in ("format=csv", "format=ndjson", "format=csv&gzip=1"):
+                elapsed, peak, size = measure(client, query)
+                print(f"  {query:18} {elapsed:7.3f}s  {rows / elapsed:9.0f} rows/s  "
+                      f"peak {peak / 1024:8.0f} KiB  {size / 1024:8.0f} KiB out")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Sustained POST /transactions throughput with and without write-behind ingestion.
+
+    python benchmarks/bench_ingest.py --concurrency 32 --duration 15 --workers 2 --threads 8
+
+Seeds a throwaway SQLite database with one user, then for each mode starts
+``gunicorn app:app`` with ``--workers`` workers of ``--threads`` threads and
+drives it with ``--concurrency`` clients posting transactions for
+``--duration`` seconds:
+
+* commit - every request categorizes and commits its row (the default)
+* ingest - INGEST_LOG_DIR set: requests append to the worker's log and share
+  fsyncs, a background writer group-commits to the database (ingest.py)
+
+SQLite runs with ``--synchronous`` (FULL by default), so a commit waits on
+the disk in both modes. Every tenth client reads its transactions back right
+after posting, which exercises the read-your-writes barrier. After the
+server has shut down the rows in the database are counted against the
+acknowledged POSTs.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+from sqlalchemy import create_engine, func, select, update
+from werkzeug.security import generate_password_hash
+
+from benchmarks import schema
+from benchmarks.bench_predict import seed
+from benchmarks.bench_serving import BACKEND, PASSWORD, free_port, session_cookie, wait_until_up
+from models.transaction_model import Transaction
+from models.user_model import User
+
+DESCRIPTIONS = ["Lunch Subway", "Uber ride", "Groceries Lidl", "Coffee", "Shell fuel"]
+
+
+async def client_loop(client, deadline, latencies, errors, rng, read_back):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.post("/transactions", json={
+                "amount": round(rng.uniform(5, 80), 2),
+                "description": rng.choice(DESCRIPTIONS),
+                "type": "spending",
+                "date": "2025-06-02",
+            })
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            # The cookie now names the logged write; the read waits for it
+            if read_back:
+                page = await client.get("/transactions?limit=1")
+                if page.status_code != 200:
+                    errors.append(f"read {page.status_code}")
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+
+
+async def drive(base_url, cookie, concurrency, duration):
+    warmup, latencies, errors = [], [], []
+    clients = [
+        httpx.AsyncClient(base_url=base_url, headers={"Cookie": cookie}, timeout=30.0)
+        for _ in range(concurrency)
+    ]
+    try:
+        # Warm up: loads the model in the workers
+        await asyncio.gather(*[
+            client_loop(c, time.monotonic() + 1.0, warmup, [], random.Random(i), False)
+            for i, c in enumerate(clients)
+        ])
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*[
+            client_loop(c, deadline, latencies, errors, random.Random(i), i % 10 == 0)
+            for i, c in enumerate(clients)
+        ])
+    finally:
+        for c in clients:
+            await c.aclose()
+    return len(warmup), latencies, errors
+
+
+def run_mode(mode, url, env, args):
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        before = conn.execute(select(func.count()).select_from(Transaction.__table__)).scalar()
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as log_dir:
+        if mode == "ingest":
+            env = dict(env, INGEST_LOG_DIR=log_dir)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-w", str(args.workers), "--threads",
+             str(args.threads), "-b", f"127.0.0.1:{port}", "app:app"],
+            cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_up(base_url)
+            cookie = session_cookie(base_url, "bench")
+            warmup, latencies, errors = asyncio.run(
+                drive(base_url, cookie, args.concurrency, args.duration)
+            )
+        finally:
+            # Workers commit what they still have logged on the way out
+            server.terminate()
+            server.wait()
+    with engine.connect() as conn:
+        stored = conn.execute(select(func.count()).select_from(Transaction.__table__)).scalar()
+    engine.dispose()
+    latencies.sort()
+    return {
+        "rps": len(latencies) / args.duration,
+        "p50": statistics.median(latencies),
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+        "errors": len(errors),
+        "error_kinds": dict(Counter(errors).most_common(3)),
+        "stored": stored - before,
+        "acknowledged": warmup + len(latencies),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", action="append", choices=["commit", "ingest"])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--synchronous", default="FULL", help="SQLite synchronous pragma")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_engine(url)
+        schema.create_tables(engine)
+        user_id = seed(engine, 1000)
+        with engine.begin() as conn:
+            conn.execute(
+                update(User.__table__)
+                .where(User.__table__.c.id == user_id)
+                .values(password_hash=generate_password_hash(PASSWORD))
+            )
+        engine.dispose()
+        env = dict(
+            os.environ, DATABASE_URL=url, SQLITE_SYNCHRONOUS=args.synchronous,
+            PYTHONWARNINGS="ignore",
+        )
+
+        print(f"{args.concurrency} clients, {args.duration:.0f}s, {args.workers} workers "
+              f"x {args.threads} threads, synchronous={args.synchronous}")
+        for mode in args.mode or ["commit", "ingest"]:
+            r = run_mode(mode, url, env, args)
+            print(f"  {mode:7s} {r['rps']:8.1f} inserts/s  p50 {r['p50']:7.1f} ms  "
+                  f"p99 {r['p99']:7.1f} ms  stored {r['stored']}/{r['acknowledged']}  "
+                  f"errors {r['errors']}"
+                  + (f" {r['error_kinds']}" if r["errors"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Measure single-row categorization under concurrency with and without micro-batching.
+
+    python benchmarks/bench_microbatch.py --threads 16 --requests 2000 --window-ms 3
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import categorizer
+from generate_training_data import generate_history
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(rows, threads):
+    def one(row):
+        started = time.perf_counter()
+        categorizer.categorize([row])
+        return (time.perf_counter() - started) * 1000
+
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(one, rows))
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    return {
+        "rows_per_s": len(rows) / wall,
+        "cpu_ms_per_row": cpu * 1000 / len(rows),
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark inference micro-batching")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--window-ms", type=float, default=3.0)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=50.0)
+    args = parser.parse_args(argv)
+
+    end = datetime(2025, 12, 31)
+    history = generate_history(end - timedelta(days=365), end, rng=random.Random(3))
+    rows = [
+        {**row, "date": date.fromisoformat(row["date"])}
+        for row in history
+        if row["type"] != "income"
+    ]
+    rows = (rows * (args.requests // len(rows) + 1))[: args.requests]
+
+    # The prediction cache would hide the model cost being measured here
+    categorizer.configure(window_ms=0, cache_size=0)
+    categorizer.categorize(rows[:1])  # warm up
+    direct = run(rows, args.threads)
+
+    categorizer.configure(
+        window_ms=args.window_ms,
+        max_batch=args.max_batch,
+        max_wait_ms=args.max_wait_ms,
+        cache_size=0,
+    )
+    batched = run(rows, args.threads)
+    stats = categorizer.stats()["batcher"]
+
+    for name, result in (("direct", direct), ("batched", batched)):
+        print(
+            f"{name:8s} {result['rows_per_s']:8.0f} rows/s  "
+            f"cpu {result['cpu_ms_per_row']:6.2f} ms/row  "
+            f"p50 {result['p50_ms']:6.2f} ms  p99 {result['p99_ms']:6.2f} ms"
+        )
+    print(
+        f"batches={stats['batches']} mean size={stats['batch_size_mean']:.1f} "
+        f"max size={stats['batch_size_max']} "
+        f"mean queue delay={stats['queue_delay_mean_ms']:.2f} ms "
+        f"fallbacks={stats['fallbacks']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
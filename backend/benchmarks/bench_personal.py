@@ -0,0 +1,161 @@
+"""Measure personal categorization models at thousands of users per worker.
+
+    python benchmarks/bench_personal.py --users 2000 --lookups 20000 --cache 250 --cache 1000
+
+Seeds a throwaway SQLite database with ``--users`` one-year histories from
+generate_training_data, each with a few corrections of its own, and trains
+every user's model. Then it replays ``--lookups`` model lookups with
+Zipf-distributed users (a few heavy users, a long tail) through a cache of
+each ``--cache`` size, capped at ``--cache-mb``. It reports model sizes, the
+cold-load cost of a miss, the hit rate and the evictions.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir.name, 'bench.db')}"
+
+from sqlalchemy import insert
+
+import personal_models
+from app import app, db
+from generate_training_data import generate_history
+from models.category_override_model import CategoryOverride
+from models.transaction_model import Transaction
+from models.user_model import User
+
+MERCHANTS = ["Kaufland", "Lidl", "Billa", "Fantastico", "T-Market", "Shell", "Lukoil", "Eko"]
+CATEGORIES = ["groceries", "fuel", "household", "kids", "pets"]
+CITIES = ["Sofia", "Plovdiv", "Varna", "Burgas", "Ruse"]
+
+
+def seed(users, rng):
+    end = datetime(2025, 12, 31)
+    start = end - timedelta(days=365)
+    with db.engine.begin() as conn:
+        for n in range(users):
+            user_id = conn.execute(
+                insert(User.__table__).values(username=f"bench{n}", password_hash="x")
+            ).inserted_primary_key[0]
+            rows = [
+                {
+                    "user_id": user_id,
+                    "description": entry["description"],
+                    "category": entry["category"],
+                    "amount": entry["amount"],
+                    "type": entry["type"],
+                    "date": date.fromisoformat(entry["date"]),
+                }
+                for entry in generate_history(start, end, rng=rng)
+            ]
+            # Merchants this user shops at and files under their own categories
+            rules = []
+            for merchant in rng.sample(MERCHANTS, 3):
+                category = rng.choice(CATEGORIES)
+                city = rng.choice(CITIES)
+                rules.append({"user_id": user_id, "pattern": merchant.lower(), "category": category})
+                rows += [
+                    {
+                        "user_id": user_id,
+                        "description": f"{merchant} {city}",
+                        "category": category,
+                        "amount": round(rng.uniform(5, 80), 2),
+                        "type": "spending",
+                        "date": end.date() - timedelta(days=rng.randrange(365)),
+                    }
+                    for _ in range(rng.randrange(2, 12))
+                ]
+            conn.execute(insert(Transaction.__table__), rows)
+            conn.execute(
+                insert(CategoryOverride.__table__),
+                [{**rule, "match": "prefix"} for rule in rules],
+            )
+
+
+def zipf_users(users, lookups, rng, s=1.1):
+    weights = [1 / (rank**s) for rank in range(1, users + 1)]
+    order = list(range(1, users + 1))
+    rng.shuffle(order)
+    return rng.choices(order, weights=weights, k=lookups)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--cache", type=int, action="append", help="cache entries (repeatable)")
+    parser.add_argument("--cache-mb", type=float, default=64)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        seed(args.users, rng)
+        print(f"{args.users} users seeded in {time.perf_counter() - started:.1f}s")
+
+        train_ms = []
+        payloads = []
+        memory = []
+        for user_id in range(1, args.users + 1):
+            started = time.perf_counter()
+            model = personal_models.train(db.session, user_id)
+            db.session.commit()
+            train_ms.append((time.perf_counter() - started) * 1000)
+            if model is not None:
+                payloads.append(len(model.to_bytes()))
+                memory.append(personal_models.PersonalModel.from_bytes(model.to_bytes()).nbytes)
+        print(
+            f"train      median {statistics.median(train_ms):.2f} ms/user, "
+            f"{sum(train_ms) / 1000:.1f}s total"
+        )
+        print(
+            f"stored     median {statistics.median(payloads) / 1024:.1f} KB, "
+            f"loaded median {statistics.median(memory) / 1024:.1f} KB in memory"
+        )
+
+        probe = personal_models.PersonalModel.from_bytes(
+            db.session.get(personal_models.PersonalCategorizer, 1).payload
+        )
+        started = time.perf_counter()
+        for _ in range(10000):
+            probe.predict("Kaufland Sofia 0042")
+        print(f"predict    {(time.perf_counter() - started) * 100:.1f} us/row")
+
+        stream = zipf_users(args.users, args.lookups, rng)
+        for size in args.cache or [250, 1000, 4000]:
+            personal_models.configure(
+                True, maxsize=size, max_bytes=int(args.cache_mb * 1024 * 1024), ttl=3600
+            )
+            cold = []
+            for user_id in stream:
+                loads = personal_models.cache.loads
+                started = time.perf_counter()
+                personal_models.model_for(user_id)
+                if personal_models.cache.loads != loads:
+                    cold.append((time.perf_counter() - started) * 1000)
+                db.session.remove()
+            stats = personal_models.cache.stats()
+            cold.sort()
+            p50, p99 = cold[len(cold) // 2], cold[int(len(cold) * 0.99)]
+            print(
+                f"cache {size:>5}  hit rate {stats['hit_rate']:6.1%}  "
+                f"cold load p50 {p50:.2f} ms p99 {p99:.2f} ms  "
+                f"{stats['entries']} entries, {stats['bytes'] / 1024 / 1024:.1f} MB, "
+                f"{stats['evictions']} evictions"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
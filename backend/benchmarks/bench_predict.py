@@ -0,0 +1,166 @@
+"""Compare the /predict aggregation strategies on large synthetic users.
+
+    python benchmarks/bench_predict.py --rows 100000 --rows 1000000
+
+For each size a fresh SQLite database is seeded with one user whose history
+comes from generate_training_data.generate_history(), then the 30-day window
+is summed three ways:
+
+* python  - the original endpoint: load ORM rows, filter and sum in Python
+* groupby - one SELECT type, category, SUM, COUNT ... GROUP BY on transactions
+* rollup  - the same GROUP BY over the transaction_aggregate daily rollup
+
+and the forecast engine behind /predict's predicted_* fields is timed on
+the same user with its cache cleared before every run.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+import aggregates
+import forecast
+from benchmarks import schema
+from generate_training_data import generate_history
+from models.transaction_model import Transaction
+from models.user_model import User
+
+HISTORY_YEARS = 5
+CHUNK = 50_000
+
+
+def seed(engine, rows, seed_value=42, username="bench", password_hash="x"):
+    """Insert one user with ~``rows`` transactions ending today; return its id."""
+    rng = random.Random(seed_value)
+    end = datetime.combine(date.today(), datetime.min.time())
+    start = end - timedelta(days=365 * HISTORY_YEARS)
+    with engine.begin() as conn:
+        user_id = conn.execute(
+            insert(User.__table__).values(username=username, password_hash=password_hash)
+        ).inserted_primary_key[0]
+
+        inserted = 0
+        while inserted < rows:
+            # Each pass adds one more independent stream of recurring payments
+            batch = []
+            for entry in generate_history(start, end, rng=rng):
+                batch.append(
+                    {
+                        "user_id": user_id,
+                        "description": entry["description"],
+                        "category": entry["category"],
+                        "amount": entry["amount"],
+                        "type": entry["type"],
+                        "date": date.fromisoformat(entry["date"]),
+                    }
+                )
+            batch = batch[: rows - inserted]
+            for i in range(0, len(batch), CHUNK):
+                conn.execute(insert(Transaction.__table__), batch[i : i + CHUNK])
+            inserted += len(batch)
+        aggregates.rebuild(conn, user_id)
+    return user_id
+
+
+def predict_python(session, user_id, start, end):
+    transactions = (
+        session.query(Transaction)
+        .filter(
+            Transaction.user_id == user_id,
+            Transaction.date >= start,
+            Transaction.date <= end,
+        )
+        .order_by(Transaction.date.desc())
+        .all()
+    )
+    income = sum(t.amount for t in transactions if t.type == "income")
+    spending_transactions = [t for t in transactions if t.type != "income"]
+    spending = sum(t.amount for t in spending_transactions)
+    by_category = {}
+    for t in spending_transactions:
+        by_category[t.category] = by_category.get(t.category, 0) + t.amount
+    return income, spending, by_category
+
+
+def summarize(totals):
+    income = sum(amount for type_, _, amount, _ in totals if type_ == "income")
+    spending = {c: amount for type_, c, amount, _ in totals if type_ != "income"}
+    return income, sum(spending.values()), spending
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def run(rows, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        schema.create_tables(engine)
+        started = time.perf_counter()
+        user_id = seed(engine, rows)
+        print(f"\n{rows:,} rows seeded in {time.perf_counter() - started:.1f}s")
+
+        end = date.today()
+        start = end - timedelta(days=30)
+        with Session(engine) as session:
+            strategies = {
+                "python": lambda: predict_python(session, user_id, start, end),
+                "groupby": lambda: summarize(
+                    aggregates.window_totals_from_transactions(
+                        session.connection(), user_id, start, end
+                    )
+                ),
+                "rollup": lambda: summarize(
+                    aggregates.window_totals(session.connection(), user_id, start, end)
+                ),
+            }
+            baseline = None
+            for name, fn in strategies.items():
+                session.expunge_all()
+                ms, (income, spending, _) = timed(fn, repeat)
+                baseline = baseline or ms
+                print(
+                    f"  {name:8s} {ms:9.2f} ms  ({baseline / ms:6.1f}x)  "
+                    f"income={income:,.2f} spending={spending:,.2f}"
+                )
+
+            def cold_forecast():
+                forecast.cache.clear()
+                return forecast.forecast(session.connection(), user_id, end)
+
+            ms, result = timed(cold_forecast, repeat)
+            print(
+                f"  {'forecast':8s} {ms:9.2f} ms  {len(result['recurring'])} recurring, "
+                f"next 30 days income={result['predicted_income']:,.2f} "
+                f"spending={result['predicted_spending']:,.2f}"
+            )
+        engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark /predict aggregation")
+    parser.add_argument("--rows", type=int, action="append", help="rows per user")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    for rows in args.rows or [100_000, 1_000_000]:
+        run(rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Load-test the serving modes against each other.
+
+    python benchmarks/bench_serving.py --concurrency 32 --duration 15
+
+Seeds a throwaway SQLite database (or ``--database-url``) with one user, then for each mode starts
+the server in a subprocess and drives it with ``--concurrency`` clients for
+``--duration`` seconds. The traffic mix is 70% GET /transactions?limit=50,
+20% GET /predict and 10% POST /transactions. POSTs change the user's data
+version, so some reads miss the response cache.
+
+Modes:
+* flask   - ``app.run()``, the server app.py and the old Dockerfile start
+* gunicorn - ``gunicorn app:app`` with ``--workers`` sync workers
+* asgi    - ``uvicorn asgi:application`` with ``--workers`` workers
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+from sqlalchemy import create_engine, update
+from werkzeug.security import generate_password_hash
+
+from benchmarks import schema
+from benchmarks.bench_predict import seed
+from models.user_model import User
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PASSWORD = "bench"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def command(mode, port, workers):
+    if mode == "flask":
+        code = f"from app import app; app.run(host='127.0.0.1', port={port})"
+        return [sys.executable, "-c", code]
+    if mode == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "-w", str(workers),
+                "-b", f"127.0.0.1:{port}", "app:app"]
+    if mode == "asgi":
+        return [sys.executable, "-m", "uvicorn", "asgi:application", "--workers",
+                str(workers), "--host", "127.0.0.1", "--port", str(port),
+                "--log-level", "warning"]
+    raise ValueError(mode)
+
+
+def wait_until_up(base_url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/health", timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not start")
+
+
+def session_cookie(base_url, username):
+    # The session cookie is Secure, so pass it along by hand over plain http
+    response = httpx.post(f"{base_url}/login", json={"username": username, "password": PASSWORD})
+    response.raise_for_status()
+    return f"session={response.cookies['session']}"
+
+
+async def worker(client, deadline, latencies, errors, rng):
+    while time.monotonic() < deadline:
+        pick = rng.random()
+        started = time.perf_counter()
+        try:
+            if pick < 0.7:
+                response = await client.get("/transactions?limit=50")
+            elif pick < 0.9:
+                response = await client.get("/predict")
+            else:
+                response = await client.post("/transactions", json={
+                    "amount": round(rng.uniform(5, 80), 2),
+                    "description": rng.choice(["Lunch Subway", "Uber ride", "Groceries"]),
+                    "type": "spending",
+                    "date": "2025-06-02",
+                })
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def drive(base_url, cookie, concurrency, duration):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, headers={"Cookie": cookie}, limits=limits, timeout=30.0
+    ) as client:
+        # Warm up: loads the model in every worker that serves these
+        for _ in range(4):
+            await worker(client, time.monotonic() + 0.5, [], [], random.Random(0))
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*[
+            worker(client, deadline, latencies, errors, random.Random(i))
+            for i in range(concurrency)
+        ])
+    return latencies, errors
+
+
+def run_mode(mode, env, args):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        command(mode, port, args.workers), cwd=BACKEND, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up(base_url)
+        cookie = session_cookie(base_url, "bench")
+        latencies, errors = asyncio.run(
+            drive(base_url, cookie, args.concurrency, args.duration)
+        )
+    finally:
+        server.terminate()
+        server.wait()
+    latencies.sort()
+    return {
+        "rps": len(latencies) / args.duration,
+        "p50": statistics.median(latencies),
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+        "errors": len(errors),
+        "error_kinds": dict(Counter(errors).most_common(3)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the serving modes")
+    parser.add_argument("--mode", action="append", choices=["flask", "gunicorn", "asgi"])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--database-url", help="a server database to use instead of a temporary SQLite "
+        "file; its tables are dropped and recreated"
+    )
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_engine(url)
+        schema.create_tables(engine, drop=True)
+        user_id = seed(engine, args.rows)
+        with engine.begin() as conn:
+            conn.execute(
+                update(User.__table__)
+                .where(User.__table__.c.id == user_id)
+                .values(password_hash=generate_password_hash(PASSWORD))
+            )
+        engine.dispose()
+        env = dict(os.environ, DATABASE_URL=url, PYTHONWARNINGS="ignore")
+
+        print(f"{args.rows:,} rows, {args.concurrency} clients, {args.duration:.0f}s, "
+              f"{args.workers} workers")
+        for mode in args.mode or ["flask", "gunicorn", "asgi"]:
+            result = run_mode(mode, env, args)
+            print(f"  {mode:9s} {result['rps']:8.1f} req/s  p50 {result['p50']:7.1f} ms  "
+                  f"p99 {result['p99']:7.1f} ms  errors {result['errors']}"
+                  + (f" {result['error_kinds']}" if result["errors"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Measure transaction write throughput against 1..N shards.
+
+    python benchmarks/bench_shards.py --shards 1 --shards 2 --shards 4 --writers 8
+    python benchmarks/bench_shards.py --url 'postgresql:///bench?options=-csearch_path%3Dshard{}'
+
+Starts ``--writers`` processes that each insert ``--rows`` transactions for
+their own users, one per commit as ``POST /transactions`` does (an ORM
+flush, the rollup upsert and the data version bump), through a
+``shards.ShardSet`` of each ``--shards`` size. Users are spread over the
+shards by ``shards.shard_index``. ``--url`` is a template with ``{}`` for
+the shard number (default: SQLite files in a temporary directory, written
+with ``--synchronous`` so commits wait on the disk as they would in
+production with FULL). Reports rows/s and commit latency percentiles.
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import shards
+from models.transaction_model import Transaction
+import models.user_model  # the table Transaction.user_id references
+
+
+def writer(urls, user_ids, rows, start_at):
+    shard_set = shards.ShardSet(urls, scopefunc=threading.get_ident)
+    latencies = []
+    time.sleep(max(0.0, start_at - time.time()))
+    for n in range(rows):
+        user_id = user_ids[n % len(user_ids)]
+        session = shard_set.session_for(user_id)
+        started = time.perf_counter()
+        session.add(
+            Transaction(
+                user_id=user_id,
+                description=f"Bench purchase {n}",
+                amount=12.5,
+                category="groceries",
+                type="spending",
+                date=date(2025, 1, 1) + timedelta(days=n % 365),
+            )
+        )
+        session.commit()
+        latencies.append(time.perf_counter() - started)
+    finished = time.time()
+    shard_set.dispose()
+    return latencies, finished
+
+
+def run(urls, writers, rows, users):
+    shards.ShardSet(urls).create_all()
+    # Every writer connects first, then all start together
+    start_at = time.time() + 2
+    jobs = [
+        (urls, list(range(w * users + 1, (w + 1) * users + 1)), rows, start_at)
+        for w in range(writers)
+    ]
+    with multiprocessing.Pool(writers) as pool:
+        results = pool.starmap(writer, jobs)
+    elapsed = max(finished for _, finished in results) - start_at
+    latencies = sorted(latency for found, _ in results for latency in found)
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, action="append", help="shard count (repeatable)")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=300, help="commits per writer")
+    parser.add_argument("--users", type=int, default=50, help="users per writer")
+    parser.add_argument("--url", help="database URL template with {} for the shard number")
+    parser.add_argument("--synchronous", default="FULL", help="SQLite synchronous pragma")
+    args = parser.parse_args(argv)
+    os.environ["SQLITE_SYNCHRONOUS"] = args.synchronous
+
+    print(f"{args.writers} writers x {args.rows} commits")
+    print(f"{'shards':>6} {'rows/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    baseline = None
+    for count in args.shards or [1, 2, 4]:
+        with tempfile.TemporaryDirectory() as directory:
+            template = args.url or f"sqlite:///{os.path.join(directory, 'shard{}.db')}"
+            urls = [template.format(i) for i in range(count)]
+            r = run(urls, args.writers, args.rows, args.users)
+        baseline = baseline or r["rps"]
+        print(
+            f"{count:>6} {r['rps']:>9,.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}"
+            f"   x{r['rps'] / baseline:.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
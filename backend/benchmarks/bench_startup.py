@@ -0,0 +1,98 @@
+"""Measure cold start: importing the app, then serving the first requests.
+
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 3000
+
+Each run uses a fresh interpreter and a throwaway SQLite database and
+reports the time to ``import app``, the first (model-free) GET
+/transactions and the first POST /transactions, which loads the model.
+Exits with status 1 if the median import + first categorization exceeds
+the budget.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PROBE = r"""
+import json, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+app = app_module.app
+app.config["TESTING"] = True
+with app.app_context():
+    user = app_module.User(username="bench")
+    user.set_password("bench")
+    app_module.db.session.add(user)
+    app_module.db.session.commit()
+with app.test_client() as client:
+    client.post("/login", json={"username": "bench", "password": "bench"})
+    t = time.perf_counter()
+    client.get("/transactions")
+    first_get = time.perf_counter() - t
+    t = time.perf_counter()
+    client.post("/transactions", json={
+        "amount": 12.0, "description": "Lunch Subway", "type": "spending", "date": "2025-06-02"
+    })
+    first_post = time.perf_counter() - t
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_get_ms": first_get * 1000,
+    "first_post_ms": first_post * 1000,
+}))
+"""
+
+IMPORT_ONLY = r"""
+import json, sys
+import app
+print(json.dumps({"pandas": "pandas" in sys.modules, "sklearn": "sklearn" in sys.modules}))
+"""
+
+
+def run_probe(code, extra_env=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        env.update(extra_env or {})
+        out = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", code],
+            cwd=BACKEND,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark app startup")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=3000.0)
+    args = parser.parse_args(argv)
+
+    loaded = run_probe(IMPORT_ONLY)
+    print(f"after import: pandas loaded={loaded['pandas']} sklearn loaded={loaded['sklearn']}")
+
+    for label, env in (("lazy", {}), ("preload", {"MODEL_PRELOAD": "1"})):
+        runs = [run_probe(PROBE, env) for _ in range(args.runs)]
+        median = {k: statistics.median(r[k] for r in runs) for k in runs[0] if k.endswith("_ms")}
+        print(
+            f"{label:8s} import {median['import_ms']:7.1f} ms  "
+            f"first GET {median['first_get_ms']:7.1f} ms  "
+            f"first POST {median['first_post_ms']:7.1f} ms"
+        )
+        if label == "lazy":
+            total = median["import_ms"] + median["first_post_ms"]
+
+    print(f"import -> first categorization: {total:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    return 0 if total <= args.budget_ms else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
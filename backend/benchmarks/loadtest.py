@@ -0,0 +1,405 @@
+"""Reproducible load test with a JSON report that can be diffed between commits.
+
+    python benchmarks/loadtest.py run --users 20 --rows 5000 --output before.json
+    git checkout my-branch
+    python benchmarks/loadtest.py run --users 20 --rows 5000 --baseline before.json
+    python benchmarks/loadtest.py diff before.json after.json
+
+``run`` seeds a throwaway SQLite database (or ``--database-url``) with
+``--users`` users of ``--rows`` transactions each, built by
+generate_training_data.generate_history(), starts the API with ``--server``
+(see bench_serving.py) and drives it with ``--concurrency`` clients for
+``--duration`` seconds. Each client logs in as one of the users and then
+picks requests from ``--mix``. Everything random is seeded by ``--seed``.
+
+The report records throughput and latency percentiles per endpoint, error
+counts and the database size before and after the run. ``diff`` (or
+``run --baseline``) compares two reports and exits with status 1 when an
+endpoint's throughput drops, or its p50/p99 latency grows, by more than
+``--threshold``.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+from sqlalchemy import create_engine, func, make_url, select, text
+from werkzeug.security import generate_password_hash
+
+from benchmarks import schema
+from benchmarks.bench_predict import seed
+from benchmarks.bench_serving import BACKEND, command, free_port, wait_until_up
+from models.transaction_model import Transaction
+
+PASSWORD = "loadtest"
+DEFAULT_MIX = "login=5,list=55,post=15,predict=25"
+ENDPOINTS = ("login", "list", "post", "predict")
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse_mix(spec):
+    """Parse ``name=weight,...`` into a dict of endpoint weights."""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r}; expected one of {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight)
+    if sum(mix.values()) <= 0:
+        raise ValueError("The mix needs at least one positive weight")
+    return mix
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(latencies, errors, duration):
+    """Throughput and latency statistics (ms) for one endpoint."""
+    ordered = sorted(latencies)
+    summary = {
+        "requests": len(ordered),
+        "errors": errors,
+        "rps": round(len(ordered) / duration, 2),
+        "mean_ms": round(sum(ordered) / len(ordered), 2) if ordered else None,
+        "max_ms": round(ordered[-1], 2) if ordered else None,
+    }
+    for q in PERCENTILES:
+        value = percentile(ordered, q)
+        summary[f"p{q}_ms"] = round(value, 2) if value is not None else None
+    return summary
+
+
+def database_size(url):
+    """Bytes used by the database: the SQLite file plus its WAL, or pg_database_size()."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return sum(
+            os.path.getsize(url.database + suffix)
+            for suffix in ("", "-wal")
+            if os.path.exists(url.database + suffix)
+        )
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT pg_database_size(current_database())")).scalar()
+    finally:
+        engine.dispose()
+
+
+def transaction_count(url):
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(Transaction)).scalar()
+    finally:
+        engine.dispose()
+
+
+def seed_users(url, users, rows, seed_value):
+    """Recreate the schema and seed ``users`` users; return their usernames."""
+    engine = create_engine(url)
+    schema.create_tables(engine, drop=True)
+    password_hash = generate_password_hash(PASSWORD)
+    usernames = [f"load{i:04d}" for i in range(users)]
+    for i, username in enumerate(usernames):
+        seed(engine, rows, seed_value + i, username=username, password_hash=password_hash)
+    engine.dispose()
+    return usernames
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Client:
+    """One virtual user: logs in, then issues requests picked from the mix."""
+
+    def __init__(self, http, username, rng, mix, record):
+        self.http = http
+        self.username = username
+        self.rng = rng
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.record = record
+        self.cookie = None
+
+    async def timed(self, name, send):
+        started = time.perf_counter()
+        try:
+            response = await send()
+            error = response.status_code if response.status_code >= 400 else None
+        except httpx.HTTPError as e:
+            response, error = None, type(e).__name__
+        self.record(name, (time.perf_counter() - started) * 1000, error)
+        return response
+
+    async def login(self):
+        response = await self.timed("login", lambda: self.http.post(
+            "/login", json={"username": self.username, "password": PASSWORD}
+        ))
+        # The session cookie is Secure, so pass it along by hand over plain http
+        if response is not None and "session" in response.cookies:
+            self.cookie = f"session={response.cookies['session']}"
+
+    async def step(self):
+        name = self.rng.choices(self.names, self.weights)[0]
+        if name == "login" or self.cookie is None:
+            await self.login()
+            return
+        headers = {"Cookie": self.cookie}
+        if name == "list":
+            send = lambda: self.http.get("/transactions?limit=50", headers=headers)
+        elif name == "predict":
+            send = lambda: self.http.get("/predict", headers=headers)
+        else:
+            send = lambda: self.http.post("/transactions", headers=headers, json={
+                "amount": round(self.rng.uniform(5, 80), 2),
+                "description": self.rng.choice(["Lunch Subway", "Uber ride", "Groceries"]),
+                "type": "spending",
+                "date": datetime.now(timezone.utc).date().isoformat(),
+            })
+        await self.timed(name, send)
+
+    async def run(self, deadline):
+        await self.login()
+        while time.monotonic() < deadline:
+            await self.step()
+
+
+async def drive(base_url, usernames, mix, concurrency, duration, seed_value, warmup):
+    latencies = defaultdict(list)
+    errors = defaultdict(Counter)
+    recording = False
+
+    def record(name, elapsed_ms, error):
+        if not recording:
+            return
+        latencies[name].append(elapsed_ms)
+        if error is not None:
+            errors[name][error] += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as http:
+        clients = [
+            Client(http, usernames[i % len(usernames)], random.Random(seed_value + i), mix, record)
+            for i in range(concurrency)
+        ]
+        # Warm up every server worker (model load, caches) before measuring
+        await asyncio.gather(*[client.run(time.monotonic() + warmup) for client in clients])
+        recording = True
+        await asyncio.gather(*[client.run(time.monotonic() + duration) for client in clients])
+    return latencies, errors
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'loadtest.db')}"
+        started = time.perf_counter()
+        usernames = seed_users(url, args.users, args.rows, args.seed)
+        seed_seconds = time.perf_counter() - started
+        size_before = database_size(url)
+
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        env = dict(os.environ, DATABASE_URL=url, PYTHONWARNINGS="ignore")
+        server = subprocess.Popen(
+            command(args.server, port, args.workers), cwd=BACKEND, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_up(base_url)
+            latencies, errors = asyncio.run(drive(
+                base_url, usernames, mix, args.concurrency, args.duration,
+                args.seed, args.warmup,
+            ))
+        finally:
+            server.terminate()
+            server.wait()
+
+        size_after = database_size(url)
+        rows_after = transaction_count(url)
+
+    endpoints = {
+        name: dict(
+            summarize(latencies[name], sum(errors[name].values()), args.duration),
+            error_kinds={str(kind): count for kind, count in errors[name].most_common(5)},
+        )
+        for name in ENDPOINTS
+        if latencies[name]
+    }
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "server": args.server,
+            "workers": args.workers,
+            "database": make_url(url).get_backend_name(),
+            "users": args.users,
+            "rows_per_user": args.rows,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "mix": mix,
+            "seed": args.seed,
+        },
+        "totals": summarize(everything, sum(sum(e.values()) for e in errors.values()), args.duration),
+        "endpoints": endpoints,
+        "database": {
+            "seed_seconds": round(seed_seconds, 2),
+            "bytes_before": size_before,
+            "bytes_after": size_after,
+            "transactions_after": rows_after,
+        },
+    }
+
+
+# (metric, True when a higher value is better)
+COMPARED = (("rps", True), ("p50_ms", False), ("p99_ms", False))
+
+
+def compare(old, new, threshold=0.1):
+    """Compare two reports; return (lines, regressions).
+
+    A regression is an endpoint metric in ``COMPARED`` that got worse by
+    more than ``threshold`` (a fraction), or new errors where there were none.
+    """
+    lines = []
+    regressions = []
+    for key in ("server", "workers", "database", "users", "rows_per_user", "concurrency", "mix"):
+        if old["config"].get(key) != new["config"].get(key):
+            lines.append(
+                f"warning: {key} differs ({old['config'].get(key)} -> {new['config'].get(key)})"
+            )
+    sections = [("total", old["totals"], new["totals"])]
+    sections += [
+        (name, old["endpoints"][name], new["endpoints"][name])
+        for name in ENDPOINTS
+        if name in old["endpoints"] and name in new["endpoints"]
+    ]
+    for name, before, after in sections:
+        for metric, higher_is_better in COMPARED:
+            a, b = before.get(metric), after.get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{name} {metric}")
+            lines.append(f"{name:8s} {metric:7s} {a:10.2f} -> {b:10.2f}  {change:+7.1%}{flag}")
+        if after.get("errors") and not before.get("errors"):
+            regressions.append(f"{name} errors")
+            lines.append(f"{name:8s} errors  {before.get('errors', 0)} -> {after['errors']}  REGRESSION")
+    a, b = old["database"]["bytes_after"], new["database"]["bytes_after"]
+    if a and b:
+        lines.append(f"database bytes  {a:,} -> {b:,}  {(b - a) / a:+.1%}")
+    return lines, regressions
+
+
+def print_report(report):
+    config = report["config"]
+    print(
+        f"{config['server']} x{config['workers']} on {config['database']}: "
+        f"{config['users']} users x {config['rows_per_user']:,} rows, "
+        f"{config['concurrency']} clients, {config['duration_s']:.0f}s"
+    )
+    for name, stats in [("total", report["totals"]), *report["endpoints"].items()]:
+        print(
+            f"  {name:8s} {stats['rps']:8.1f} req/s  p50 {stats['p50_ms']:7.1f} ms  "
+            f"p99 {stats['p99_ms']:7.1f} ms  errors {stats['errors']}"
+        )
+    size = report["database"]
+    print(f"  database {size['bytes_before']:,} -> {size['bytes_after']:,} bytes")
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def print_comparison(old, new, threshold):
+    lines, regressions = compare(old, new, threshold)
+    print(f"\n{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for line in lines:
+        print(f"  {line}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the API and diff the results")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed, start the server and measure")
+    run_parser.add_argument("--server", choices=["flask", "gunicorn", "asgi"], default="gunicorn")
+    run_parser.add_argument("--workers", type=int, default=2)
+    run_parser.add_argument("--users", type=int, default=10)
+    run_parser.add_argument("--rows", type=int, default=2_000, help="transactions per user")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--duration", type=float, default=15.0)
+    run_parser.add_argument("--warmup", type=float, default=2.0)
+    run_parser.add_argument("--mix", default=DEFAULT_MIX, help=f"default {DEFAULT_MIX}")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument(
+        "--database-url", help="a server database to use instead of a temporary SQLite "
+        "file; its tables are dropped and recreated"
+    )
+    run_parser.add_argument("--output", help="write the JSON report here")
+    run_parser.add_argument("--baseline", help="a previous report to compare against")
+    run_parser.add_argument("--threshold", type=float, default=0.1)
+
+    diff_parser = commands.add_parser("diff", help="compare two reports")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+    diff_parser.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args(argv)
+    if args.command == "diff":
+        return print_comparison(load(args.old), load(args.new), args.threshold)
+
+    report = run(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.baseline:
+        return print_comparison(load(args.baseline), report, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,19 @@
+"""The database schema for benchmarks that build their own database."""
+
+# Importing every model registers all the app's tables on db.metadata
+import models.aggregate_model  # noqa: F401
+import models.category_override_model  # noqa: F401
+import models.data_version_model  # noqa: F401
+import models.ingest_checkpoint_model  # noqa: F401
+import models.personal_categorizer_model  # noqa: F401
+import models.personal_categorizer_stale_model  # noqa: F401
+import models.transaction_model  # noqa: F401
+import models.user_model  # noqa: F401
+from extensions import db
+
+
+def create_tables(engine, drop=False):
+    """Create every table on ``engine``; ``drop`` removes existing ones first."""
+    if drop:
+        db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
@@ -0,0 +1,281 @@
+"""Expense categorization with the pipeline trained by train_expense_model.py.
+
+``configure(engine=...)`` picks which engine's model file is served (see
+engines.py); both are compiled into pandas-free predictors when possible.
+"""
+
+import os
+import threading
+import time
+from datetime import date
+
+import engines
+import instrumentation
+from inference_queue import MicroBatcher
+from prediction_cache import PredictionCache
+
+ENGINE = engines.DEFAULT_ENGINE
+MODEL_PATH = engines.get(ENGINE).path
+INCOME_CATEGORY = "income"
+
+# How often (seconds) to stat model.joblib for changes
+MODEL_CHECK_INTERVAL = 5.0
+# joblib mmap_mode for the model's numpy arrays (e.g. "r"). Off by default:
+# sklearn's tree unpickling copies node arrays into private buffers, so for
+# the RandomForest pipeline mapping shares only the tiny scaler/idf arrays.
+# Use MODEL_PRELOAD with gunicorn --preload to share the model copy-on-write.
+MODEL_MMAP_MODE = None
+
+
+def _model_signature(path):
+    stat = os.stat(path)
+    # The inode changes on every os.replace, even within one mtime tick
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+# Loaded on first use by get_model(), so importing the app stays cheap
+model = None
+model_signature = None
+# Pandas-free compiled form of the pipeline (engines.py), when supported
+predictor = None
+# (model, predictor) swapped as one reference so readers never mix versions
+_loaded = (None, None)
+_model_lock = threading.Lock()
+_last_model_check = time.monotonic()
+# Set while a background thread loads a changed model.joblib
+_reloading = False
+reloads = 0
+
+# Optional micro-batching of concurrent single-row requests, see configure()
+batcher = None
+# Recent predictions; rows are dicts whose ``date`` is a datetime.date
+cache = PredictionCache()
+_counters = {"override_hits": 0, "personal_hits": 0, "model_rows": 0}
+_counters_lock = threading.Lock()
+
+
+def _read_model():
+    """Load MODEL_PATH; returns (signature, (pipeline, predictor))."""
+    import joblib
+
+    signature = _model_signature(MODEL_PATH)
+    loaded = joblib.load(MODEL_PATH, mmap_mode=MODEL_MMAP_MODE)
+    return signature, (loaded, engines.compile_pipeline(loaded))
+
+
+def _install_locked(signature, loaded):
+    global model, model_signature, predictor, _loaded
+    _loaded = loaded
+    model, predictor = _loaded
+    model_signature = signature
+    if cache is not None:
+        cache.clear()
+    return model
+
+
+def _load_locked():
+    return _install_locked(*_read_model())
+
+
+def _warm_up(loaded):
+    """Run one prediction so lazy initialization happens before the swap."""
+    pipeline, compiled = loaded
+    row = {"amount": 1.0, "description": "warm up", "date": date(2000, 1, 1)}
+    if compiled is not None:
+        compiled.predict(compiled.features([row]))
+    else:
+        pipeline.predict(build_features([row]))
+
+
+def _reload_in_background():
+    global _reloading, reloads
+    try:
+        signature, loaded = _read_model()
+        _warm_up(loaded)
+        with _model_lock:
+            _install_locked(signature, loaded)
+            reloads += 1
+        print(f"[MODEL] Reloaded {MODEL_PATH}")
+    except Exception as exc:
+        # A half-written or incompatible file: keep serving the current model
+        print(f"[MODEL] Reload of {MODEL_PATH} failed, keeping the current model: {exc!r}")
+    finally:
+        _reloading = False
+
+
+def get_model():
+    """Return the categorization pipeline, loading it on first use."""
+    current = model
+    if current is not None:
+        return current
+    with _model_lock:
+        return model if model is not None else _load_locked()
+
+
+def refresh_model(force=False, background=False):
+    """Reload model.joblib if it changed on disk, dropping cached predictions.
+
+    With ``background`` the new model is loaded and warmed up on another
+    thread while requests keep using the current one, then swapped in as a
+    single reference; returns True once that thread has started.
+    """
+    global _last_model_check, _reloading
+    now = time.monotonic()
+    if model is None or (not force and now - _last_model_check < MODEL_CHECK_INTERVAL):
+        return False
+    with _model_lock:
+        _last_model_check = now
+        if _reloading:
+            return False
+        try:
+            signature = _model_signature(MODEL_PATH)
+        except OSError:
+            return False
+        if signature == model_signature and not force:
+            return False
+        if not background:
+            _load_locked()
+            return True
+        _reloading = True
+    threading.Thread(target=_reload_in_background, name="model-reload", daemon=True).start()
+    return True
+
+
+def model_info():
+    """Training metadata recorded by train_expense_model.py, or None."""
+    return getattr(model, "metadata_", None)
+
+
+def build_features(rows):
+    """Build the model input frame for many rows in one vectorized pass.
+
+    ``rows`` are dicts with ``amount``, ``description`` and ``date`` keys.
+    """
+    # Imported here so only processes that actually categorize pay for pandas
+    import pandas as pd
+
+    dates = pd.to_datetime(pd.Series([row["date"] for row in rows], dtype="object"))
+    return pd.DataFrame(
+        {
+            "amount": [row["amount"] for row in rows],
+            "description": [row["description"] for row in rows],
+            "day": dates.dt.day,
+            "weekday": dates.dt.weekday,
+            "month": dates.dt.month,
+        }
+    )
+
+
+def predict_categories(rows):
+    """Predict a spending category for every row with a single model call."""
+    if not rows:
+        return []
+    get_model()
+    pipeline, compiled = _loaded
+    if compiled is not None:
+        with instrumentation.stage("features"):
+            features = compiled.features(rows)
+        with instrumentation.stage("model_predict"):
+            predicted = compiled.predict(features)
+    else:
+        # The pipeline's own preprocessing runs inside predict() here
+        with instrumentation.stage("features"):
+            features = build_features(rows)
+        with instrumentation.stage("model_predict"):
+            predicted = pipeline.predict(features)
+    return [str(category) for category in predicted]
+
+
+def configure(
+    window_ms=0.0,
+    max_batch=64,
+    max_wait_ms=50.0,
+    cache_size=4096,
+    cache_mode="features",
+    mmap_mode=None,
+    engine=engines.DEFAULT_ENGINE,
+):
+    """Set up micro-batching (a 0 ms window disables it), the prediction cache
+    (a size of 0 disables it), which engine's model is served and how the
+    model file is loaded."""
+    global batcher, cache, MODEL_MMAP_MODE, ENGINE, MODEL_PATH
+    MODEL_MMAP_MODE = mmap_mode
+    if engine != ENGINE:
+        with _model_lock:
+            ENGINE, MODEL_PATH = engine, engines.get(engine).path
+            # Loaded on next use from the new engine's file
+            _install_locked(None, (None, None))
+    cache = PredictionCache(cache_size, cache_mode) if cache_size > 0 else None
+    if window_ms > 0:
+        batcher = MicroBatcher(
+            predict_categories,
+            window_ms=window_ms,
+            max_batch=max_batch,
+            max_wait_ms=max_wait_ms,
+        )
+    else:
+        batcher = None
+
+
+def _count(name, amount=1):
+    with _counters_lock:
+        _counters[name] += amount
+
+
+def stats():
+    with _counters_lock:
+        counters = dict(_counters)
+    return {
+        **counters,
+        "batcher": batcher.stats() if batcher else None,
+        "cache": cache.stats() if cache else None,
+        "reloads": reloads,
+    }
+
+
+def categorize(rows, override_index=None, personal_model=None):
+    """Return a category per row.
+
+    Income rows skip the model entirely, as do rows matching one of the
+    user's learned rules in ``override_index`` (see overrides.py) and rows
+    the user's ``personal_model`` is confident about (see personal_models.py).
+    """
+    refresh_model(background=True)
+    categories = [INCOME_CATEGORY if row.get("type") == "income" else None for row in rows]
+    if override_index is not None and len(override_index):
+        overridden = 0
+        for i, category in enumerate(categories):
+            if category is None:
+                categories[i] = override_index.lookup(rows[i]["description"])
+                overridden += categories[i] is not None
+        _count("override_hits", overridden)
+    if personal_model is not None:
+        personal = 0
+        for i, category in enumerate(categories):
+            if category is None:
+                categories[i] = personal_model.predict(rows[i]["description"])
+                personal += categories[i] is not None
+        _count("personal_hits", personal)
+    keys = {}
+    if cache is not None:
+        # Read before the model is: a reload swaps the model, then clears the cache
+        generation = cache.generation
+        for i, category in enumerate(categories):
+            if category is None:
+                keys[i] = cache.key(rows[i])
+                categories[i] = cache.get(keys[i])
+
+    pending = [i for i, category in enumerate(categories) if category is None]
+    if not pending:
+        return categories
+    if batcher is not None and len(pending) == 1:
+        # Lone requests share a model call with whatever else is in flight
+        predicted = [batcher.predict(rows[pending[0]])]
+    else:
+        predicted = predict_categories([rows[i] for i in pending])
+    _count("model_rows", len(pending))
+    for i, category in zip(pending, predicted):
+        categories[i] = category
+        if cache is not None:
+            cache.put(keys[i], category, generation)
+    return categories
@@ -0,0 +1,112 @@
+"""Database URL, engine options and connection-pool instrumentation.
+
+SQLite stays the zero-configuration default; every connection is switched to
+WAL with a busy timeout so concurrent gunicorn workers queue for the write
+lock instead of failing with ``database is locked``. Server databases such
+as PostgreSQL get a sized, pre-pinged connection pool.
+"""
+
+import os
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+DEFAULT_URL = "sqlite:///transactions.db"
+
+
+def _env_int(env, name, default):
+    return int(env.get(name, default))
+
+
+def database_url(env=os.environ):
+    """Return DATABASE_URL, accepting the legacy ``postgres://`` scheme."""
+    url = env.get("DATABASE_URL") or DEFAULT_URL
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://") :]
+    return url
+
+
+def engine_options(url, env=os.environ):
+    """Build SQLALCHEMY_ENGINE_OPTIONS for ``url`` from DB_* environment variables."""
+    if url.startswith("sqlite"):
+        # sqlite3's own timeout backs up busy_timeout while connecting
+        return {
+            "connect_args": {"timeout": _env_int(env, "SQLITE_BUSY_TIMEOUT_MS", 5000) / 1000}
+        }
+    return {
+        "pool_size": _env_int(env, "DB_POOL_SIZE", 5),
+        "max_overflow": _env_int(env, "DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int(env, "DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int(env, "DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": env.get("DB_POOL_PRE_PING", "1") != "0",
+    }
+
+
+def upsert_insert(dialect_name):
+    """The dialect's ``insert`` construct, which has ``on_conflict_do_update``."""
+    if dialect_name == "postgresql":
+        return postgresql.insert
+    if dialect_name == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(f"No upsert for dialect {dialect_name!r}")
+
+
+def sqlite_pragmas(env=os.environ):
+    return {
+        "journal_mode": env.get("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": env.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": _env_int(env, "SQLITE_BUSY_TIMEOUT_MS", 5000),
+        "mmap_size": _env_int(env, "SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+    }
+
+
+class PoolMetrics:
+    """Counts pool events for one engine; see ``stats()``."""
+
+    EVENTS = ("connect", "checkout", "checkin", "invalidate")
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.counts = dict.fromkeys(self.EVENTS, 0)
+        self._lock = threading.Lock()
+        for name in self.EVENTS:
+            event.listen(engine, name, self._counter(name))
+
+    def _counter(self, name):
+        def count(*args):
+            with self._lock:
+                self.counts[name] += 1
+
+        return count
+
+    def stats(self):
+        pool = self.engine.pool
+        with self._lock:
+            counts = dict(self.counts)
+        stats = {
+            "dialect": self.engine.dialect.name,
+            "pool": type(pool).__name__,
+            "events": counts,
+        }
+        # Only QueuePool-style pools track sizes
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            method = getattr(pool, name, None)
+            if callable(method):
+                stats[name] = method()
+        return stats
+
+
+def instrument(engine, env=os.environ):
+    """Apply SQLite pragmas on every new connection and start counting pool events."""
+    if engine.dialect.name == "sqlite":
+        pragmas = sqlite_pragmas(env)
+
+        @event.listens_for(engine, "connect")
+        def _set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    return PoolMetrics(engine)
@@ -0,0 +1,184 @@
+"""Categorizer engines: how a model is built, grown and served.
+
+* ``forest`` – scaled numbers and a TF-IDF description into a 100-tree
+  RandomForest. Accurate on the descriptions it has seen, but the file is
+  large and every prediction walks every tree.
+* ``linear`` – the same numbers and a hashed description into an SGD
+  logistic regression. There is no vocabulary and the classifier keeps only
+  the weights of description tokens that occurred in training, so the file
+  is a few kilobytes. A prediction is a handful of vector additions.
+
+Each engine builds the unfitted pipeline for ``train_expense_model.py``,
+grows an already fitted one with new rows (``--incremental``), and compiles
+a fitted pipeline into a pandas-free predictor for ``categorizer``. A
+predictor has ``features(rows)`` and ``predict(features)``, timed as
+separate stages.
+"""
+
+import os
+
+import numpy as np
+
+from features import CompiledEncoder, build_preprocessor
+
+BACKEND = os.path.dirname(__file__)
+
+
+class ForestPredictor:
+    def __init__(self, encoder, classifier):
+        self.encoder = encoder
+        self.classifier = classifier
+
+    def features(self, rows):
+        return self.encoder.transform(rows)
+
+    def predict(self, features):
+        return self.classifier.predict(features)
+
+
+class LinearPredictor:
+    """A fitted linear classifier evaluated over ``CompiledEncoder.encode`` rows."""
+
+    def __init__(self, encoder, classes, coef, intercept):
+        self.encoder = encoder
+        self.classes = np.asarray(classes)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        # Weight vector (one entry per class score) of every column with any
+        # nonzero weight; a row touches only a few of them. COO keeps this
+        # proportional to the nonzeros, not to the 2**18 hashed columns.
+        if hasattr(coef, "tocoo"):
+            coef = coef.tocoo()
+            rows, cols, data = coef.row, coef.col, coef.data
+        else:
+            coef = np.asarray(coef)
+            rows, cols = np.nonzero(coef)
+            data = coef[rows, cols]
+        self.weights = {}
+        for row, column, value in zip(rows.tolist(), cols.tolist(), data.tolist()):
+            vector = self.weights.get(column)
+            if vector is None:
+                vector = self.weights[column] = np.zeros(coef.shape[0])
+            vector[row] = value
+
+    def features(self, rows):
+        return self.encoder.encode(rows)
+
+    def predict(self, features):
+        scores = np.empty((len(features), len(self.intercept)))
+        weights = self.weights
+        for i, (columns, values) in enumerate(features):
+            score = self.intercept.copy()
+            for column, value in zip(columns, values):
+                vector = weights.get(column)
+                if vector is not None:
+                    score += value * vector
+            scores[i] = score
+        if scores.shape[1] == 1:
+            # Two classes: one score, positive for classes[1]
+            return self.classes[(scores[:, 0] > 0).astype(int)]
+        return self.classes[scores.argmax(axis=1)]
+
+
+class ForestEngine:
+    name = "forest"
+    path = os.path.join(BACKEND, "model.joblib")
+
+    def build(self, n_estimators=100, n_jobs=-1, random_state=42):
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.pipeline import make_pipeline
+
+        return make_pipeline(
+            build_preprocessor("tfidf"),
+            RandomForestClassifier(
+                n_estimators=n_estimators, n_jobs=n_jobs, random_state=random_state
+            ),
+        )
+
+    def grow(self, pipeline, features, labels, add_trees=20, n_jobs=-1):
+        """Warm-start ``add_trees`` more trees on ``features``; the preprocessor stays fitted."""
+        preprocessor, forest = pipeline.steps[0][1], pipeline.steps[-1][1]
+        forest.set_params(
+            warm_start=True, n_jobs=n_jobs, n_estimators=forest.n_estimators + add_trees
+        )
+        forest.fit(preprocessor.transform(features), labels)
+
+    def finalize(self, pipeline):
+        # Serving predicts a few rows at a time; a thread pool per call only adds latency
+        pipeline.steps[-1][1].set_params(n_jobs=None, warm_start=False)
+
+    def compile(self, pipeline):
+        return ForestPredictor(CompiledEncoder.from_pipeline(pipeline), pipeline.steps[-1][1])
+
+
+class LinearEngine:
+    name = "linear"
+    path = os.path.join(BACKEND, "model_linear.joblib")
+
+    def build(self, n_estimators=None, n_jobs=-1, random_state=42):
+        from sklearn.linear_model import SGDClassifier
+        from sklearn.pipeline import make_pipeline
+
+        # n_estimators has no meaning here; n_jobs parallelizes one-vs-rest fits
+        return make_pipeline(
+            build_preprocessor("hashing"),
+            SGDClassifier(
+                loss="log_loss",
+                alpha=1e-5,
+                max_iter=50,
+                tol=1e-4,
+                n_jobs=n_jobs,
+                random_state=random_state,
+            ),
+        )
+
+    def grow(self, pipeline, features, labels, add_trees=None, n_jobs=-1):
+        """One ``partial_fit`` pass over ``features``; the scaler stays fitted."""
+        preprocessor, classifier = pipeline.steps[0][1], pipeline.steps[-1][1]
+        if hasattr(classifier.coef_, "toarray"):
+            classifier.densify()
+        classifier.set_params(n_jobs=n_jobs)
+        classifier.partial_fit(preprocessor.transform(features), labels)
+
+    def finalize(self, pipeline):
+        classifier = pipeline.steps[-1][1]
+        classifier.set_params(n_jobs=None)
+        # Only trained tokens have nonzero weights; store just those
+        classifier.sparsify()
+
+    def compile(self, pipeline):
+        classifier = pipeline.steps[-1][1]
+        encoder = CompiledEncoder.from_pipeline(pipeline)
+        if encoder.n_features != classifier.coef_.shape[1]:
+            raise ValueError("Classifier does not match the preprocessor")
+        return LinearPredictor(encoder, classifier.classes_, classifier.coef_, classifier.intercept_)
+
+
+ENGINES = {engine.name: engine for engine in (ForestEngine(), LinearEngine())}
+DEFAULT_ENGINE = "forest"
+
+
+def get(name):
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown categorizer engine {name!r}; choose from {', '.join(ENGINES)}")
+
+
+def for_pipeline(pipeline):
+    """The engine that built ``pipeline``; models from before engines count as forest."""
+    metadata = getattr(pipeline, "metadata_", None) or {}
+    if "engine" in metadata:
+        return get(metadata["engine"])
+    classifier = pipeline.steps[-1][1]
+    return ENGINES["linear" if hasattr(classifier, "coef_") else "forest"]
+
+
+def compile_pipeline(pipeline):
+    """Compile ``pipeline`` for serving, or None if its layout is unsupported."""
+    steps = getattr(pipeline, "steps", None)
+    if not steps or len(steps) != 2:
+        return None
+    try:
+        return for_pipeline(pipeline).compile(pipeline)
+    except (ValueError, AttributeError):
+        return None
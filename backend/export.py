@@ -0,0 +1,67 @@
+"""Streaming serializers for ``GET /transactions/export``.
+
+Rows arrive from a server-side cursor and leave as text chunks of roughly
+``CHUNK_BYTES``, so memory use depends on the chunk size rather than on how
+many transactions a user has.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+from pagination import serialize_row
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# Rows fetched per round trip from the database cursor
+FETCH_SIZE = 1000
+CHUNK_BYTES = 64 * 1024
+
+
+def csv_chunks(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow(serialize_row(row, fields).values())
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(rows, fields):
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps(serialize_row(row, fields), separators=(",", ":")) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield "".join(lines)
+
+
+SERIALIZERS = {"csv": csv_chunks, "ndjson": ndjson_chunks}
+
+
+def gzip_chunks(chunks):
+    """Compress text chunks into a single gzip member as they are produced."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(rows, fields, file_format, compress=False):
+    chunks = SERIALIZERS[file_format](rows, fields)
+    if compress:
+        return gzip_chunks(chunks)
+    return (chunk.encode() for chunk in chunks)
@@ -0,0 +1,177 @@
+"""Feature definitions shared by model training and request-time inference.
+
+Training builds the sklearn ColumnTransformer from ``build_preprocessor()``,
+with a TF-IDF or a hashing vectorizer for the description. At request time
+``CompiledEncoder`` reproduces that fitted transformer from plain arrays and
+dicts, turning rows into the exact sparse matrix the classifier was trained
+on without constructing a pandas DataFrame.
+"""
+
+from math import sqrt
+
+import numpy as np
+from scipy import sparse
+
+NUMERIC_FEATURES = ["amount", "day", "weekday", "month"]
+TEXT_FEATURE = "description"
+FEATURE_COLUMNS = ["amount", "description", "day", "weekday", "month"]
+# Hashed description columns; only the few thousand that occur get weights
+HASH_FEATURES = 2**18
+
+
+def temporal_features(dates):
+    """Return (day, weekday, month) int arrays for a sequence of dates."""
+    day = np.fromiter((d.day for d in dates), dtype=np.int64, count=len(dates))
+    weekday = np.fromiter((d.weekday() for d in dates), dtype=np.int64, count=len(dates))
+    month = np.fromiter((d.month for d in dates), dtype=np.int64, count=len(dates))
+    return day, weekday, month
+
+
+def build_preprocessor(text="tfidf"):
+    """The unfitted column transformer used by train_expense_model.py.
+
+    ``text`` is "tfidf" or "hashing" (stateless, no vocabulary to store).
+    """
+    from sklearn.compose import ColumnTransformer
+    from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+    from sklearn.preprocessing import StandardScaler
+
+    if text == "hashing":
+        vectorizer = HashingVectorizer(n_features=HASH_FEATURES, alternate_sign=False)
+    else:
+        vectorizer = TfidfVectorizer()
+    return ColumnTransformer(
+        transformers=[
+            ("num", StandardScaler(), NUMERIC_FEATURES),
+            ("text", vectorizer, TEXT_FEATURE),
+        ]
+    )
+
+
+class CompiledEncoder:
+    """Plain-Python equivalent of a fitted ``build_preprocessor()`` transformer."""
+
+    def __init__(self, mean, scale, analyzer, vocabulary, idf, sparse_output, hash_features=None):
+        """Pass ``vocabulary`` and ``idf`` for TF-IDF, or ``hash_features`` for hashing."""
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.analyzer = analyzer
+        self.vocabulary = vocabulary
+        self.idf = None if idf is None else np.asarray(idf, dtype=np.float64)
+        self.sparse_output = sparse_output
+        self.hash_features = hash_features
+        text_features = hash_features if vocabulary is None else len(self.idf)
+        self.n_features = len(NUMERIC_FEATURES) + text_features
+        if vocabulary is None:
+            from sklearn.utils import murmurhash3_32
+
+            self._hash = murmurhash3_32
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """Compile the first step of ``pipeline``; raise ValueError if unsupported."""
+        preprocessor = pipeline.steps[0][1]
+        transformers = getattr(preprocessor, "transformers_", None)
+        names = [name for name, _, _ in transformers or []]
+        if names[:2] != ["num", "text"] or getattr(preprocessor, "remainder", None) != "drop":
+            raise ValueError("Unsupported preprocessor layout")
+        _, scaler, numeric = transformers[0]
+        _, vectorizer, text = transformers[1]
+        if list(numeric) != NUMERIC_FEATURES or text != TEXT_FEATURE:
+            raise ValueError("Unsupported feature columns")
+        if not (scaler.with_mean and scaler.with_std):
+            raise ValueError("Unsupported scaler configuration")
+        if not hasattr(vectorizer, "vocabulary_"):
+            # HashingVectorizer: stateless, same analyzer options
+            if vectorizer.norm != "l2" or vectorizer.alternate_sign or vectorizer.binary:
+                raise ValueError("Unsupported vectorizer configuration")
+            return cls(
+                mean=scaler.mean_,
+                scale=scaler.scale_,
+                analyzer=vectorizer.build_analyzer(),
+                vocabulary=None,
+                idf=None,
+                sparse_output=preprocessor.sparse_output_,
+                hash_features=vectorizer.n_features,
+            )
+        if (
+            vectorizer.norm != "l2"
+            or not vectorizer.use_idf
+            or vectorizer.sublinear_tf
+            or vectorizer.binary
+        ):
+            raise ValueError("Unsupported vectorizer configuration")
+        return cls(
+            mean=scaler.mean_,
+            scale=scaler.scale_,
+            analyzer=vectorizer.build_analyzer(),
+            vocabulary=dict(vectorizer.vocabulary_),
+            idf=vectorizer.idf_,
+            sparse_output=preprocessor.sparse_output_,
+        )
+
+    def _text_row(self, description):
+        counts = {}
+        if self.vocabulary is None:
+            for token in self.analyzer(description):
+                # HashingVectorizer's index: abs of the signed 32-bit murmurhash
+                column = abs(self._hash(token)) % self.hash_features
+                counts[column] = counts.get(column, 0) + 1
+            columns = sorted(counts)
+            values = [float(counts[c]) for c in columns]
+        else:
+            for token in self.analyzer(description):
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    counts[column] = counts.get(column, 0) + 1
+            columns = sorted(counts)
+            values = [counts[c] * self.idf[c] for c in columns]
+        # Same summation order as sklearn's in-place CSR l2 normalization
+        norm = 0.0
+        for value in values:
+            norm += value * value
+        if norm > 0:
+            norm = sqrt(norm)
+            values = [value / norm for value in values]
+        return columns, values
+
+    def encode(self, rows):
+        """Return the (columns, values) of each encoded row's nonzero entries.
+
+        ``rows`` are dicts with amount, description and date (a datetime.date).
+        """
+        n = len(rows)
+        day, weekday, month = temporal_features([row["date"] for row in rows])
+        numeric = np.empty((n, len(NUMERIC_FEATURES)), dtype=np.float64)
+        numeric[:, 0] = [float(row["amount"]) for row in rows]
+        numeric[:, 1] = day
+        numeric[:, 2] = weekday
+        numeric[:, 3] = month
+        numeric -= self.mean
+        numeric /= self.scale
+
+        offset = len(NUMERIC_FEATURES)
+        encoded = []
+        for i, row in enumerate(rows):
+            columns, values = self._text_row(row["description"])
+            encoded.append(
+                (list(range(offset)) + [offset + c for c in columns], numeric[i].tolist() + values)
+            )
+        return encoded
+
+    def transform(self, rows):
+        """Encode rows (see ``encode``) into the classifier's input matrix."""
+        n = len(rows)
+        indptr = [0]
+        indices = []
+        data = []
+        for columns, values in self.encode(rows):
+            indices.extend(columns)
+            data.extend(values)
+            indptr.append(len(indices))
+
+        matrix = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64), indices, indptr),
+            shape=(n, self.n_features),
+        )
+        return matrix if self.sparse_output else matrix.toarray()
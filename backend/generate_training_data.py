@@ -1,16 +1,33 @@
-import pandas as pd
 from datetime import datetime, timedelta
 import random
 
-from app import app
-from extensions import db
-from models.transaction_model import Transaction
-from models.user_model import User
-
 # 👉 Set your target username
 USERNAME = "Kaloyan"
 
-data = []
+# 🔁 Recurring transactions: description, category, amount, first day of the
+# phase it starts on, interval in days and date jitter in days
+RECURRING = [
+    ("Monthly rent", "housing", 500, 0, 30, 0),
+    ("Monthly salary", "income", 1500, 0, 30, 0),
+    ("Netflix subscription", "entertainment", 19.99, 1, 30, 0),
+    ("Internet service", "utilities", 40, 4, 30, 0),
+    ("Electric bill", "utilities", 90, 5, 30, 0),
+    ("Groceries", "food", 60, 2, 14, 3),
+    ("Lunch Subway", "food", 12, 3, 7, 2),
+    ("Uber ride", "transport", 10, 4, 5, 1),
+    ("Pharmacy supplies", "health", 15, 7, 21, 2),
+    ("Haircut", "personal", 18, 11, 30, 0),
+]
+
+# 🛍️ Occasional shopping, one purchase every 8 days
+SHOPPING_PHASE_1 = (
+    ["New jacket", "Shoes", "Zara T-shirt", "Tech gadget", "Home decor"],
+    (25, 100),
+)
+SHOPPING_PHASE_2 = (
+    ["Sneakers", "Bluetooth speaker", "Summer dress", "AC service", "Books"],
+    (30, 110),
+)
 
 
 # Helper to assign type
@@ -20,14 +37,23 @@ def get_type(category):
 
 # Repeating transaction generator with date validation
 def add_repeating(
-    description, category, amount, start, end, interval_days, jitter=0, fluctuation=0.15
+    data,
+    description,
+    category,
+    amount,
+    start,
+    end,
+    interval_days,
+    jitter=0,
+    fluctuation=0.15,
+    rng=random,
 ):
     date = start
     used_dates = set()  # Track used dates to prevent duplicates
 
     while date <= end:
         # Add jitter to the date
-        jittered_date = date + timedelta(days=random.randint(-jitter, jitter))
+        jittered_date = date + timedelta(days=rng.randint(-jitter, jitter))
 
         # Skip if date is already used or outside our range
         if jittered_date.date().isoformat() in used_dates or jittered_date > end:
@@ -35,9 +61,7 @@ def add_repeating(
             continue
 
         used_dates.add(jittered_date.date().isoformat())
-        varied_amount = round(
-            amount * random.uniform(1 - fluctuation, 1 + fluctuation), 2
-        )
+        varied_amount = round(amount * rng.uniform(1 - fluctuation, 1 + fluctuation), 2)
 
         data.append(
             {
@@ -51,250 +75,104 @@ def add_repeating(
         date += timedelta(days=interval_days)
 
 
-# 🔁 Phase 1: Jan–Apr 2024 (using current year)
-current_year = datetime.now().year
-add_repeating(
-    "Monthly rent",
-    "housing",
-    500,
-    datetime(current_year, 1, 1),
-    datetime(current_year, 4, 30),
-    30,
-)
-add_repeating(
-    "Monthly salary",
-    "income",
-    1500,
-    datetime(current_year, 1, 1),
-    datetime(current_year, 4, 30),
-    30,
-)
-add_repeating(
-    "Netflix subscription",
-    "entertainment",
-    19.99,
-    datetime(current_year, 1, 2),
-    datetime(current_year, 4, 30),
-    30,
-)
-add_repeating(
-    "Internet service",
-    "utilities",
-    40,
-    datetime(current_year, 1, 5),
-    datetime(current_year, 4, 30),
-    30,
-)
-add_repeating(
-    "Electric bill",
-    "utilities",
-    90,
-    datetime(current_year, 1, 6),
-    datetime(current_year, 4, 30),
-    30,
-)
-add_repeating(
-    "Groceries",
-    "food",
-    60,
-    datetime(current_year, 1, 3),
-    datetime(current_year, 4, 30),
-    14,
-    jitter=3,
-)
-add_repeating(
-    "Lunch Subway",
-    "food",
-    12,
-    datetime(current_year, 1, 4),
-    datetime(current_year, 4, 30),
-    7,
-    jitter=2,
-)
-add_repeating(
-    "Uber ride",
-    "transport",
-    10,
-    datetime(current_year, 1, 5),
-    datetime(current_year, 4, 30),
-    5,
-    jitter=1,
-)
-add_repeating(
-    "Pharmacy supplies",
-    "health",
-    15,
-    datetime(current_year, 1, 8),
-    datetime(current_year, 4, 30),
-    21,
-    jitter=2,
-)
-add_repeating(
-    "Haircut",
-    "personal",
-    18,
-    datetime(current_year, 1, 12),
-    datetime(current_year, 4, 30),
-    30,
-)
-
-# 🛍️ Random shopping with date validation
-used_dates = set()
-random_days1 = pd.date_range(
-    start=f"{current_year}-01-01", end=f"{current_year}-04-30", freq="8D"
-)
-for d in random_days1:
-    date_str = d.date().isoformat()
-    if date_str not in used_dates:
-        used_dates.add(date_str)
+# Random shopping every 8 days
+def add_shopping(data, start, end, items, amount_range, rng=random):
+    date = start
+    while date <= end:
         data.append(
             {
-                "description": random.choice(
-                    ["New jacket", "Shoes", "Zara T-shirt", "Tech gadget", "Home decor"]
-                ),
+                "description": rng.choice(items),
                 "category": "shopping",
-                "amount": round(random.uniform(25, 100), 2),
+                "amount": round(rng.uniform(*amount_range), 2),
                 "type": "spending",
-                "date": date_str,
+                "date": date.date().isoformat(),
             }
         )
-
-# 🔁 Phase 2: May–Aug 2024
-add_repeating(
-    "Monthly rent",
-    "housing",
-    500,
-    datetime(current_year, 5, 1),
-    datetime(current_year, 8, 31),
-    30,
-)
-add_repeating(
-    "Monthly salary",
-    "income",
-    1500,
-    datetime(current_year, 5, 1),
-    datetime(current_year, 8, 31),
-    30,
-)
-add_repeating(
-    "Netflix subscription",
-    "entertainment",
-    19.99,
-    datetime(current_year, 5, 2),
-    datetime(current_year, 8, 31),
-    30,
-)
-add_repeating(
-    "Internet service",
-    "utilities",
-    40,
-    datetime(current_year, 5, 5),
-    datetime(current_year, 8, 31),
-    30,
-)
-add_repeating(
-    "Electric bill",
-    "utilities",
-    90,
-    datetime(current_year, 5, 6),
-    datetime(current_year, 8, 31),
-    30,
-)
-add_repeating(
-    "Groceries",
-    "food",
-    60,
-    datetime(current_year, 5, 3),
-    datetime(current_year, 8, 31),
-    14,
-    jitter=3,
-)
-add_repeating(
-    "Lunch Subway",
-    "food",
-    12,
-    datetime(current_year, 5, 4),
-    datetime(current_year, 8, 31),
-    7,
-    jitter=2,
-)
-add_repeating(
-    "Uber ride",
-    "transport",
-    10,
-    datetime(current_year, 5, 5),
-    datetime(current_year, 8, 31),
-    5,
-    jitter=1,
-)
-add_repeating(
-    "Pharmacy supplies",
-    "health",
-    15,
-    datetime(current_year, 5, 8),
-    datetime(current_year, 8, 31),
-    21,
-    jitter=2,
-)
-add_repeating(
-    "Haircut",
-    "personal",
-    18,
-    datetime(current_year, 5, 12),
-    datetime(current_year, 8, 31),
-    30,
-)
-
-# 🛍️ Random shopping (May–Aug) with date validation
-random_days2 = pd.date_range(
-    start=f"{current_year}-05-02", end=f"{current_year}-08-31", freq="8D"
-)
-for d in random_days2:
-    date_str = d.date().isoformat()
-    if date_str not in used_dates:
-        used_dates.add(date_str)
-        data.append(
-            {
-                "description": random.choice(
-                    [
-                        "Sneakers",
-                        "Bluetooth speaker",
-                        "Summer dress",
-                        "AC service",
-                        "Books",
-                    ]
-                ),
-                "category": "shopping",
-                "amount": round(random.uniform(30, 110), 2),
-                "type": "spending",
-                "date": date_str,
-            }
+        date += timedelta(days=8)
+
+
+def generate_phase(start, end, shopping=SHOPPING_PHASE_1, rng=random):
+    """Synthesize one phase of a user's history between two datetimes."""
+    data = []
+    for description, category, amount, offset, interval, jitter in RECURRING:
+        add_repeating(
+            data,
+            description,
+            category,
+            amount,
+            start + timedelta(days=offset),
+            end,
+            interval,
+            jitter=jitter,
+            rng=rng,
         )
+    items, amount_range = shopping
+    add_shopping(data, start, end, items, amount_range, rng=rng)
+    return data
+
+
+def generate_history(start, end, phase_days=120, rng=random):
+    """Synthesize a history of back-to-back phases covering [start, end].
+
+    Phases alternate between the two shopping catalogues, like the Jan–Apr
+    and May–Aug data this script originally produced.
+    """
+    data = []
+    phase_start = start
+    phase = 0
+    while phase_start <= end:
+        phase_end = min(phase_start + timedelta(days=phase_days - 1), end)
+        shopping = SHOPPING_PHASE_1 if phase % 2 == 0 else SHOPPING_PHASE_2
+        data.extend(generate_phase(phase_start, phase_end, shopping, rng=rng))
+        phase_start = phase_end + timedelta(days=1)
+        phase += 1
+    # Sort data by date
+    data.sort(key=lambda x: x["date"])
+    return data
+
+
+def main():
+    from app import app
+    from sqlalchemy import delete
+
+    import aggregates
+    import importer
+    import shards
+    from models.transaction_model import Transaction
+    from models.user_model import User
+
+    # 🔁 Phase 1: Jan–Apr and Phase 2: May–Aug (using current year)
+    current_year = datetime.now().year
+    data = generate_phase(
+        datetime(current_year, 1, 1), datetime(current_year, 4, 30), SHOPPING_PHASE_1
+    )
+    data += generate_phase(
+        datetime(current_year, 5, 1), datetime(current_year, 8, 31), SHOPPING_PHASE_2
+    )
+
+    # Sort data by date
+    data.sort(key=lambda x: x["date"])
+
+    # 🚀 Insert into database
+    with app.app_context():
+        user = User.query.filter_by(username=USERNAME).first()
+        if not user:
+            print(f"❌ No user found with username '{USERNAME}'.")
+            return
+
+        # Clear existing transactions for this user, on the shard the
+        # importer writes to
+        session = shards.session_for(user.id)
+        session.execute(delete(Transaction).where(Transaction.user_id == user.id))
+        session.commit()
+
+        report = importer.import_records(user.id, data, mode="append", session=session)
+        count = report["inserted"]
+        # The bulk delete above bypasses the rollup bookkeeping
+        aggregates.rebuild(session.connection(), user.id)
+        session.commit()
+        print(f"✅ {count} transactions inserted for user '{USERNAME}' (ID {user.id}).")
 
-# Sort data by date
-data.sort(key=lambda x: x["date"])
-
-# 🚀 Insert into database
-with app.app_context():
-    user = User.query.filter_by(username=USERNAME).first()
-    if not user:
-        print(f"❌ No user found with username '{USERNAME}'.")
-    else:
-        # Clear existing transactions for this user
-        Transaction.query.filter_by(user_id=user.id).delete()
-        db.session.commit()
 
-        count = 0
-        for entry in data:
-            tx = Transaction(
-                user_id=user.id,
-                description=entry["description"],
-                category=entry["category"],
-                amount=entry["amount"],
-                type=entry["type"],
-                date=entry["date"],
-            )
-            db.session.add(tx)
-            count += 1
-        db.session.commit()
-        print(f"✅ {count} transactions inserted for user '{USERNAME}' (ID {user.id}).")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""Streaming import of bank exports (CSV, OFX, QIF) into a user's transactions.
+
+Files are read lazily and processed in chunks: every chunk is validated,
+categorized with one model call, checked for duplicates against what the
+user already has, written with multi-row INSERTs and committed, so memory
+stays bounded by the chunk size plus one counter per distinct row rather
+than by the file size.
+"""
+
+import csv
+import io
+import re
+import time
+from datetime import date
+from collections import Counter, defaultdict
+from itertools import islice
+
+from sqlalchemy import select
+
+import aggregates
+import categorizer
+import overrides
+import personal_models
+import shards
+from models.transaction_model import Transaction, parse_date
+from prediction_cache import normalize_description
+
+FORMATS = ("csv", "ofx", "qif")
+# skip: leave rows that already exist alone; append: insert everything;
+# upsert: update the category/type of rows that already exist
+MODES = ("skip", "append", "upsert")
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 20
+
+
+def detect_format(filename):
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension in FORMATS:
+        return extension
+    raise ValueError(f"Cannot tell the format of {filename!r}; pass one of {FORMATS}")
+
+
+def read_csv(stream):
+    """Yield dicts from a CSV with description, amount and date columns.
+
+    Optional ``type`` and ``category`` columns are honoured; as in the
+    original loader, a category of ``income`` implies an income row.
+    """
+    for row in csv.DictReader(stream):
+        record = {
+            "description": row.get("description"),
+            "amount": row.get("amount"),
+            "date": row.get("date"),
+        }
+        category = (row.get("category") or "").strip()
+        type_ = (row.get("type") or "").strip()
+        if category:
+            record["category"] = category
+        if type_:
+            record["type"] = type_
+        elif category:
+            record["type"] = "income" if category == "income" else "spending"
+        yield record
+
+
+def _signed(record, amount):
+    record["amount"] = abs(amount)
+    record.setdefault("type", "income" if amount > 0 else "spending")
+    return record
+
+
+_ofx_tag = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)")
+
+
+def read_ofx(stream):
+    """Yield dicts from the STMTTRN blocks of an OFX 1.x (SGML) or 2.x (XML) file."""
+    current = None
+    for line in stream:
+        for closing, tag, value in _ofx_tag.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if closing and current is not None:
+                    yield _ofx_record(current)
+                    current = None
+                elif not closing:
+                    current = {}
+            elif current is not None and not closing and value.strip():
+                current[tag] = value.strip()
+
+
+def _ofx_record(fields):
+    description = fields.get("NAME") or fields.get("MEMO") or fields.get("PAYEE")
+    posted = fields.get("DTPOSTED", "")
+    return {"description": description, "date": posted[:8], "raw_amount": fields.get("TRNAMT")}
+
+
+def read_qif(stream):
+    """Yield dicts from a QIF bank register (D date, T amount, P payee, M memo)."""
+    fields = {}
+    for line in stream:
+        line = line.rstrip("\r\n")
+        if not line or line.startswith("!"):
+            continue
+        if line.startswith("^"):
+            if fields:
+                yield {
+                    "description": fields.get("P") or fields.get("M"),
+                    "date": fields.get("D"),
+                    "raw_amount": fields.get("T") or fields.get("U"),
+                }
+            fields = {}
+            continue
+        fields.setdefault(line[0], line[1:].strip())
+    if fields:
+        yield {
+            "description": fields.get("P") or fields.get("M"),
+            "date": fields.get("D"),
+            "raw_amount": fields.get("T") or fields.get("U"),
+        }
+
+
+READERS = {"csv": read_csv, "ofx": read_ofx, "qif": read_qif}
+
+
+def _parse_compact_date(value):
+    value = value.strip()
+    if re.fullmatch(r"\d{8}", value):
+        return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+    # QIF: M/D/YY, M/D/YYYY or M/D'YY
+    match = re.fullmatch(r"(\d{1,2})/\s*(\d{1,2})(?:/|')\s*(\d{2}|\d{4})", value)
+    if match:
+        month, day, year = (int(part) for part in match.groups())
+        if year < 100:
+            year += 2000
+        return date(year, month, day)
+    return parse_date(value)
+
+
+def _parse_amount(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("amount is required")
+    try:
+        return float(value.replace(",", "").strip())
+    except ValueError:
+        raise ValueError(f"Invalid amount: {value!r}")
+
+
+def validate(record):
+    """Return a clean transaction dict (without user or category) or raise ValueError."""
+    description = record.get("description")
+    if not isinstance(description, str) or not description.strip():
+        raise ValueError("description is required")
+    raw_date = record.get("date")
+    if not raw_date:
+        raise ValueError("date is required")
+    try:
+        day = _parse_compact_date(raw_date) if isinstance(raw_date, str) else parse_date(raw_date)
+    except ValueError:
+        raise ValueError(f"Invalid date: {raw_date!r}")
+
+    clean = {"description": description.strip()[:200], "date": day}
+    if "raw_amount" in record:
+        _signed(clean, _parse_amount(record["raw_amount"]))
+        if record.get("type"):
+            clean["type"] = record["type"]
+    else:
+        clean["amount"] = _parse_amount(record.get("amount"))
+        clean["type"] = record.get("type") or "spending"
+    if clean["type"] not in ("income", "spending"):
+        raise ValueError(f"Invalid type: {clean['type']!r}")
+    if record.get("category"):
+        clean["category"] = str(record["category"]).strip().lower()[:100]
+    return clean
+
+
+def fingerprint(row):
+    return (row["date"], round(float(row["amount"]), 2), normalize_description(row["description"]))
+
+
+def _existing(session, user_id, rows):
+    """Map fingerprints of the user's stored transactions in the chunk's date span to their ids."""
+    start = min(row["date"] for row in rows)
+    end = max(row["date"] for row in rows)
+    stmt = select(
+        Transaction.id, Transaction.date, Transaction.amount, Transaction.description
+    ).where(
+        Transaction.user_id == user_id,
+        Transaction.date >= start,
+        Transaction.date <= end,
+    ).order_by(Transaction.id)
+    existing = defaultdict(list)
+    for row in session.execute(stmt):
+        existing[fingerprint(row._mapping)].append(row.id)
+    return existing
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_records(
+    user_id, records, mode="skip", chunk_size=DEFAULT_CHUNK_SIZE, session=None, progress=None
+):
+    """Validate, categorize and store an iterable of raw records for ``user_id``.
+
+    Returns a report dict with counts, the first few row errors and rows/sec.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    session = session or shards.session_for(user_id)
+    report = {
+        "rows_read": 0,
+        "inserted": 0,
+        "updated": 0,
+        "duplicates": 0,
+        "invalid": 0,
+        "errors": [],
+    }
+    started = time.perf_counter()
+    # Occurrences of each fingerprint in the file so far, matched or inserted
+    claimed = Counter()
+    override_index = overrides.index_for(user_id)
+    personal_model = personal_models.model_for(user_id)
+
+    for chunk in _chunks(records, chunk_size):
+        rows = []
+        for record in chunk:
+            report["rows_read"] += 1
+            try:
+                rows.append(validate(record))
+            except ValueError as e:
+                report["invalid"] += 1
+                if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                    report["errors"].append({"row": report["rows_read"], "error": str(e)})
+        if not rows:
+            continue
+
+        uncategorized = [row for row in rows if "category" not in row]
+        for row, category in zip(
+            uncategorized, categorizer.categorize(
+                uncategorized, override_index=override_index, personal_model=personal_model
+            )
+        ):
+            row["category"] = category
+
+        new_rows = rows
+        if mode != "append":
+            # Deduplicate by count: the n-th occurrence of a fingerprint in the
+            # file matches the n-th stored row and only the excess is inserted,
+            # so a re-import is a no-op while genuine repeats (two coffees on
+            # one day) are kept. Earlier chunks are committed, so the rows they
+            # inserted are counted in ``existing`` as well as in ``claimed``.
+            existing = _existing(session, user_id, rows)
+            new_rows = []
+            updates = {}
+            for row in rows:
+                key = fingerprint(row)
+                ids = existing.get(key, ())
+                if claimed[key] < len(ids):
+                    report["duplicates"] += 1
+                    updates[ids[claimed[key]]] = row
+                else:
+                    new_rows.append(row)
+                claimed[key] += 1
+            if mode == "upsert" and updates:
+                # Through the ORM so the daily rollup follows the changes
+                for transaction in session.scalars(
+                    select(Transaction).where(Transaction.id.in_(updates))
+                ):
+                    row = updates[transaction.id]
+                    if (transaction.category, transaction.type) != (row["category"], row["type"]):
+                        transaction.category = row["category"]
+                        transaction.type = row["type"]
+                        report["updated"] += 1
+
+        for row in new_rows:
+            row["user_id"] = user_id
+        if new_rows:
+            aggregates.bulk_insert(session, new_rows)
+            report["inserted"] += len(new_rows)
+        session.commit()
+        if progress:
+            progress(report)
+
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows_read"] / elapsed, 1) if elapsed else 0.0
+    return report
+
+
+def import_file(user_id, stream, file_format, **kwargs):
+    """Import a binary or text stream in ``file_format``; see ``import_records``."""
+    if file_format not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    return import_records(user_id, READERS[file_format](stream), **kwargs)
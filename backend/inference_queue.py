@@ -0,0 +1,128 @@
+"""Coalesce concurrent categorization requests into shared model calls.
+
+Requests submitted within ``window_ms`` of the first waiting one (or until
+``max_batch`` rows are queued) are predicted together by a background thread
+and the results are fanned back out through futures. Callers that wait
+longer than ``max_wait_ms`` give up on the queue and predict inline, which
+keeps the worst-case latency bounded even if the worker falls behind.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import instrumentation
+
+# Upper bounds (inclusive) of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, window_ms=3.0, max_batch=64, max_wait_ms=50.0):
+        self.predict_fn = predict_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {
+            "batches": 0,
+            "items": 0,
+            "fallbacks": 0,
+            "errors": 0,
+            "queue_delay_total_ms": 0.0,
+            "queue_delay_max_ms": 0.0,
+            "batch_size_max": 0,
+        }
+        self._batch_sizes = {bound: 0 for bound in BATCH_SIZE_BUCKETS}
+        self._batch_sizes["+Inf"] = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="inference-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, row):
+        """Queue one row and return a Future resolving to its category."""
+        self.start()
+        future = Future()
+        self._queue.put((row, future, time.perf_counter()))
+        return future
+
+    def predict(self, row):
+        """Predict one row through the queue, falling back to an inline call."""
+        future = self.submit(row)
+        try:
+            return future.result(timeout=self.max_wait)
+        except FutureTimeoutError:
+            # The row may still be predicted later; nobody will read that result
+            future.cancel()
+            with self._lock:
+                self._stats["fallbacks"] += 1
+            return self.predict_fn([row])[0]
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            live = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not live:
+                continue
+            try:
+                results = self.predict_fn([row for row, _, _ in live])
+            except Exception as e:
+                for _, future, _ in live:
+                    future.set_exception(e)
+                with self._lock:
+                    self._stats["errors"] += 1
+                continue
+            for (_, future, _), result in zip(live, results):
+                future.set_result(result)
+            self._record(len(live), [started - queued for _, _, queued in live])
+
+    def _record(self, size, delays):
+        with self._lock:
+            stats = self._stats
+            stats["batches"] += 1
+            stats["items"] += size
+            stats["batch_size_max"] = max(stats["batch_size_max"], size)
+            delays_ms = [d * 1000 for d in delays]
+            stats["queue_delay_total_ms"] += sum(delays_ms)
+            stats["queue_delay_max_ms"] = max(stats["queue_delay_max_ms"], *delays_ms)
+            bucket = next((b for b in BATCH_SIZE_BUCKETS if size <= b), "+Inf")
+            self._batch_sizes[bucket] += 1
+        # The same, process-wide, for GET /metrics
+        instrumentation.INFERENCE_BATCH_SIZE.observe((), size)
+        for delay in delays:
+            instrumentation.INFERENCE_QUEUE_SECONDS.observe((), delay)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["batch_size_histogram"] = dict(self._batch_sizes)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["batch_size_mean"] = (
+            stats["items"] / stats["batches"] if stats["batches"] else 0.0
+        )
+        stats["queue_delay_mean_ms"] = (
+            stats["queue_delay_total_ms"] / stats["items"] if stats["items"] else 0.0
+        )
+        return stats
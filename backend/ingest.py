@@ -0,0 +1,469 @@
+"""Optional write-behind ingestion of single transactions.
+
+    INGEST_LOG_DIR=/var/lib/budgethelper/ingest gunicorn -w 4 --threads 8 app:app
+
+With ``INGEST_LOG_DIR`` set, ``POST /transactions`` appends the categorized
+transaction to this worker's append-only log and answers ``202`` as soon as
+the line is on disk. Concurrent requests share one fsync (group commit): the
+first to sync covers every line written before it, so under load a worker
+pays a fraction of an fsync per transaction instead of a database commit.
+
+A background thread writes the log to the database in batches of up to
+``batch_max`` rows, at most ``flush_ms`` after the first one arrives, with
+``aggregates.bulk_insert`` on each user's shard. Every batch also records
+the log's sequence number in that database's ``ingest_checkpoint``, in the
+same transaction. Once everything written has been committed the log file
+is truncated, and the committed sequence number is published in a
+``<log>.committed`` file next to it.
+
+The response records the sequence number under the log's id in the user's
+session, one entry per log the session wrote to. Reads call ``wait_for``
+with them first. This worker's own log is flushed
+immediately; another worker's is polled through its ``.committed`` file.
+Either way a user sees their own writes on whichever worker serves the read.
+
+Each log is held with an exclusive ``flock`` while its worker runs. On
+startup ``configure`` replays the logs whose lock it can take, that is,
+those of workers that died, skipping records at or below each database's
+checkpoint. Nothing acknowledged is lost and nothing is inserted twice.
+
+A failed batch is retried the same way, so shards that committed their part
+are skipped. A record the database rejects for good (``REJECTED``) is not
+retried: it is appended to ``<log>.dead-letter`` with the error and the log
+moves on past it.
+"""
+
+import atexit
+import fcntl
+import glob
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import date
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import DataError, IntegrityError
+
+import aggregates
+import shards
+from models.ingest_checkpoint_model import IngestCheckpoint
+
+checkpoint_table = IngestCheckpoint.__table__
+# Queue entry asking the writer to commit what it has right away
+_FLUSH = object()
+_STOP = object()
+# Errors retrying will not fix: the record itself is bad for the database
+REJECTED = (IntegrityError, DataError, KeyError, TypeError, ValueError)
+
+
+class IngestLog:
+    """An append-only JSON-lines file whose appends share fsyncs."""
+
+    def __init__(self, directory, fsync=True):
+        os.makedirs(directory, exist_ok=True)
+        self.id = f"{socket.gethostname()}-{os.getpid()}-{time.time_ns()}"
+        self.path = os.path.join(directory, f"{self.id}.log")
+        self.fsync = fsync
+        self._file = open(self.path, "ab")
+        fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.written = 0
+        self.synced = 0
+        self.fsyncs = 0
+
+    def append(self, record, then=None):
+        """Write ``record`` and return its sequence number once it is durable.
+
+        ``then(seq, record)`` runs under the append lock, so it sees records
+        in sequence order.
+        """
+        with self._lock:
+            self.written += 1
+            seq = self.written
+            self._file.write(json.dumps({"seq": seq, **record}).encode() + b"\n")
+            self._file.flush()
+            if then is not None:
+                then(seq, record)
+        self._sync(seq)
+        return seq
+
+    def _sync(self, seq):
+        if not self.fsync:
+            return
+        with self._sync_lock:
+            # A sync that started after this record was written covered it
+            if self.synced >= seq:
+                return
+            with self._lock:
+                target = self.written
+            os.fsync(self._file.fileno())
+            self.synced = target
+            self.fsyncs += 1
+
+    def truncate(self, committed):
+        """Empty the file if every record up to the last written is committed."""
+        with self._lock:
+            if committed == self.written and self._file.tell():
+                self._file.truncate(0)
+                return True
+        return False
+
+    def close(self):
+        self._file.close()
+
+
+def read_log(path):
+    """The records of a log file; a torn last line (never acknowledged) is dropped."""
+    with open(path, "rb") as f:
+        return _read_records(f)
+
+
+def _read_records(f):
+    records = []
+    for line in f:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            break
+    return records
+
+
+def _row(record):
+    return {
+        "user_id": record["user_id"],
+        "description": record["description"],
+        "amount": record["amount"],
+        "category": record["category"],
+        "type": record["type"],
+        "date": date.fromisoformat(record["date"]),
+    }
+
+
+def checkpoint(session, log_id):
+    seq = session.execute(
+        select(checkpoint_table.c.seq).where(checkpoint_table.c.log_id == log_id)
+    ).scalar()
+    return seq or 0
+
+
+def _set_checkpoint(session, log_id, seq):
+    # Only the log's owner (or the one process replaying it) writes its row
+    updated = session.execute(
+        update(checkpoint_table).where(checkpoint_table.c.log_id == log_id).values(seq=seq)
+    )
+    if not updated.rowcount:
+        session.execute(checkpoint_table.insert().values(log_id=log_id, seq=seq))
+
+
+def commit_records(log_id, records, skip_committed=False):
+    """Insert ``records`` (in sequence order) on their users' shards and checkpoint them.
+
+    Each database touched gets the batch's last sequence number. With
+    ``skip_committed`` records at or below a database's checkpoint are left
+    out (replaying a log after a crash).
+    """
+    groups = {}
+    for record in records:
+        session = shards.session_for(record["user_id"])
+        groups.setdefault(id(session), (session, []))[1].append(record)
+    last = records[-1]["seq"]
+    for session, group in groups.values():
+        try:
+            if skip_committed:
+                done = checkpoint(session, log_id)
+                group = [record for record in group if record["seq"] > done]
+            if group:
+                aggregates.bulk_insert(session, [_row(record) for record in group])
+            _set_checkpoint(session, log_id, last)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+
+def commit_or_reject(directory, log_id, records, retry=False):
+    """``commit_records``, setting aside records the database rejects; return how many.
+
+    On a ``REJECTED`` error the records are committed one at a time and the
+    ones that still fail go to ``<log_id>.dead-letter`` in ``directory``.
+    Other errors are raised for the caller to retry with ``retry=True``.
+    """
+    try:
+        commit_records(log_id, records, skip_committed=retry)
+        return 0
+    except REJECTED:
+        pass
+    rejected = 0
+    for record in records:
+        try:
+            commit_records(log_id, [record], skip_committed=True)
+        except REJECTED as e:
+            _dead_letter(directory, log_id, record, e)
+            rejected += 1
+    return rejected
+
+
+def _dead_letter(directory, log_id, record, error):
+    print(f"[INGEST] Rejected logged transaction {log_id}:{record.get('seq')}: {error}")
+    with open(os.path.join(directory, f"{log_id}.dead-letter"), "a") as f:
+        f.write(json.dumps({"record": record, "error": str(error)}, default=str) + "\n")
+    # Move the checkpoint past it, so a replay does not reject it again
+    if "user_id" in record:
+        session = shards.session_for(record["user_id"])
+        try:
+            if checkpoint(session, log_id) < record["seq"]:
+                _set_checkpoint(session, log_id, record["seq"])
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+
+def _write_watermark(directory, log_id, seq):
+    path = os.path.join(directory, f"{log_id}.committed")
+    with open(path + ".tmp", "w") as f:
+        f.write(str(seq))
+    os.replace(path + ".tmp", path)
+
+
+def read_watermark(directory, log_id):
+    """(log still exists, committed seq) for ``log_id``."""
+    exists = os.path.exists(os.path.join(directory, f"{log_id}.log"))
+    try:
+        with open(os.path.join(directory, f"{log_id}.committed")) as f:
+            return exists, int(f.read() or 0)
+    except (FileNotFoundError, ValueError):
+        return exists, 0
+
+
+class IngestWriter:
+    """The worker's log plus the thread group-committing it to the database."""
+
+    def __init__(self, directory, app_context, batch_max=500, flush_ms=10.0, fsync=True):
+        self.directory = directory
+        self.app_context = app_context
+        self.batch_max = batch_max
+        self.flush_interval = flush_ms / 1000
+        self.fsync = fsync
+        # Opened by start() in the process that uses it, so workers forked
+        # after import (gunicorn --preload) each get their own log
+        self.log = None
+        self._pid = None
+        self.committed = 0
+        self._queue = queue.Queue()
+        self._committed_cond = threading.Condition()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.rows_committed = 0
+        self.errors = 0
+        self.rejected = 0
+        self.commit_seconds = 0.0
+
+    @property
+    def log_id(self):
+        return self.log.id if self.log is not None and self._pid == os.getpid() else None
+
+    def start(self):
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # Pick up after workers that died since startup, too
+                replay(self.directory, self.app_context)
+                self.log = IngestLog(self.directory, fsync=self.fsync)
+                self._pid = os.getpid()
+                self.committed = 0
+                self._queue = queue.Queue()
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="ingest-writer", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, record):
+        """Durably log one transaction dict; return (log id, sequence number)."""
+        self.start()
+        seq = self.log.append(record, then=lambda seq, r: self._queue.put({"seq": seq, **r}))
+        return self.log.id, seq
+
+    def wait(self, seq, timeout):
+        """Commit now and wait until ``seq`` is in the database; False on timeout."""
+        if self.committed >= seq:
+            return True
+        self.start()
+        self._queue.put(_FLUSH)
+        deadline = time.monotonic() + timeout
+        with self._committed_cond:
+            while self.committed < seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._committed_cond.wait(remaining)
+        return True
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is _STOP or first is _FLUSH:
+            return first, []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_max:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _STOP or item is _FLUSH:
+                return item, batch
+            batch.append(item)
+        return None, batch
+
+    def _run(self):
+        while True:
+            signal, batch = self._next_batch()
+            if batch:
+                self._commit(batch)
+            if signal is _STOP:
+                return
+
+    def _commit(self, batch):
+        delay = 0.1
+        retry = False
+        while True:
+            started = time.perf_counter()
+            try:
+                with self.app_context():
+                    self.rejected += commit_or_reject(
+                        self.directory, self.log.id, batch, retry=retry
+                    )
+                break
+            except Exception as e:
+                # The records are safe in the log; keep retrying in order,
+                # skipping the databases that already committed their part
+                retry = True
+                self.errors += 1
+                print(f"[INGEST] Writing {len(batch)} transactions failed, retrying: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+        self.commit_seconds += time.perf_counter() - started
+        self.batches += 1
+        self.rows_committed += len(batch)
+        with self._committed_cond:
+            self.committed = batch[-1]["seq"]
+            self._committed_cond.notify_all()
+        _write_watermark(self.directory, self.log.id, self.committed)
+        self.log.truncate(self.committed)
+
+    def close(self, timeout=10.0):
+        """Commit what is queued and stop; the log stays if that does not finish."""
+        if self.log_id is None:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        if self.committed == self.log.written:
+            for suffix in (".log", ".committed"):
+                path = os.path.join(self.directory, self.log.id + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+        self.log.close()
+
+    def stats(self):
+        accepted = self.log.written if self.log_id is not None else 0
+        return {
+            "accepted": accepted,
+            "committed": self.rows_committed,
+            "pending": accepted - self.committed if accepted else 0,
+            "batches": self.batches,
+            "fsyncs": self.log.fsyncs if self.log else 0,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "commit_seconds": round(self.commit_seconds, 6),
+        }
+
+
+def replay(directory, app_context):
+    """Write the logs of dead workers in ``directory`` to the database; return rows read."""
+    rows = 0
+    for path in sorted(glob.glob(os.path.join(directory, "*.log"))):
+        log_id = os.path.basename(path)[: -len(".log")]
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            continue  # replayed by another worker meanwhile
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # its worker is alive
+            if not os.path.exists(path):
+                continue  # replayed and removed before we got the lock
+            records = _read_records(f)
+            if records:
+                with app_context():
+                    commit_or_reject(directory, log_id, records, retry=True)
+                print(f"[INGEST] Replayed {len(records)} logged transactions from {log_id}")
+            rows += len(records)
+            for suffix in (".committed", ".log"):
+                try:
+                    os.remove(os.path.join(directory, log_id + suffix))
+                except FileNotFoundError:
+                    pass
+    return rows
+
+
+# None = write-behind ingestion off (the default), see configure()
+writer = None
+directory = None
+
+
+def configure(log_dir=None, app_context=None, batch_max=500, flush_ms=10.0, fsync=True):
+    """Replay leftover logs in ``log_dir`` and start logging there (None = off)."""
+    global writer, directory
+    if writer is not None:
+        writer.close()
+    writer = None
+    directory = log_dir
+    if log_dir:
+        replay(log_dir, app_context)
+        writer = IngestWriter(log_dir, app_context, batch_max, flush_ms, fsync)
+    return writer
+
+
+@atexit.register
+def _close():
+    if writer is not None:
+        writer.close()
+
+
+def wait_for(markers, timeout=2.0):
+    """Wait until the logged writes ``markers`` = {log id: seq} are readable.
+
+    Returns the markers still pending at the timeout (empty when all are done).
+    """
+    deadline = time.monotonic() + timeout
+    pending = {}
+    # This worker's own log first: it can be flushed rather than polled
+    own = writer.log_id if writer is not None else None
+    for log_id, seq in sorted(markers.items(), key=lambda item: item[0] != own):
+        if not _wait_one(log_id, seq, deadline):
+            pending[log_id] = seq
+    return pending
+
+
+def _wait_one(log_id, seq, deadline):
+    if writer is not None and log_id == writer.log_id:
+        return writer.wait(seq, max(deadline - time.monotonic(), 0))
+    if directory is None:
+        return True
+    while True:
+        exists, committed = read_watermark(directory, log_id)
+        # A log that is gone was committed and removed, or replayed
+        if not exists or committed >= seq:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.005)
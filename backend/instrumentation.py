@@ -0,0 +1,314 @@
+"""Request and stage timings in Prometheus text format, and a sampling profiler.
+
+``stage("name")`` times a block of a request (user load, database queries,
+feature building, the model call, serialization) into a histogram labelled
+with the route being served; ``render()`` produces the body of ``GET
+/metrics``. Stages can nest (a user load includes its query), so they need
+not add up to the request time.
+
+The profiler is opt-in: a fraction of requests (``PROFILE_SAMPLE_RATE``) has
+its thread's stack sampled every few milliseconds, and requests slower than
+``PROFILE_SLOW_MS`` are written out in the folded-stack format read by
+flamegraph.pl and speedscope.
+"""
+
+import contextlib
+import contextvars
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+# Seconds; spans the sub-millisecond cache hits up to slow imports
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """A labelled, thread-safe Prometheus histogram."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket (not cumulative) counts, then count and sum
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += 1
+            series[2] += value
+
+    def snapshot(self, labels):
+        """Return (count, sum) for one series, or (0, 0.0)."""
+        with self._lock:
+            series = self._series.get(labels)
+            return (series[1], series[2]) if series else (0, 0.0)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        with self._lock:
+            series = {labels: (list(b), n, s) for labels, (b, n, s) in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (buckets, count, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, buckets):
+                cumulative += bucket
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{_format_labels(self.labelnames + ('le',), labels + (_format_value(bound),))}"
+                    f" {cumulative}"
+                )
+            lines.append(
+                f"{self.name}_bucket"
+                f"{_format_labels(self.labelnames + ('le',), labels + ('+Inf',))} {count}"
+            )
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "budgethelper_request_duration_seconds",
+    "Time spent handling a request, by route and status.",
+    ("method", "route", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "budgethelper_stage_duration_seconds",
+    "Time spent in one stage of handling a request.",
+    ("route", "stage"),
+)
+QUERIES_PER_REQUEST = Histogram(
+    "budgethelper_db_queries_per_request",
+    "Database statements executed while handling one request.",
+    ("method", "route"),
+    (0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "budgethelper_inference_batch_size",
+    "Rows per model call made by the inference micro-batcher.",
+    (),
+    (1, 2, 4, 8, 16, 32, 64, 128),
+)
+INFERENCE_QUEUE_SECONDS = Histogram(
+    "budgethelper_inference_queue_delay_seconds",
+    "Time a row waited in the inference micro-batcher before its model call.",
+)
+HISTOGRAMS = [
+    REQUEST_SECONDS,
+    STAGE_SECONDS,
+    QUERIES_PER_REQUEST,
+    INFERENCE_BATCH_SIZE,
+    INFERENCE_QUEUE_SECONDS,
+]
+
+# Functions returning [(name, type, help, [(labels dict, value), ...]), ...]
+_collectors = []
+
+_route = contextvars.ContextVar("route", default="-")
+# A one-element list counting the current request's statements, when tracked
+_queries = contextvars.ContextVar("queries", default=None)
+
+
+def add_collector(collect):
+    """Register a callback that reports gauges or counters at scrape time."""
+    _collectors.append(collect)
+
+
+def set_route(route):
+    """Label the stages timed from here on; returns a token for ``reset_route``."""
+    return _route.set(route)
+
+
+def reset_route(token):
+    _route.reset(token)
+
+
+def current_route():
+    return _route.get()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time the enclosed block as stage ``name`` of the current route."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe((_route.get(), name), time.perf_counter() - started)
+
+
+def observe_request(method, route, status, seconds):
+    REQUEST_SECONDS.observe((method, route, str(status)), seconds)
+
+
+def start_query_count():
+    """Count statements from here on; returns a token for ``stop_query_count``."""
+    return _queries.set([0])
+
+
+def stop_query_count(token):
+    _queries.reset(token)
+
+
+def observe_query_count(method, route):
+    counter = _queries.get()
+    if counter is not None:
+        QUERIES_PER_REQUEST.observe((method, route), counter[0])
+
+
+def instrument_engine(engine):
+    """Time every statement ``engine`` executes as the ``db`` stage."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        STAGE_SECONDS.observe((_route.get(), "db"), time.perf_counter() - started)
+        counter = _queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+def render():
+    """The whole registry in the Prometheus text exposition format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for collect in _collectors:
+        for name, kind, help_text, samples in collect():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(
+                    f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} "
+                    f"{_format_value(value)}"
+                )
+    return "\n".join(lines) + "\n"
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of the threads serving profiled requests.
+
+    One background thread wakes every ``interval`` seconds and records the
+    current stack of every registered request thread. ``finish`` writes the
+    folded stacks of requests slower than ``slow`` seconds to ``directory``.
+    """
+
+    def __init__(self, directory, rate=1.0, slow=0.5, interval=0.005):
+        self.directory = directory
+        self.rate = rate
+        self.slow = slow
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self.dumps = 0
+
+    def start(self):
+        """Begin sampling this thread if the request is picked; returns a handle or None."""
+        if self.rate <= 0 or random.random() >= self.rate:
+            return None
+        handle = (threading.get_ident(), Counter())
+        with self._lock:
+            self._active[handle[0]] = handle[1]
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="profiler", daemon=True
+                )
+                self._thread.start()
+            self._wakeup.notify()
+        return handle
+
+    def finish(self, handle, seconds, label):
+        """Stop sampling; return the path written for a slow request, else None."""
+        thread_id, stacks = handle
+        with self._lock:
+            self._active.pop(thread_id, None)
+        if seconds < self.slow or not stacks:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%f")
+        safe_label = re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_")
+        path = os.path.join(
+            self.directory, f"{stamp}-{safe_label}-{int(seconds * 1000)}ms.folded"
+        )
+        with open(path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with self._lock:
+            self.dumps += 1
+        return path
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                while not self._active:
+                    self._wakeup.wait()
+                thread_ids = list(self._active)
+            frames = sys._current_frames()
+            samples = {}
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == me:
+                    continue
+                names = []
+                while frame is not None:
+                    names.append(_frame_name(frame))
+                    frame = frame.f_back
+                # Folded stacks run from the root to the leaf
+                samples[thread_id] = ";".join(reversed(names))
+            del frames
+            with self._lock:
+                # A request may have finished meanwhile; its stacks are final
+                for thread_id, stack in samples.items():
+                    if thread_id in self._active:
+                        self._active[thread_id][stack] += 1
+            time.sleep(self.interval)
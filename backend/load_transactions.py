@@ -1,24 +1,59 @@
-import pandas as pd
-from extensions import db
+"""Import a bank export (CSV, OFX or QIF) into a user's transactions.
+
+    python load_transactions.py USERNAME [FILE] [--format csv|ofx|qif]
+                                [--mode skip|append|upsert] [--chunk-size N]
+
+FILE defaults to transactions.csv. Existing data is kept; with the default
+``skip`` mode rows that are already stored are not inserted again.
+"""
+
+import argparse
+import sys
+
+import importer
 from app import app
-from models.transaction_model import Transaction
+from models.user_model import User
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("username")
+    parser.add_argument("file", nargs="?", default="transactions.csv")
+    parser.add_argument("--format", choices=importer.FORMATS)
+    parser.add_argument("--mode", choices=importer.MODES, default="skip")
+    parser.add_argument("--chunk-size", type=int, default=importer.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    file_format = args.format or importer.detect_format(args.file)
+    with app.app_context():
+        user = User.query.filter_by(username=args.username).first()
+        if not user:
+            print(f"❌ No user found with username '{args.username}'.")
+            return 1
 
-df = pd.read_csv("transactions.csv")
+        def progress(report):
+            print(f"  ... {report['rows_read']} rows read", end="\r", flush=True)
 
-with app.app_context():
-    db.drop_all()
-    db.create_all()
+        with open(args.file, "rb") as stream:
+            report = importer.import_file(
+                user.id,
+                stream,
+                file_format,
+                mode=args.mode,
+                chunk_size=args.chunk_size,
+                progress=progress,
+            )
 
-    for _, row in df.iterrows():
-        tx = Transaction(
-            description=row["description"],
-            amount=row["amount"],
-            category=row["category"],
-            type=row["category"] if row["category"] == "income" else "spending",
-            date=row["date"],
-        )
-        db.session.add(tx)
+    for error in report["errors"]:
+        print(f"Row {error['row']}: {error['error']}")
+    print(
+        f"✅ {report['rows_read']} rows read: {report['inserted']} inserted, "
+        f"{report['updated']} updated, {report['duplicates']} duplicates, "
+        f"{report['invalid']} invalid in {report['seconds']}s "
+        f"({report['rows_per_second']} rows/s)."
+    )
+    return 0
 
-    db.session.commit()
 
-print("✅ Loaded transactions from CSV into the database.")
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Upgrade an existing BudgetHelper database to the current schema.
+
+Safe to run repeatedly: every step checks the live schema first.
+
+    python migrate_db.py
+"""
+
+from sqlalchemy import func, inspect, select, text
+
+import aggregates
+from app import app, db
+from models.transaction_model import Transaction
+from models.user_model import User
+
+
+def _column_type(inspector, table, column):
+    for col in inspector.get_columns(table):
+        if col["name"] == column:
+            return str(col["type"]).upper()
+    return None
+
+
+def _column_length(inspector, table, column):
+    for col in inspector.get_columns(table):
+        if col["name"] == column:
+            return getattr(col["type"], "length", None)
+    return None
+
+
+def _migrate_sqlite_date(conn):
+    # SQLite cannot alter a column type, so rebuild the table around it
+    bad = conn.execute(
+        text('SELECT COUNT(*) FROM "transaction" WHERE date(date) IS NULL')
+    ).scalar()
+    if bad:
+        raise RuntimeError(
+            f"{bad} transactions have dates SQLite cannot parse; fix them first"
+        )
+    conn.execute(text('ALTER TABLE "transaction" RENAME TO transaction_old'))
+    Transaction.__table__.create(conn)
+    conn.execute(
+        text(
+            'INSERT INTO "transaction" '
+            "(id, description, amount, category, type, date, user_id) "
+            "SELECT id, description, amount, category, type, date(date), user_id "
+            "FROM transaction_old"
+        )
+    )
+    conn.execute(text("DROP TABLE transaction_old"))
+
+
+def _migrate_date_column(conn):
+    if conn.dialect.name == "sqlite":
+        _migrate_sqlite_date(conn)
+    else:
+        conn.execute(
+            text(
+                'ALTER TABLE "transaction" ALTER COLUMN date TYPE DATE '
+                "USING CAST(date AS DATE)"
+            )
+        )
+
+
+def upgrade(engine):
+    """Apply all pending schema changes to ``engine``."""
+    applied = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        # SQLite ignores VARCHAR lengths; server databases reject modern hashes
+        password_length = User.__table__.c.password_hash.type.length
+        if (
+            conn.dialect.name != "sqlite"
+            and inspector.has_table("user")
+            and (_column_length(inspector, "user", "password_hash") or 0) < password_length
+        ):
+            conn.execute(
+                text(
+                    'ALTER TABLE "user" ALTER COLUMN password_hash '
+                    f"TYPE VARCHAR({password_length})"
+                )
+            )
+            applied.append(f"user.password_hash -> VARCHAR({password_length})")
+
+        if not inspector.has_table("transaction"):
+            return applied
+
+        if _column_type(inspector, "transaction", "date") != "DATE":
+            _migrate_date_column(conn)
+            applied.append("transaction.date -> DATE")
+
+        for index in Transaction.__table__.indexes:
+            existing = {ix["name"] for ix in inspect(conn).get_indexes("transaction")}
+            if index.name not in existing:
+                index.create(conn)
+                applied.append(f"index {index.name}")
+
+        # Backfill the rollup the first time it appears next to existing data
+        if inspector.has_table(aggregates.aggregate_table.name):
+            has_rollup = conn.execute(
+                select(func.count()).select_from(aggregates.aggregate_table)
+            ).scalar()
+            has_transactions = conn.execute(
+                select(func.count()).select_from(aggregates.transaction_table)
+            ).scalar()
+            if has_transactions and not has_rollup:
+                aggregates.rebuild(conn)
+                applied.append("backfill transaction_aggregate")
+    return applied
+
+
+if __name__ == "__main__":
+    with app.app_context():
+        db.create_all()
+        steps = upgrade(db.engine)
+    if steps:
+        for step in steps:
+            print(f"Applied: {step}")
+    else:
+        print("Database schema is up to date.")
@@ -0,0 +1,24 @@
+from extensions import db
+
+
+class TransactionAggregate(db.Model):
+    """Per-user daily totals, kept in sync with ``Transaction`` by ``aggregates``."""
+
+    __tablename__ = "transaction_aggregate"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    type = db.Column(db.String(50), primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            "user_id": self.user_id,
+            "day": self.day.isoformat(),
+            "type": self.type,
+            "category": self.category,
+            "total": self.total,
+            "count": self.count,
+        }
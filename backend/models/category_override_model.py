@@ -0,0 +1,24 @@
+from extensions import db
+
+
+class CategoryOverride(db.Model):
+    """A user's rule mapping a normalized description (or prefix) to a category."""
+
+    __tablename__ = "category_override"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "match", "pattern", name="uq_override_pattern"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    pattern = db.Column(db.String(200), nullable=False)
+    match = db.Column(db.String(10), nullable=False, default="exact")  # 'exact' or 'prefix'
+    category = db.Column(db.String(100), nullable=False)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "pattern": self.pattern,
+            "match": self.match,
+            "category": self.category,
+        }
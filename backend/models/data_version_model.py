@@ -0,0 +1,10 @@
+from extensions import db
+
+
+class DataVersion(db.Model):
+    """A token ``aggregates`` replaces whenever a user's transactions change."""
+
+    __tablename__ = "data_version"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
@@ -0,0 +1,11 @@
+from extensions import db
+
+
+class IngestCheckpoint(db.Model):
+    """How far an ingestion log has been written to this database (see ``ingest``)."""
+
+    __tablename__ = "ingest_checkpoint"
+
+    log_id = db.Column(db.String(100), primary_key=True)
+    # Every record of the log up to this sequence number is committed here
+    seq = db.Column(db.BigInteger, nullable=False)
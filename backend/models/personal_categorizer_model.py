@@ -0,0 +1,13 @@
+from extensions import db
+
+
+class PersonalCategorizer(db.Model):
+    """A user's compact personal categorization model (see ``personal_models``)."""
+
+    __tablename__ = "personal_categorizer"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    trained_at = db.Column(db.DateTime, nullable=False)
+    rows = db.Column(db.Integer, nullable=False)
+    # zlib-compressed JSON token counts, usually a few kilobytes
+    payload = db.Column(db.LargeBinary, nullable=False)
@@ -0,0 +1,12 @@
+from extensions import db
+
+
+class PersonalCategorizerStale(db.Model):
+    """A user whose personal model is behind their corrections (see ``personal_models``)."""
+
+    __tablename__ = "personal_categorizer_stale"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    # Corrections since the last retrain; a retrain clears the mark only if
+    # no correction came in while it ran
+    corrections = db.Column(db.Integer, nullable=False, default=1)
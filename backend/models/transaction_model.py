@@ -1,12 +1,19 @@
+from datetime import date, datetime
+
 from extensions import db
 
 class Transaction(db.Model):
+    __table_args__ = (
+        db.Index("ix_transaction_user_date", "user_id", "date"),
+        db.Index("ix_transaction_user_type_date", "user_id", "type", "date"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(200), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     category = db.Column(db.String(100), nullable=False)
     type = db.Column(db.String(50), nullable=False, default='spending') # 'income' or 'spending'
-    date = db.Column(db.String(100), nullable=False) # Store date as string
+    date = db.Column(db.Date, nullable=False)
 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False) # Foreign key to User
 
@@ -17,6 +24,20 @@ class Transaction(db.Model):
             "amount": self.amount,
             "category": self.category,
             "type": self.type,
-            "date": self.date,
+            "date": self.date.isoformat(),
             "user_id": self.user_id
-        }
\ No newline at end of file
+        }
+
+
+def parse_date(value):
+    """Coerce an ISO date/datetime string (or date/datetime) to a ``date``."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not isinstance(value, str):
+        raise ValueError("date must be an ISO date string")
+    try:
+        return datetime.fromisoformat(value.strip()).date()
+    except ValueError:
+        raise ValueError(f"Invalid date: {value!r}")
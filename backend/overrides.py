@@ -0,0 +1,130 @@
+"""Per-user learned description -> category rules, consulted before the model."""
+
+import threading
+import time
+from collections import OrderedDict
+
+import database
+from extensions import db
+from models.category_override_model import CategoryOverride
+from prediction_cache import normalize_description
+
+MATCH_TYPES = ("exact", "prefix")
+# Other workers pick up a user's new rules after at most this many seconds
+INDEX_TTL = 60.0
+MAX_CACHED_USERS = 1024
+# PostgreSQL enforces the column length, so longer patterns never reach it
+MAX_PATTERN_LENGTH = CategoryOverride.__table__.c.pattern.type.length
+
+
+class OverrideIndex:
+    """Exact rules in a hash, prefix rules in a character trie."""
+
+    def __init__(self, rules=()):
+        self.exact = {}
+        self.trie = {}
+        for pattern, match, category in rules:
+            self.add(pattern, match, category)
+
+    def add(self, pattern, match, category):
+        pattern = normalize_description(pattern)
+        if match == "exact":
+            self.exact[pattern] = category
+            return
+        node = self.trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[None] = category
+
+    def lookup(self, description):
+        description = normalize_description(description)
+        # Exact rules for longer descriptions are stored cut to the column
+        category = self.exact.get(description[:MAX_PATTERN_LENGTH])
+        if category is not None or not self.trie:
+            return category
+        # Longest matching prefix wins
+        node = self.trie
+        found = node.get(None)
+        for char in description:
+            node = node.get(char)
+            if node is None:
+                break
+            found = node.get(None, found)
+        return found
+
+    def __len__(self):
+        return len(self.exact) + _count_trie(self.trie)
+
+
+def _count_trie(node):
+    return sum(1 if key is None else _count_trie(child) for key, child in node.items())
+
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def index_for(user_id):
+    """Return the user's OverrideIndex, loading it from the database if stale."""
+    now = time.monotonic()
+    with _lock:
+        cached = _indexes.get(user_id)
+        if cached and now - cached[1] < INDEX_TTL:
+            _indexes.move_to_end(user_id)
+            return cached[0]
+
+    rows = db.session.execute(
+        db.select(
+            CategoryOverride.pattern, CategoryOverride.match, CategoryOverride.category
+        ).where(CategoryOverride.user_id == user_id)
+    ).all()
+    index = OverrideIndex(rows)
+    with _lock:
+        _indexes[user_id] = (index, now)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > MAX_CACHED_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def invalidate(user_id=None):
+    with _lock:
+        if user_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(user_id, None)
+
+
+def remember(user_id, description, category, match="exact", pattern=None):
+    """Create or update the user's rule for ``description`` (not committed).
+
+    An explicit ``pattern`` longer than ``MAX_PATTERN_LENGTH`` is rejected; a
+    rule derived from a longer description keeps its first characters.
+    """
+    if match not in MATCH_TYPES:
+        raise ValueError(f"match must be one of {MATCH_TYPES}")
+    if pattern is None:
+        pattern = normalize_description(description)[:MAX_PATTERN_LENGTH]
+    else:
+        pattern = normalize_description(pattern)
+        if len(pattern) > MAX_PATTERN_LENGTH:
+            raise ValueError(f"pattern must be at most {MAX_PATTERN_LENGTH} characters")
+    if not pattern:
+        raise ValueError("pattern must not be empty")
+    # One atomic upsert: two concurrent corrections of the same merchant
+    # must not both try to insert the rule
+    table = CategoryOverride.__table__
+    stmt = database.upsert_insert(db.session.get_bind().dialect.name)(table).values(
+        user_id=user_id, match=match, pattern=pattern, category=category
+    )
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.match, table.c.pattern],
+            set_={"category": stmt.excluded.category},
+        )
+    )
+    return (
+        CategoryOverride.query.filter_by(user_id=user_id, match=match, pattern=pattern)
+        .execution_options(populate_existing=True)
+        .one()
+    )
@@ -0,0 +1,139 @@
+import base64
+import binascii
+import json
+from datetime import date as date_cls
+
+from sqlalchemy import and_, or_, select
+
+from models.transaction_model import Transaction
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Columns a client may ask for with ``fields=``; ``id`` and ``date`` are always
+# fetched because the keyset cursor is built from them.
+TRANSACTION_FIELDS = ("id", "description", "amount", "category", "type", "date", "user_id")
+CURSOR_FIELDS = ("date", "id")
+
+
+def encode_cursor(date, id_):
+    """Build an opaque cursor pointing just after the row (date, id)."""
+    raw = json.dumps([date.isoformat(), id_], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return the (date, id) pair stored in a cursor from ``encode_cursor``."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date, id_ = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(id_, int):
+            raise TypeError
+        return date_cls.fromisoformat(date), id_
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+
+def parse_limit(value):
+    if value is None or value == "":
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_fields(value):
+    """Return the requested output fields, defaulting to every column."""
+    if not value:
+        return list(TRANSACTION_FIELDS)
+    fields = []
+    for name in value.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in TRANSACTION_FIELDS:
+            raise ValueError(f"Unknown field: {name}")
+        if name not in fields:
+            fields.append(name)
+    if not fields:
+        raise ValueError("fields must name at least one column")
+    return fields
+
+
+def parse_list(value):
+    if not value:
+        return []
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def parse_date(value, name="date"):
+    """Parse an ISO ``YYYY-MM-DD`` query parameter, or return None if absent."""
+    if not value:
+        return None
+    try:
+        return date_cls.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date (YYYY-MM-DD)")
+
+
+def serialize_row(row, fields):
+    """Turn a selected row into a JSON-ready dict, formatting dates as ISO."""
+    item = {}
+    for name in fields:
+        value = getattr(row, name)
+        item[name] = value.isoformat() if isinstance(value, date_cls) else value
+    return item
+
+
+def parse_page_args(args):
+    """Validate the query string of ``GET /transactions``; raise ValueError."""
+    after = args.get("after")
+    return {
+        "limit": parse_limit(args.get("limit")),
+        "fields": parse_fields(args.get("fields")),
+        "start": parse_date(args.get("from"), "from"),
+        "end": parse_date(args.get("to"), "to"),
+        "categories": parse_list(args.get("category")),
+        "cursor": decode_cursor(after) if after else None,
+    }
+
+
+def page_statement(user_id, query):
+    """SELECT one page (plus one look-ahead row) for ``parse_page_args`` output."""
+    fields = query["fields"]
+    selected = fields + [f for f in CURSOR_FIELDS if f not in fields]
+    stmt = select(*[getattr(Transaction, f) for f in selected]).where(
+        Transaction.user_id == user_id
+    )
+    if query["start"]:
+        stmt = stmt.where(Transaction.date >= query["start"])
+    if query["end"]:
+        stmt = stmt.where(Transaction.date <= query["end"])
+    if query["categories"]:
+        stmt = stmt.where(Transaction.category.in_(query["categories"]))
+    if query["cursor"]:
+        cursor_date, cursor_id = query["cursor"]
+        stmt = stmt.where(
+            or_(
+                Transaction.date < cursor_date,
+                and_(Transaction.date == cursor_date, Transaction.id < cursor_id),
+            )
+        )
+    # Fetch one extra row to find out whether another page exists
+    return stmt.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(
+        query["limit"] + 1
+    )
+
+
+def render_page(rows, query):
+    """Return (items, next cursor or None) for rows fetched by ``page_statement``."""
+    page = rows[: query["limit"]]
+    items = [serialize_row(row, query["fields"]) for row in page]
+    if len(rows) > query["limit"]:
+        last = page[-1]
+        return items, encode_cursor(last.date, last.id)
+    return items, None
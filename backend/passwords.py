@@ -0,0 +1,123 @@
+"""Password hashing on a bounded worker pool.
+
+Hashing is deliberately slow, so a burst of logins (every session expires
+after ``PERMANENT_SESSION_LIFETIME``) can otherwise take every CPU the
+transaction endpoints need. ``PasswordHasher`` runs hashes and checks on at
+most ``workers`` threads (hashlib releases the GIL while it works) and lets
+at most ``max_queue`` more wait; further callers get ``HasherBusy`` right
+away, which ``/login`` answers with 503 and ``Retry-After``.
+
+``method`` is any werkzeug method string, e.g. ``scrypt`` or
+``pbkdf2:sha256:600000``. ``needs_rehash`` tells whether a stored hash was
+made with other parameters, so logins can upgrade it transparently.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = "scrypt"
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHasher:
+    def __init__(self, method=DEFAULT_METHOD, workers=2, max_queue=16):
+        self.method = method
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._canonical = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy("Too many password checks in progress, retry shortly")
+        try:
+            with self._lock:
+                self.pending += 1
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="password"
+                    )
+            return self._executor.submit(self._timed, fn, *args).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+            self._slots.release()
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.completed += 1
+                self.busy_seconds += time.perf_counter() - started
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def canonical_method(self):
+        """The full parameter string werkzeug writes for ``method``, e.g. scrypt:32768:8:1."""
+        if self._canonical is None:
+            # Defaults differ between werkzeug versions, so ask it once
+            self._canonical = generate_password_hash("", self.method).split("$", 1)[0]
+        return self._canonical
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split("$", 1)[0] != self.canonical_method()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "method": self.method,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": min(self.pending, self.workers),
+                "queued": max(self.pending - self.workers, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "busy_seconds": round(self.busy_seconds, 3),
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+hasher = PasswordHasher()
+
+
+def configure(method=DEFAULT_METHOD, workers=2, max_queue=16):
+    global hasher
+    hasher.shutdown()
+    hasher = PasswordHasher(method, workers, max_queue)
+
+
+def hash_password(password):
+    return hasher.hash(password)
+
+
+def verify_password(pwhash, password):
+    return hasher.verify(pwhash, password)
+
+
+def needs_rehash(pwhash):
+    return hasher.needs_rehash(pwhash)
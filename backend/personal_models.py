@@ -0,0 +1,410 @@
+"""Per-user categorization models, consulted between the rules and the global model.
+
+A user's exact override rules only match merchants they have corrected
+verbatim. A ``PersonalModel`` generalizes from the user's own history: a
+small naive Bayes classifier over description words, trained on the
+categories the user kept for their transactions, with their corrections
+(``CategoryOverride`` rules) counted ``CORRECTION_WEIGHT`` times. It answers
+only when it knows at least one word of the description and its top category
+has a posterior of at least ``CONFIDENCE``. Otherwise the global model
+decides, as it does for users with fewer than ``MIN_ROWS`` transactions or
+``MIN_CATEGORIES`` categories, who get no personal model at all: a model
+that has only seen one category would give it to every description.
+
+Models are stored as zlib-compressed JSON token counts in
+``personal_categorizer``, a few kilobytes per user. A correction only marks
+the user's model stale (``personal_categorizer_stale``) in the request's
+transaction; the worker's ``Retrainer`` thread retrains stale models right
+after, and every ``interval`` seconds picks up marks other workers left.
+``train_personal_models.py --stale`` does the same from the command line,
+and without ``--stale`` trains everyone in bulk.
+Each worker keeps the loaded models in ``ModelCache``, an LRU bounded by
+both an entry count and an estimate of their memory. Users without a model
+are cached too, so they cost one query per ``ttl``. Cache hits, evictions
+and the time spent loading models on a miss are reported by ``stats()`` and
+on ``/metrics``.
+"""
+
+import json
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import delete, func, select
+
+import database
+import instrumentation
+import shards
+from extensions import db
+from models.category_override_model import CategoryOverride
+from models.personal_categorizer_model import PersonalCategorizer
+from models.personal_categorizer_stale_model import PersonalCategorizerStale
+from models.transaction_model import Transaction
+
+# Same tokens as the global model's vectorizers
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+MIN_ROWS = 20
+MIN_CATEGORIES = 2
+CORRECTION_WEIGHT = 5
+CONFIDENCE = 0.9
+# Additive smoothing; add-one would swamp the few counts a user's words have
+SMOOTHING = 0.1
+FORMAT = 1
+# Rough per-token cost of the dict entry, key string and array header
+_TOKEN_OVERHEAD = 200
+
+
+def tokenize(description):
+    return TOKEN_PATTERN.findall((description or "").lower())
+
+
+class PersonalModel:
+    """Multinomial naive Bayes over description tokens."""
+
+    def __init__(self, categories, counts, documents, keep_counts=True):
+        """``counts`` maps token -> {category index: weight}; ``documents`` is
+        the weight of descriptions per category. Models loaded only to
+        predict drop the counts (``keep_counts=False``)."""
+        self.categories = list(categories)
+        self.counts = counts if keep_counts else None
+        self.documents = list(documents)
+        k = len(self.categories)
+        totals = np.zeros(k)
+        for per_category in counts.values():
+            for index, weight in per_category.items():
+                totals[index] += weight
+        denominators = np.log(totals + SMOOTHING * len(counts))
+        self.log_prior = np.log(np.asarray(self.documents, dtype=np.float64) / sum(self.documents))
+        # Smoothed log P(token | category) for every known token
+        self.log_likelihood = {}
+        for token, per_category in counts.items():
+            vector = np.full(k, SMOOTHING)
+            for index, weight in per_category.items():
+                vector[index] += weight
+            self.log_likelihood[token] = np.log(vector) - denominators
+        self.nbytes = sum(
+            _TOKEN_OVERHEAD + len(token) + vector.nbytes
+            for token, vector in self.log_likelihood.items()
+        ) + sys.getsizeof(self.categories)
+
+    @classmethod
+    def fit(cls, samples):
+        """Fit from (description, category, weight) samples."""
+        index = {}
+        counts = defaultdict(dict)
+        documents = []
+        for description, category, weight in samples:
+            c = index.get(category)
+            if c is None:
+                c = index[category] = len(documents)
+                documents.append(0)
+            documents[c] += weight
+            for token in tokenize(description):
+                counts[token][c] = counts[token].get(c, 0) + weight
+        return cls(list(index), dict(counts), documents)
+
+    def predict(self, description):
+        """The user's category for ``description``, or None if not confident."""
+        vectors = [self.log_likelihood.get(token) for token in tokenize(description)]
+        vectors = [v for v in vectors if v is not None]
+        # A single category has a posterior of 1 for anything; defer instead
+        if not vectors or len(self.categories) < MIN_CATEGORIES:
+            return None
+        scores = self.log_prior + np.sum(vectors, axis=0)
+        scores -= scores.max()
+        posterior = np.exp(scores)
+        posterior /= posterior.sum()
+        best = int(posterior.argmax())
+        return self.categories[best] if posterior[best] >= CONFIDENCE else None
+
+    def to_bytes(self):
+        if self.counts is None:
+            raise ValueError("Model was loaded without its counts")
+        return zlib.compress(
+            json.dumps(
+                {
+                    "format": FORMAT,
+                    "categories": self.categories,
+                    "documents": self.documents,
+                    "counts": {
+                        token: sorted(per_category.items())
+                        for token, per_category in self.counts.items()
+                    },
+                },
+                separators=(",", ":"),
+            ).encode()
+        )
+
+    @classmethod
+    def from_bytes(cls, payload):
+        data = json.loads(zlib.decompress(payload))
+        if data.get("format") != FORMAT:
+            raise ValueError(f"Unsupported personal model format {data.get('format')!r}")
+        counts = {
+            token: {int(index): weight for index, weight in pairs}
+            for token, pairs in data["counts"].items()
+        }
+        return cls(data["categories"], counts, data["documents"], keep_counts=False)
+
+
+class ModelCache:
+    """Thread-safe LRU of user id -> PersonalModel (or None), bounded by count and bytes."""
+
+    def __init__(self, maxsize=4096, max_bytes=64 * 1024 * 1024, ttl=60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loads = 0
+        self.load_seconds = 0.0
+
+    def get(self, user_id):
+        """Return (found, model); ``model`` may be None for users without one."""
+        now = self.clock()
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is not None and entry[0] <= now:
+                self._drop(user_id)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(user_id)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, user_id, model, load_seconds=0.0):
+        size = model.nbytes if model is not None else _TOKEN_OVERHEAD
+        with self._lock:
+            self.loads += 1
+            self.load_seconds += load_seconds
+            if self.maxsize <= 0 or size > self.max_bytes:
+                return
+            self._drop(user_id)
+            self._data[user_id] = (self.clock() + self.ttl, model, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or self.bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, user_id):
+        entry = self._data.pop(user_id, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._drop(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "maxsize": self.maxsize,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "loads": self.loads,
+                "load_seconds": round(self.load_seconds, 6),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class Retrainer:
+    """Background thread retraining stale models when woken or every ``interval`` seconds."""
+
+    def __init__(self, app_context, interval):
+        self.app_context = app_context
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._lock = threading.Lock()
+        self.retrained = 0
+        self.errors = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="personal-retrainer", daemon=True
+                )
+                self._thread.start()
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopped:
+                return
+            try:
+                with self.app_context():
+                    self.retrained += retrain_stale(db.session)
+            except Exception as e:
+                # The marks stay, so the next round tries again
+                self.errors += 1
+                print(f"[PERSONAL] Retraining stale models failed: {e}")
+
+    def close(self, timeout=10.0):
+        """Stop after the round in progress; marks left over stay for the next start."""
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {"retrained": self.retrained, "errors": self.errors}
+
+
+# None = personal models off (the default), see configure()
+cache = None
+# None = no background retraining, see configure()
+retrainer = None
+
+
+def configure(
+    enabled=False,
+    maxsize=4096,
+    max_bytes=64 * 1024 * 1024,
+    ttl=60.0,
+    retrain_interval=0.0,
+    app_context=None,
+):
+    """Turn personal models on or off; with ``app_context`` and a positive
+    ``retrain_interval``, stale models are retrained by a ``Retrainer``."""
+    global cache, retrainer
+    if retrainer is not None:
+        retrainer.close()
+    cache = ModelCache(maxsize, max_bytes, ttl) if enabled else None
+    retrainer = None
+    if enabled and app_context is not None and retrain_interval > 0:
+        retrainer = Retrainer(app_context, retrain_interval)
+        retrainer.start()
+
+
+def training_samples(session, user_id):
+    """(description, category, weight) samples from the user's history and rules."""
+    rows = shards.session_for(user_id, session).execute(
+        select(Transaction.description, Transaction.category, func.count())
+        .where(Transaction.user_id == user_id, Transaction.type != "income")
+        .group_by(Transaction.description, Transaction.category)
+    ).all()
+    rules = session.execute(
+        select(CategoryOverride.pattern, CategoryOverride.category).where(
+            CategoryOverride.user_id == user_id
+        )
+    ).all()
+    return [(d, c, n) for d, c, n in rows] + [(p, c, CORRECTION_WEIGHT) for p, c in rules]
+
+
+def train(session, user_id):
+    """Fit and store the user's model (not committed); None if they have too little history.
+
+    A user below ``MIN_ROWS`` or ``MIN_CATEGORIES`` has any stored model removed.
+    """
+    samples = training_samples(session, user_id)
+    rows = sum(weight for _, _, weight in samples)
+    categories = {category for _, category, _ in samples}
+    stored = session.get(PersonalCategorizer, user_id)
+    if rows < MIN_ROWS or len(categories) < MIN_CATEGORIES:
+        if stored is not None:
+            session.delete(stored)
+        return None
+    model = PersonalModel.fit(samples)
+    if stored is None:
+        stored = PersonalCategorizer(user_id=user_id)
+        session.add(stored)
+    stored.trained_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    stored.rows = rows
+    stored.payload = model.to_bytes()
+    return model
+
+
+def mark_stale(session, user_id):
+    """Flag the user's model for retraining (not committed); a no-op when models are off."""
+    if cache is None:
+        return
+    table = PersonalCategorizerStale.__table__
+    stmt = database.upsert_insert(session.get_bind().dialect.name)(table).values(
+        user_id=user_id, corrections=1
+    )
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={"corrections": table.c.corrections + 1},
+        )
+    )
+
+
+def wake_retrainer():
+    """Have this worker's retrainer pick up the marks now rather than at its next round."""
+    if retrainer is not None:
+        retrainer.wake()
+
+
+def retrain_stale(session, limit=None):
+    """Retrain and commit every stale model, or the first ``limit``; return how many."""
+    query = select(
+        PersonalCategorizerStale.user_id, PersonalCategorizerStale.corrections
+    ).order_by(PersonalCategorizerStale.user_id)
+    if limit is not None:
+        query = query.limit(limit)
+    marks = session.execute(query).all()
+    for user_id, corrections in marks:
+        train(session, user_id)
+        # A correction made while training keeps the mark for the next round
+        session.execute(
+            delete(PersonalCategorizerStale).where(
+                PersonalCategorizerStale.user_id == user_id,
+                PersonalCategorizerStale.corrections == corrections,
+            )
+        )
+        session.commit()
+        invalidate(user_id)
+    return len(marks)
+
+
+def model_for(user_id):
+    """The user's PersonalModel, from this worker's cache or the database, or None."""
+    if cache is None:
+        return None
+    found, model = cache.get(user_id)
+    if found:
+        return model
+    started = time.perf_counter()
+    with instrumentation.stage("personal_model_load"):
+        payload = db.session.execute(
+            select(PersonalCategorizer.payload).where(PersonalCategorizer.user_id == user_id)
+        ).scalar()
+        model = PersonalModel.from_bytes(payload) if payload is not None else None
+    cache.put(user_id, model, time.perf_counter() - started)
+    return model
+
+
+def invalidate(user_id):
+    if cache is not None:
+        cache.invalidate(user_id)
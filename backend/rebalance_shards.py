@@ -0,0 +1,159 @@
+"""Move users' transactions to their shard after SHARD_DATABASE_URLS changes.
+
+    # was unsharded: spread the main database's users over the shards
+    SHARD_DATABASE_URLS=sqlite:///shard0.db,sqlite:///shard1.db python rebalance_shards.py
+    # grew from two shards to three
+    SHARD_DATABASE_URLS=sqlite:///shard0.db,sqlite:///shard1.db,sqlite:///shard2.db \\
+        python rebalance_shards.py --from sqlite:///shard0.db,sqlite:///shard1.db
+    python rebalance_shards.py --from ... --dry-run  # only count who would move
+
+``--from`` lists where transactions are stored now (default: DATABASE_URL).
+Every user found there whose shard under SHARD_DATABASE_URLS is a different
+database is moved one at a time: their rows in the target are cleared,
+their transactions copied over in id order, the target's rollup rebuilt
+and its data version bumped, and only once that has committed are they
+deleted from the source. A run that stops halfway can simply be run again.
+Copied transactions get new ids from the target. Run it with the servers
+stopped, then start them with the new SHARD_DATABASE_URLS.
+"""
+
+import argparse
+import sys
+import time
+
+from sqlalchemy import create_engine, delete, insert, select
+
+import aggregates
+import database
+import shards
+from app import app, db
+
+
+def stored_users(conn):
+    """Ids of the users with transactions or a data version on ``conn``."""
+    return (
+        conn.execute(
+            select(aggregates.transaction_table.c.user_id).union(
+                select(aggregates.version_table.c.user_id)
+            )
+        )
+        .scalars()
+        .all()
+    )
+
+
+def _delete_user(conn, user_id):
+    for table in shards.SHARDED_TABLES:
+        conn.execute(delete(table).where(table.c.user_id == user_id))
+
+
+def move_user(source, target, user_id):
+    """Copy ``user_id``'s transactions from ``source`` to ``target``, then delete them."""
+    t = aggregates.transaction_table
+    columns = [c for c in t.c if c.name != "id"]
+    copied = 0
+    with target.begin() as out:
+        # Leftovers of an interrupted run are replaced, not duplicated
+        _delete_user(out, user_id)
+        with source.connect() as conn:
+            result = conn.execution_options(
+                stream_results=True, yield_per=aggregates.INSERT_CHUNK
+            ).execute(select(*columns).where(t.c.user_id == user_id).order_by(t.c.id))
+            for chunk in result.partitions():
+                out.execute(insert(t), [row._asdict() for row in chunk])
+                copied += len(chunk)
+        aggregates.rebuild(out, user_id)
+    with source.begin() as conn:
+        _delete_user(conn, user_id)
+    return copied
+
+
+def rebalance(sources, targets, dry_run=False, progress=None):
+    """Move every misplaced user from the ``sources`` engines onto the ``targets`` ShardSet.
+
+    A source with the same URL as a shard keeps the users that hash to it.
+    Returns a report of users and transactions moved.
+    """
+    by_url = {
+        engine.url.render_as_string(hide_password=False): index
+        for index, engine in enumerate(targets.engines)
+    }
+    report = {"users_seen": 0, "users_moved": 0, "transactions_moved": 0}
+    started = time.perf_counter()
+    for source in sources:
+        here = by_url.get(source.url.render_as_string(hide_password=False))
+        with source.connect() as conn:
+            user_ids = stored_users(conn)
+        for user_id in user_ids:
+            report["users_seen"] += 1
+            index = targets.index_for(user_id)
+            if index == here:
+                continue
+            report["users_moved"] += 1
+            if not dry_run:
+                report["transactions_moved"] += move_user(
+                    source, targets.engines[index], user_id
+                )
+            if progress:
+                progress(user_id, index, report)
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--from",
+        dest="sources",
+        help="comma-separated database URLs holding transactions now (default: DATABASE_URL)",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only report the users that would move"
+    )
+    args = parser.parse_args(argv)
+
+    if shards.shards is None:
+        print("❌ Set SHARD_DATABASE_URLS to the shards to move users onto.")
+        return 1
+
+    with app.app_context():
+        if args.sources:
+            urls = [
+                shards.resolve_url(url, app.instance_path)
+                for url in shards.parse_urls(args.sources)
+            ]
+        else:
+            urls = [db.engine.url.render_as_string(hide_password=False)]
+    targets = {e.url.render_as_string(hide_password=False): e for e in shards.shards.engines}
+    sources = []
+    opened = []
+    for url in urls:
+        engine = targets.get(url)
+        if engine is None:
+            engine = create_engine(url, **database.engine_options(url))
+            database.instrument(engine)
+            opened.append(engine)
+        sources.append(engine)
+
+    def progress(user_id, index, report):
+        if report["users_moved"] % 100 == 0:
+            print(
+                f"{report['users_moved']} users moved "
+                f"({report['transactions_moved']} transactions)"
+            )
+
+    try:
+        report = rebalance(sources, shards.shards, dry_run=args.dry_run, progress=progress)
+    finally:
+        for engine in opened:
+            engine.dispose()
+    verb = "would move" if args.dry_run else "moved"
+    print(
+        f"✅ {report['users_seen']} users checked, {report['users_moved']} {verb}, "
+        f"{report['transactions_moved']} transactions copied in {report['seconds']}s."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Backfill or verify the transaction_aggregate rollup table.
+
+    python rebuild_aggregates.py              # rebuild for every user
+    python rebuild_aggregates.py --user NAME  # rebuild for one user
+    python rebuild_aggregates.py --check      # report mismatches only
+"""
+
+import argparse
+import sys
+
+import aggregates
+import shards
+from app import app, db
+from models.user_model import User
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user", help="username to limit the operation to")
+    parser.add_argument(
+        "--check", action="store_true", help="only compare, do not rewrite"
+    )
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        db.create_all()
+        user_id = None
+        if args.user:
+            user = User.query.filter_by(username=args.user).first()
+            if not user:
+                print(f"❌ No user found with username '{args.user}'.")
+                return 1
+            user_id = user.id
+
+        # Each shard holds its users' transactions and rollup
+        if shards.shards is None:
+            sources = [db.engine]
+        elif user_id is not None:
+            sources = [shards.shards.engines[shards.shards.index_for(user_id)]]
+        else:
+            sources = shards.shards.engines
+
+        mismatches = []
+        rows = 0
+        for source in sources:
+            with source.begin() as conn:
+                if args.check:
+                    mismatches += aggregates.check(conn, user_id)
+                else:
+                    rows += aggregates.rebuild(conn, user_id)
+        if args.check:
+            for item in mismatches:
+                print(
+                    f"Mismatch {item['key']}: expected {item['expected']}, "
+                    f"found {item['actual']}"
+                )
+            print(f"{len(mismatches)} mismatched aggregate rows.")
+            return 1 if mismatches else 0
+        print(f"✅ Rebuilt {rows} aggregate rows.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
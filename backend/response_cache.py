@@ -0,0 +1,62 @@
+"""Per-user conditional GET support and a bounded cache of rendered responses.
+
+Responses are identified by an ETag built from the user's data version (see
+``aggregates.data_version``) and the request, so any write to the user's
+transactions changes every ETag at once and old cache entries simply stop
+being looked up; the LRU bound takes care of evicting them.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def etag_for(user_id, version, *parts):
+    digest = hashlib.sha1("\0".join(str(part) for part in parts).encode()).hexdigest()
+    return f"{user_id}.{version}.{digest[:16]}"
+
+
+class ResponseCache:
+    """Thread-safe LRU of ETag -> (body, status, headers)."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag):
+        with self._lock:
+            try:
+                value = self._data[etag]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(etag)
+            self.hits += 1
+            return value
+
+    def put(self, etag, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[etag] = value
+            self._data.move_to_end(etag)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
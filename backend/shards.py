@@ -0,0 +1,169 @@
+"""Optional sharding of per-user transaction storage across databases.
+
+    SHARD_DATABASE_URLS=sqlite:///shard0.db,sqlite:///shard1.db
+
+Users, override rules and personal models stay in the main database
+(DATABASE_URL). With ``SHARD_DATABASE_URLS`` set, each user's transactions,
+daily rollup and data version live in exactly one shard, picked by a jump
+consistent hash of the user id (``shard_index``): stable across processes
+and restarts, and growing the list from N to N+1 shards moves only about
+1/(N+1) of the users. A shard can be a SQLite file, a separate server
+database or a PostgreSQL schema (a URL with
+``?options=-csearch_path%3Dshard1``). Writes to different shards never
+wait on each other's locks, which for SQLite is the single writer lock.
+
+Code touching a user's transactions asks ``session_for(user_id)`` for the
+session to use: the Flask-SQLAlchemy session when sharding is off, otherwise
+a per-app-context session on the user's shard. Changing the shard list
+needs ``rebalance_shards.py`` to move the users whose shard changed.
+"""
+
+import os
+
+from flask import has_app_context
+from flask.globals import app_ctx
+from sqlalchemy import create_engine, inspect, make_url
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+import aggregates
+import database
+import instrumentation
+from extensions import db
+from models.ingest_checkpoint_model import IngestCheckpoint
+
+# Tables stored per shard; created there without their foreign keys to user.
+# Importing aggregates registers the flush hooks that keep the last two in
+# step on shard sessions as well.
+SHARDED_TABLES = (
+    aggregates.transaction_table,
+    aggregates.aggregate_table,
+    aggregates.version_table,
+)
+# Per-database bookkeeping each shard keeps as well
+LOCAL_TABLES = (IngestCheckpoint.__table__,)
+
+
+def shard_index(user_id, buckets):
+    """Jump consistent hash (Lamping & Veach) of ``user_id`` onto ``buckets`` shards."""
+    key = int(user_id) & 0xFFFFFFFFFFFFFFFF
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def parse_urls(value):
+    """Split a comma-separated SHARD_DATABASE_URLS value."""
+    return [url.strip() for url in (value or "").split(",") if url.strip()]
+
+
+def resolve_url(url, instance_path=None):
+    """Place relative SQLite paths in ``instance_path``, as Flask-SQLAlchemy does."""
+    url = make_url(database.database_url({"DATABASE_URL": url}))
+    if (
+        instance_path
+        and url.get_backend_name() == "sqlite"
+        and url.database not in (None, "", ":memory:")
+        and not os.path.isabs(url.database)
+    ):
+        os.makedirs(instance_path, exist_ok=True)
+        url = url.set(database=os.path.join(instance_path, url.database))
+    return url.render_as_string(hide_password=False)
+
+
+def create_schema(conn):
+    """Create the sharded tables and their indexes on ``conn`` if missing."""
+    existing = set(inspect(conn).get_table_names())
+    for table in SHARDED_TABLES + LOCAL_TABLES:
+        if table.name in existing:
+            continue
+        conn.execute(CreateTable(table, include_foreign_key_constraints=[]))
+        for index in table.indexes:
+            conn.execute(CreateIndex(index))
+
+
+def _app_ctx_id():
+    return id(app_ctx._get_current_object())
+
+
+class ShardSet:
+    """One engine and one app-context-scoped session per shard URL."""
+
+    def __init__(self, urls, scopefunc=_app_ctx_id):
+        if not urls:
+            raise ValueError("A shard set needs at least one database URL")
+        self.urls = list(urls)
+        self.engines = []
+        self.pool_metrics = []
+        self.sessions = []
+        for url in self.urls:
+            engine = create_engine(url, **database.engine_options(url))
+            self.pool_metrics.append(database.instrument(engine))
+            instrumentation.instrument_engine(engine)
+            self.engines.append(engine)
+            self.sessions.append(
+                scoped_session(sessionmaker(bind=engine, class_=Session), scopefunc=scopefunc)
+            )
+
+    def __len__(self):
+        return len(self.urls)
+
+    def index_for(self, user_id):
+        return shard_index(user_id, len(self.urls))
+
+    def session_for(self, user_id):
+        return self.sessions[self.index_for(user_id)]
+
+    def create_all(self):
+        for engine in self.engines:
+            with engine.begin() as conn:
+                create_schema(conn)
+
+    def remove(self):
+        """Close this app context's session on every shard."""
+        for session in self.sessions:
+            session.remove()
+
+    def dispose(self):
+        if has_app_context():
+            self.remove()
+        for engine in self.engines:
+            engine.dispose()
+
+    def stats(self):
+        return [metrics.stats() for metrics in self.pool_metrics]
+
+
+# None = sharding off (the default), see configure()
+shards = None
+
+
+def configure(urls=(), instance_path=None):
+    """Use a shard per URL in ``urls`` (none = sharding off) and create their tables."""
+    global shards
+    if shards is not None:
+        shards.dispose()
+    shards = None
+    if urls:
+        shards = ShardSet([resolve_url(url, instance_path) for url in urls])
+        shards.create_all()
+    return shards
+
+
+def session_for(user_id, default=None):
+    """The session holding ``user_id``'s transactions.
+
+    ``default`` (or Flask-SQLAlchemy's session) when sharding is off.
+    """
+    if shards is None:
+        return default if default is not None else db.session
+    return shards.session_for(user_id)
+
+
+def remove_sessions(exc=None):
+    """Teardown hook: release this app context's shard sessions."""
+    if shards is not None:
+        shards.remove()
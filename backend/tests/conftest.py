@@ -0,0 +1,11 @@
+import os
+import tempfile
+
+# Point the app at a throwaway database before any test imports it: a
+# temporary SQLite file by default (shared with the ASGI mode's async engine),
+# or TEST_DATABASE_URL (e.g. a local PostgreSQL) to run the suite against a
+# server database.
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = os.environ.get(
+    "TEST_DATABASE_URL", f"sqlite:///{os.path.join(_tmpdir.name, 'test.db')}"
+)
@@ -1,4 +1,7 @@
 import pytest
+import gzip
+import io
+import json
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -78,3 +81,520 @@ def test_prediction_endpoint(client):
     assert "total_spending" in data
     assert "total_income" in data
     assert "net_savings" in data
+
+def add_income(client, description, date, amount=10.0):
+    return client.post("/transactions", json={
+        "amount": amount,
+        "description": description,
+        "type": "income",
+        "date": date
+    })
+
+def test_get_transactions_cursor_pagination(client):
+    login(client)
+    for day in range(1, 6):
+        add_income(client, f"Payment {day}", f"2025-06-0{day}")
+
+    seen = []
+    response = client.get("/transactions?limit=2")
+    while True:
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page) <= 2
+        seen.extend(tx["description"] for tx in page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        response = client.get(f"/transactions?limit=2&after={cursor}")
+
+    assert seen == [f"Payment {day}" for day in range(5, 0, -1)]
+
+def test_get_transactions_filters_and_fields(client):
+    login(client)
+    for day in range(1, 6):
+        add_income(client, f"Payment {day}", f"2025-06-0{day}")
+
+    response = client.get(
+        "/transactions?from=2025-06-02&to=2025-06-04&category=income&fields=description,amount"
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [tx["description"] for tx in data] == ["Payment 4", "Payment 3", "Payment 2"]
+    assert all(set(tx) == {"description", "amount"} for tx in data)
+
+    assert client.get("/transactions?fields=password").status_code == 400
+    assert client.get("/transactions?after=not-a-cursor").status_code == 400
+    assert client.get("/transactions?from=June").status_code == 400
+
+def test_aggregates_follow_transaction_writes(client):
+    import aggregates
+    from models.aggregate_model import TransactionAggregate
+    from models.transaction_model import Transaction
+
+    login(client)
+    add_income(client, "Salary", "2025-06-01", amount=100.0)
+    add_income(client, "Bonus", "2025-06-01", amount=50.0)
+
+    with app.app_context():
+        row = TransactionAggregate.query.filter_by(category="income").one()
+        assert (row.total, row.count) == (150.0, 2)
+
+        bonus = Transaction.query.filter_by(description="Bonus").one()
+        bonus.amount = 25.0
+        db.session.commit()
+        assert TransactionAggregate.query.filter_by(category="income").one().total == 125.0
+
+        db.session.delete(bonus)
+        salary = Transaction.query.filter_by(description="Salary").one()
+        salary.category = "salary"
+        db.session.commit()
+        assert TransactionAggregate.query.filter_by(category="income").count() == 0
+        assert TransactionAggregate.query.filter_by(category="salary").one().count == 1
+
+        user_id = salary.user_id
+        with db.engine.begin() as conn:
+            assert aggregates.check(conn, user_id) == []
+            conn.execute(TransactionAggregate.__table__.delete())
+            assert aggregates.check(conn, user_id) != []
+            aggregates.rebuild(conn, user_id)
+            assert aggregates.check(conn, user_id) == []
+
+def test_predict_sources_agree(client):
+    from datetime import date, timedelta
+
+    login(client)
+    today = date.today()
+    for offset, (description, amount, type_) in enumerate(
+        [("Salary", 1500.0, "income"), ("Monthly rent", 500.0, "spending"),
+         ("Groceries", 60.0, "spending"), ("Old rent", 450.0, "spending")]
+    ):
+        days_ago = 45 if description == "Old rent" else offset
+        client.post("/transactions", json={
+            "amount": amount,
+            "description": description,
+            "type": type_,
+            "date": (today - timedelta(days=days_ago)).isoformat()
+        })
+
+    app.config["PREDICT_FROM_AGGREGATES"] = True
+    from_rollup = client.get("/predict").get_json()
+    app.config["PREDICT_FROM_AGGREGATES"] = False
+    try:
+        from_rows = client.get("/predict").get_json()
+    finally:
+        app.config["PREDICT_FROM_AGGREGATES"] = True
+
+    assert from_rollup == from_rows
+    assert from_rollup["total_income"] == 1500.0
+    assert from_rollup["total_spending"] == 560.0
+    assert from_rollup["net_savings"] == 940.0
+    assert sum(from_rollup["spending_by_category"].values()) == pytest.approx(
+        from_rollup["predicted_spending"], abs=0.05
+    )
+
+def test_add_transactions_batch(client):
+    login(client)
+    batch = [
+        {"amount": 1500.0, "description": "Monthly salary", "type": "income", "date": "2025-06-01"},
+        {"amount": 19.99, "description": "Netflix subscription", "date": "2025-06-02"},
+        {"amount": 12.0, "description": "Uber ride to mall", "date": "2025-06-03"},
+    ]
+    response = client.post("/transactions/batch", json={"transactions": batch})
+    assert response.status_code == 201
+    created = response.get_json()
+    assert [tx["description"] for tx in created] == [tx["description"] for tx in batch]
+    assert created[0]["category"] == "income"
+    assert all(tx["id"] for tx in created)
+
+    single = client.post("/transactions", json=batch[1]).get_json()
+    assert single["category"] == created[1]["category"]
+
+    assert len(client.get("/transactions").get_json()) == 4
+
+    import aggregates
+    with app.app_context():
+        with db.engine.begin() as conn:
+            assert aggregates.check(conn, created[0]["user_id"]) == []
+
+def test_add_transactions_batch_rejects_bad_rows(client):
+    login(client)
+    response = client.post("/transactions/batch", json=[
+        {"amount": 5.0, "description": "Coffee", "date": "2025-06-01"},
+        {"amount": "lots", "description": "Coffee", "date": "2025-06-01"},
+    ])
+    assert response.status_code == 400
+    assert response.get_json()["index"] == 1
+    assert client.get("/transactions").get_json() == []
+    assert client.post("/transactions/batch", json=[]).status_code == 400
+
+def test_category_correction_teaches_future_transactions(client):
+    login(client)
+    created = client.post("/transactions", json={
+        "amount": 42.0, "description": "Kaufland Mladost", "type": "spending", "date": "2025-06-02"
+    }).get_json()
+
+    response = client.patch(f"/transactions/{created['id']}/category", json={"category": "Food"})
+    assert response.status_code == 200
+    assert response.get_json()["category"] == "food"
+    assert response.get_json()["override"]["pattern"] == "kaufland mladost"
+
+    again = client.post("/transactions", json={
+        "amount": 7.0, "description": "KAUFLAND  Mladost", "type": "spending", "date": "2025-06-09"
+    }).get_json()
+    assert again["category"] == "food"
+
+    client.patch(f"/transactions/{again['id']}/category",
+                 json={"category": "groceries", "match": "prefix", "pattern": "Kaufland"})
+    batch = client.post("/transactions/batch", json=[
+        {"amount": 3.0, "description": "Kaufland Lozenets", "date": "2025-06-10"},
+    ]).get_json()
+    assert batch[0]["category"] == "groceries"
+
+def test_category_correction_validation(client):
+    login(client)
+    created = client.post("/transactions", json={
+        "amount": 5.0, "description": "Coffee", "type": "spending", "date": "2025-06-02"
+    }).get_json()
+    url = f"/transactions/{created['id']}/category"
+    assert client.patch(url, json={}).status_code == 400
+    assert client.patch(url, json={"category": "food", "match": "regex"}).status_code == 400
+    # Too long for the rule's column, which PostgreSQL would refuse with a 500
+    response = client.patch(url, json={"category": "food", "pattern": "c" * 250})
+    assert response.status_code == 400
+    assert client.get("/transactions").get_json()[0]["category"] == created["category"]
+    assert client.patch("/transactions/999999/category", json={"category": "food"}).status_code == 404
+
+def test_importing_app_defers_model_and_pandas(tmp_path):
+    import subprocess
+    code = "import sys, app, categorizer; print('pandas' in sys.modules, categorizer.model is None)"
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'import.db'}")
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.join(os.path.dirname(__file__), ".."),
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout.split()
+    assert out == ["False", "True"]
+
+
+def test_import_csv_skips_and_upserts_duplicates(client):
+    login(client)
+    csv_text = (
+        "date,description,amount,category\n"
+        "2025-06-01,Monthly rent,500,housing\n"
+        "2025-06-02,Lunch Subway,12.50,food\n"
+        "2025-06-02,Lunch Subway,12.50,food\n"
+        "not a date,Broken row,1,food\n"
+    )
+
+    def upload(text, **form):
+        return client.post(
+            "/transactions/import",
+            data={"file": (io.BytesIO(text.encode()), "export.csv"), **form},
+            content_type="multipart/form-data",
+        )
+
+    response = upload(csv_text)
+    assert response.status_code == 200
+    report = response.get_json()
+    # Both lunches are kept: repeats within a file are real transactions
+    assert (report["rows_read"], report["inserted"], report["duplicates"], report["invalid"]) == (4, 3, 0, 1)
+    assert report["errors"][0]["row"] == 4
+
+    report = upload(csv_text.replace("12.50,food", "12.50,transport")).get_json()
+    assert (report["inserted"], report["duplicates"]) == (0, 3)
+
+    report = upload(csv_text.replace("12.50,food", "12.50,transport"), mode="upsert").get_json()
+    assert (report["inserted"], report["updated"]) == (0, 2)
+    data = client.get("/transactions").get_json()
+    assert len(data) == 3
+    assert {tx["description"]: tx["category"] for tx in data}["Lunch Subway"] == "transport"
+
+    assert upload(csv_text, mode="merge").status_code == 400
+    assert client.post("/transactions/import").status_code == 400
+
+
+def test_export_streams_csv_and_ndjson(client):
+    login(client)
+    add_income(client, "Salary", "2025-05-01", 1500.0)
+    add_income(client, "Bonus, June", "2025-06-15", 200.0)
+
+    response = client.get("/transactions/export?format=csv&fields=date,description,amount")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == "text/csv"
+    assert response.get_data(as_text=True).splitlines() == [
+        "date,description,amount",
+        "2025-05-01,Salary,1500.0",
+        '2025-06-15,"Bonus, June",200.0',
+    ]
+
+    response = client.get("/transactions/export?format=ndjson&from=2025-06-01&gzip=1")
+    assert response.mimetype == "application/gzip"
+    lines = gzip.decompress(response.get_data()).decode().splitlines()
+    assert [json.loads(line)["description"] for line in lines] == ["Bonus, June"]
+
+    assert client.get("/transactions/export?format=xml").status_code == 400
+    assert client.get("/transactions/export?to=soon").status_code == 400
+
+
+def test_conditional_get_and_response_cache(client):
+    from models.transaction_model import Transaction
+
+    login(client)
+    add_income(client, "Salary", "2025-06-01", 1500.0)
+
+    for url in ("/transactions", "/predict"):
+        first = client.get(url)
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+        assert first.headers["Cache-Control"] == "private, no-cache"
+
+        again = client.get(url, headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.headers["ETag"] == etag
+        assert client.get(url).get_data() == first.get_data()
+
+        # Any write moves the user's data version and with it every ETag
+        add_income(client, f"Refund {url}", "2025-06-02")
+        changed = client.get(url, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+
+    etag = client.get("/transactions").headers["ETag"]
+    assert client.get("/transactions?limit=1").headers["ETag"] != etag
+    with app.app_context():
+        transaction = Transaction.query.filter_by(description="Salary").one()
+        transaction.description = "Renamed"
+        db.session.commit()
+    response = client.get("/transactions", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "Renamed" in response.get_data(as_text=True)
+
+
+def test_health_reports_pool_metrics(client):
+    response = client.get("/health")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["status"] == "ok"
+    assert data["database"]["events"]["checkout"] >= 1
+
+
+def test_metrics_expose_request_and_stage_histograms(client):
+    login(client)
+    client.post("/transactions", json={
+        "amount": 12.0,
+        "description": "Lunch Subway",
+        "date": "2025-06-02"
+    })
+    client.get("/predict")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert "# TYPE budgethelper_request_duration_seconds histogram" in body
+    assert ('budgethelper_request_duration_seconds_count'
+            '{method="POST",route="/transactions",status="201"}') in body
+    for stage in ("user_load", "db", "model_predict", "serialize"):
+        assert f'route="/transactions",stage="{stage}"' in body
+    assert 'budgethelper_stage_duration_seconds_bucket{route="/predict",stage="db",le="+Inf"}' in body
+    assert 'budgethelper_db_pool_events_total{event="checkout"}' in body
+
+    app.config["METRICS_TOKEN"] = "s3cret"
+    try:
+        assert client.get("/metrics").status_code == 401
+        authorized = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+        assert authorized.status_code == 200
+    finally:
+        app.config["METRICS_TOKEN"] = None
+
+
+def test_user_loader_cache_saves_queries_and_is_invalidated(client):
+    import user_cache
+
+    login(client)
+    client.get("/transactions")
+    before = user_cache.cache.stats()
+    for _ in range(3):
+        assert client.get("/transactions").status_code in (200, 304)
+    after = user_cache.cache.stats()
+    assert after["hits"] - before["hits"] == 3
+
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'budgethelper_user_cache_lookups_total{result="hit"}' in body
+    assert 'budgethelper_db_queries_per_request_count{method="GET",route="/transactions"}' in body
+
+    # A password change drops the cached copy on flush
+    with app.app_context():
+        user = User.query.filter_by(username="testuser").first()
+        user_id = user.id
+        assert user_cache.cache.get(user_id) is not None
+        user.set_password("changed")
+        db.session.commit()
+        assert user_cache.cache.get(user_id) is None
+
+    client.get("/transactions")
+    assert user_cache.cache.get(user_id) is not None
+    client.get("/logout")
+    assert user_cache.cache.get(user_id) is None
+
+
+def test_login_rehashes_outdated_passwords_and_sheds_bursts(client, monkeypatch):
+    import passwords
+
+    with app.app_context():
+        old_hash = User.query.filter_by(username="testuser").first().password_hash
+    monkeypatch.setattr(passwords, "hasher", passwords.PasswordHasher("pbkdf2:sha256:1000"))
+    assert login(client).status_code == 200
+    with app.app_context():
+        new_hash = User.query.filter_by(username="testuser").first().password_hash
+    assert new_hash != old_hash
+    assert new_hash.startswith("pbkdf2:sha256:1000$")
+    client.get("/logout")
+    assert login(client).status_code == 200
+    client.get("/logout")
+
+    def busy(pwhash, password):
+        raise passwords.HasherBusy("busy")
+
+    monkeypatch.setattr(passwords, "verify_password", busy)
+    response = login(client)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_predict_projects_recurring_payments(client):
+    from datetime import date, timedelta
+
+    login(client)
+    today = date.today()
+    for months_ago in (3, 2, 1):
+        client.post("/transactions", json={
+            "amount": 500.0,
+            "description": "Monthly rent",
+            "type": "spending",
+            "date": (today - timedelta(days=30 * months_ago - 5)).isoformat()
+        })
+    data = client.get("/predict").get_json()
+    assert [item["description"] for item in data["recurring"]] == ["Monthly rent"]
+    rent = data["recurring"][0]
+    assert rent["interval_days"] == 30
+    assert rent["next_date"] == (today + timedelta(days=5)).isoformat()
+    assert data["predicted_spending"] == pytest.approx(500.0, abs=1.0)
+
+    # A new transaction changes the data version, so the forecast is recomputed
+    client.post("/transactions", json={
+        "amount": 90.0,
+        "description": "Concert tickets",
+        "type": "spending",
+        "date": today.isoformat()
+    })
+    assert client.get("/predict").get_json()["predicted_spending"] > data["predicted_spending"]
+
+
+def test_predict_groups_card_suffixes_into_one_merchant(client):
+    from datetime import date, timedelta
+
+    login(client)
+    today = date.today()
+    # No single spelling occurs often enough to recur on its own
+    for description, months_ago in (
+        ("NETFLIX.COM 1234", 4), ("Netflix.com 5678", 3),
+        ("NETFLIX.COM 1234", 2), ("Netflix.com 5678", 1),
+    ):
+        client.post("/transactions", json={
+            "amount": 12.99,
+            "description": description,
+            "type": "spending",
+            "date": (today - timedelta(days=30 * months_ago - 5)).isoformat()
+        })
+    data = client.get("/predict").get_json()
+    assert [item["description"] for item in data["recurring"]] == ["Netflix.com 5678"]
+    assert data["recurring"][0]["interval_days"] == 30
+
+
+def test_personal_model_learns_from_corrections(client):
+    import personal_models
+
+    personal_models.configure(True)
+    try:
+        login(client)
+        rows = [
+            {"amount": 10.0, "description": "Uber ride", "date": f"2025-05-{day:02d}"}
+            for day in range(1, 25)
+        ]
+        assert client.post("/transactions/batch", json=rows).status_code == 201
+        created = client.post("/transactions", json={
+            "amount": 40.0, "description": "Kaufland Mladost", "date": "2025-05-26"
+        }).get_json()
+        lidl = client.post("/transactions", json={
+            "amount": 15.0, "description": "Lidl", "date": "2025-05-27"
+        }).get_json()
+        for transaction in (created, lidl):
+            response = client.patch(
+                f"/transactions/{transaction['id']}/category", json={"category": "groceries"}
+            )
+            assert response.status_code == 200
+
+        # The corrections only mark the model stale; retraining is not the request's job
+        from models.personal_categorizer_model import PersonalCategorizer
+        from models.personal_categorizer_stale_model import PersonalCategorizerStale
+        import train_personal_models
+
+        with app.app_context():
+            assert db.session.get(PersonalCategorizer, created["user_id"]) is None
+            assert db.session.get(PersonalCategorizerStale, created["user_id"]).corrections == 2
+        assert train_personal_models.main(["--stale"]) == 0
+        with app.app_context():
+            assert db.session.get(PersonalCategorizer, created["user_id"]) is not None
+            assert db.session.get(PersonalCategorizerStale, created["user_id"]) is None
+
+        # Neither the exact rules nor the global model know this description
+        again = client.post("/transactions", json={
+            "amount": 35.0, "description": "KAUFLAND Varna 0231", "date": "2025-06-02"
+        }).get_json()
+        assert again["category"] == "groceries"
+
+        stats = personal_models.cache.stats()
+        assert stats["loads"] >= 1 and stats["entries"] == 1
+        body = client.get("/metrics").get_data(as_text=True)
+        assert 'budgethelper_categorized_rows_total{source="personal"}' in body
+        assert "budgethelper_personal_model_cache_bytes" in body
+    finally:
+        personal_models.configure(False)
+
+
+def test_stale_personal_models_are_retrained_in_the_background(client):
+    import time
+
+    import personal_models
+    from models.personal_categorizer_stale_model import PersonalCategorizerStale
+
+    personal_models.configure(True, retrain_interval=30.0, app_context=app.app_context)
+    try:
+        login(client)
+        rows = [
+            {"amount": 10.0, "description": "Uber ride", "date": f"2025-05-{day:02d}"}
+            for day in range(1, 25)
+        ]
+        assert client.post("/transactions/batch", json=rows).status_code == 201
+        created = client.post("/transactions", json={
+            "amount": 40.0, "description": "Kaufland Mladost", "date": "2025-05-26"
+        }).get_json()
+        response = client.patch(
+            f"/transactions/{created['id']}/category", json={"category": "groceries"}
+        )
+        assert response.status_code == 200
+
+        # The correction woke the retrainer; it does not wait for its next round
+        deadline = time.monotonic() + 10
+        while personal_models.retrainer.retrained == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert personal_models.retrainer.stats() == {"retrained": 1, "errors": 0}
+        with app.app_context():
+            assert db.session.get(PersonalCategorizerStale, created["user_id"]) is None
+            assert personal_models.model_for(created["user_id"]) is not None
+        body = client.get("/metrics").get_data(as_text=True)
+        assert 'budgethelper_personal_model_retrains_total{result="ok"} 1' in body
+    finally:
+        personal_models.configure(False)
@@ -0,0 +1,140 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+import uvicorn
+from starlette.testclient import TestClient
+
+import asgi
+from benchmarks.bench_serving import free_port
+from app import app, db
+from models.user_model import User
+
+
+@pytest.fixture
+def client():
+    with app.app_context():
+        db.create_all()
+        user = User(username="asyncuser")
+        user.set_password("12345")
+        db.session.add(user)
+        db.session.commit()
+    # Session cookies are Secure, so talk https to the in-process server
+    with TestClient(asgi.application, base_url="https://testserver") as client:
+        yield client
+    with app.app_context():
+        db.drop_all()
+
+
+def login(client):
+    response = client.post("/login", json={"username": "asyncuser", "password": "12345"})
+    assert response.status_code == 200
+
+
+def test_async_routes_share_sessions_and_etags_with_flask(client):
+    response = client.get("/transactions", follow_redirects=False)
+    assert response.status_code == 302  # answered by Flask's login_required
+
+    login(client)
+    created = client.post("/transactions", json={
+        "amount": 1500.0, "description": "Salary", "type": "income", "date": "2025-06-01",
+    })
+    assert created.status_code == 201
+    assert created.json()["category"] == "income"
+    assert client.post("/transactions", json={"amount": 1, "date": "June"}).status_code == 400
+
+    page = client.get("/transactions?fields=description,amount")
+    assert page.status_code == 200
+    assert page.json() == [{"description": "Salary", "amount": 1500.0}]
+    assert "asyncuser" in page.headers["X-User-Info"]
+    etag = page.headers["ETag"]
+    assert client.get(
+        "/transactions?fields=description,amount", headers={"If-None-Match": etag}
+    ).status_code == 304
+
+    # Flask routes see the async write: the batch endpoint is still served by Flask
+    assert client.post("/transactions/batch", json=[{
+        "amount": 20.0, "description": "Groceries", "type": "spending", "date": "2025-06-02",
+    }]).status_code == 201
+    assert client.get(
+        "/transactions?fields=description,amount", headers={"If-None-Match": etag}
+    ).status_code == 200
+
+    prediction = client.get("/predict")
+    assert prediction.status_code == 200
+    assert prediction.json()["predicted_income"] >= 0
+
+
+def test_predict_runs_off_the_event_loop(client, monkeypatch):
+    threads = []
+    build_prediction = asgi.build_prediction
+
+    def recording(conn, user_id, today):
+        threads.append(threading.current_thread().name)
+        return build_prediction(conn, user_id, today)
+
+    monkeypatch.setattr(asgi, "build_prediction", recording)
+    login(client)
+    assert client.get("/predict").status_code == 200
+    assert len(threads) == 1 and threads[0].startswith("inference")
+
+
+def test_concurrent_requests_handed_to_flask():
+    with app.app_context():
+        db.create_all()
+        user = User(username="concurrent")
+        user.set_password("12345")
+        db.session.add(user)
+        db.session.commit()
+    server = uvicorn.Server(uvicorn.Config(
+        asgi.application, host="127.0.0.1", port=free_port(), log_level="error"
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    credentials = {"username": "concurrent", "password": "12345"}
+
+    async def visit(http, cookie):
+        # Logins go to the mounted Flask app; the session cookie is Secure,
+        # so over plain http it is passed by hand
+        statuses = []
+        for n in range(12):
+            if n % 4 == 0:
+                statuses.append((await http.post("/login", json=credentials)).status_code)
+            for path in ("/predict", "/transactions?limit=5", "/health"):
+                response = await http.get(path, headers={"Cookie": cookie})
+                statuses.append(response.status_code)
+        return statuses
+
+    async def burst():
+        base_url = f"http://127.0.0.1:{server.config.port}"
+        async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as http:
+            login = await http.post("/login", json=credentials)
+            cookie = f"session={login.cookies['session']}"
+            return await asyncio.gather(*[visit(http, cookie) for _ in range(4)])
+
+    try:
+        deadline = time.monotonic() + 30
+        while not server.started:
+            assert thread.is_alive() and time.monotonic() < deadline
+            time.sleep(0.05)
+        statuses = [status for visit_statuses in asyncio.run(burst()) for status in visit_statuses]
+        assert len(statuses) == 4 * 39
+        assert all(status < 400 for status in statuses), statuses
+    finally:
+        server.should_exit = True
+        thread.join(10)
+        with app.app_context():
+            db.drop_all()
+
+
+def test_async_url():
+    assert str(asgi.async_url("postgresql://u@h/db")) == "postgresql+psycopg://u@h/db"
+    assert str(asgi.async_url("sqlite:////tmp/x.db")) == "sqlite+aiosqlite:////tmp/x.db"
+    with pytest.raises(ValueError):
+        asgi.async_url("sqlite://")
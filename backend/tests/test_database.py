@@ -0,0 +1,70 @@
+import sys
+import os
+import threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import database
+
+
+def make_engine(url, env={}):
+    engine = create_engine(url, **database.engine_options(url, env))
+    return engine, database.instrument(engine, env)
+
+
+def test_database_url_and_pool_options():
+    assert database.database_url({}) == database.DEFAULT_URL
+    assert database.database_url({"DATABASE_URL": "postgres://u@h/db"}) == "postgresql://u@h/db"
+    options = database.engine_options("postgresql://u@h/db", {"DB_POOL_SIZE": "20"})
+    assert options["pool_size"] == 20 and options["pool_pre_ping"] is True
+    assert "pool_size" not in database.engine_options("sqlite:///x.db", {})
+
+
+def test_sqlite_connections_are_tuned_for_concurrent_writers(tmp_path):
+    engine, metrics = make_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    with engine.begin() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        conn.execute(text("CREATE TABLE t (worker INTEGER, n INTEGER)"))
+
+    errors = []
+
+    def write(worker):
+        try:
+            for n in range(25):
+                with engine.begin() as conn:
+                    conn.execute(text("INSERT INTO t VALUES (:w, :n)"), {"w": worker, "n": n})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM t")).scalar() == 200
+
+    stats = metrics.stats()
+    assert stats["dialect"] == "sqlite"
+    assert stats["events"]["checkout"] >= 201
+    assert stats["events"]["connect"] >= 1
+
+
+@pytest.mark.skipif(
+    not os.environ.get("TEST_DATABASE_URL", "").startswith("postgresql"),
+    reason="needs TEST_DATABASE_URL pointing at PostgreSQL",
+)
+def test_postgres_pool_metrics():
+    engine, metrics = make_engine(os.environ["TEST_DATABASE_URL"], {"DB_POOL_SIZE": "3"})
+    connections = [engine.connect() for _ in range(4)]
+    stats = metrics.stats()
+    assert (stats["size"], stats["checkedout"], stats["overflow"]) == (3, 4, 1)
+    for conn in connections:
+        conn.close()
+    assert metrics.stats()["checkedout"] == 0
+    engine.dispose()
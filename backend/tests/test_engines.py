@@ -0,0 +1,68 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pytest
+
+import categorizer
+import engines
+import train_expense_model as training
+from features import CompiledEncoder
+from test_features import load_rows
+
+
+@pytest.fixture(scope="module")
+def linear_pipeline(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("models") / "linear.joblib")
+    training.train(
+        csv_path=os.path.join(os.path.dirname(__file__), "..", "transactions.csv"),
+        path=path,
+        engine="linear",
+        n_jobs=1,
+    )
+    import joblib
+
+    return joblib.load(path)
+
+
+def test_hashing_encoder_matches_pipeline(linear_pipeline):
+    encoder = CompiledEncoder.from_pipeline(linear_pipeline)
+    rows = load_rows()
+
+    expected = linear_pipeline.steps[0][1].transform(categorizer.build_features(rows))
+    actual = encoder.transform(rows)
+    assert actual.shape == expected.shape
+    assert np.allclose(np.asarray(actual.todense()), np.asarray(expected.todense()))
+
+
+def test_linear_predictor_matches_pipeline(linear_pipeline):
+    assert engines.for_pipeline(linear_pipeline).name == "linear"
+    # Saved sparsified: only trained tokens keep weights
+    assert linear_pipeline.steps[-1][1].coef_.nnz < 10_000
+    predictor = engines.compile_pipeline(linear_pipeline)
+    assert isinstance(predictor, engines.LinearPredictor)
+    rows = load_rows()
+    expected = linear_pipeline.predict(categorizer.build_features(rows))
+    assert list(predictor.predict(predictor.features(rows))) == list(expected)
+
+
+def test_legacy_model_is_served_by_the_forest_engine():
+    pipeline = categorizer.get_model()
+    assert engines.for_pipeline(pipeline).name == "forest"
+    assert isinstance(engines.compile_pipeline(pipeline), engines.ForestPredictor)
+
+
+def test_configure_switches_engine_model_file():
+    try:
+        categorizer.configure(engine="linear")
+        assert categorizer.MODEL_PATH == engines.get("linear").path
+        assert categorizer.categorize(
+            [{"description": "Uber ride", "amount": 10.0, "date": load_rows()[0]["date"]}]
+        ) == ["transport"]
+        assert categorizer.model_info()["engine"] == "linear"
+        with pytest.raises(ValueError):
+            categorizer.configure(engine="gpu")
+    finally:
+        categorizer.configure()
+    assert categorizer.MODEL_PATH == engines.get("forest").path
@@ -0,0 +1,45 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import csv
+from datetime import date
+
+import numpy as np
+
+import categorizer
+from features import CompiledEncoder
+
+BACKEND = os.path.join(os.path.dirname(__file__), "..")
+
+
+def load_rows():
+    with open(os.path.join(BACKEND, "transactions.csv")) as f:
+        rows = [
+            {
+                "description": row["description"],
+                "amount": float(row["amount"]),
+                "date": date.fromisoformat(row["date"]),
+            }
+            for row in csv.DictReader(f)
+        ]
+    rows += [
+        {"description": "", "amount": 0.0, "date": date(2024, 2, 29)},
+        {"description": "Totally unseen merchant!!", "amount": -5.5, "date": date(2030, 12, 31)},
+        {"description": "UBER uber Uber ride", "amount": 12345.67, "date": date(2025, 1, 1)},
+    ]
+    return rows
+
+
+def test_compiled_encoder_matches_pipeline():
+    pipeline = categorizer.get_model()
+    encoder = CompiledEncoder.from_pipeline(pipeline)
+    rows = load_rows()
+
+    expected = pipeline.steps[0][1].transform(categorizer.build_features(rows))
+    actual = encoder.transform(rows)
+    assert actual.shape == expected.shape
+    assert np.array_equal(np.asarray(actual.todense()), np.asarray(expected.todense()))
+
+    classifier = pipeline.steps[-1][1]
+    assert list(classifier.predict(actual)) == list(pipeline.predict(categorizer.build_features(rows)))
@@ -0,0 +1,85 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import random
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+import forecast
+from generate_training_data import generate_history
+
+TODAY = date(2025, 6, 30)
+
+
+def history(days=forecast.LOOKBACK_DAYS, seed=1):
+    start = datetime.combine(TODAY - timedelta(days=days - 1), datetime.min.time())
+    end = datetime.combine(TODAY, datetime.min.time())
+    return [
+        (h["description"], h["type"], h["category"], h["amount"], date.fromisoformat(h["date"]))
+        for h in generate_history(start, end, rng=random.Random(seed))
+    ]
+
+
+def run(rows):
+    return forecast.forecast_rows(rows, forecast.daily_totals_from_rows(rows), TODAY)
+
+
+def test_detects_the_synthetic_recurring_streams():
+    result = run(history())
+    recurring = {item["description"]: item for item in result["recurring"]}
+    for description in ("Monthly rent", "Monthly salary", "Netflix subscription", "Haircut"):
+        assert recurring[description]["interval_days"] == 30
+        assert recurring[description]["occurrences"] == 1
+    assert 450 <= recurring["Monthly rent"]["amount"] <= 550
+    # Shopping picks a random item each time, so it is left to the smoothing
+    assert "Shoes" not in recurring
+    assert result["predicted_income"] > 1000
+    assert abs(sum(result["spending_by_category"].values()) - result["predicted_spending"]) < 0.05
+
+
+def test_lapsed_series_are_not_projected():
+    rows = [
+        ("Gym", "spending", "health", 30.0, TODAY - timedelta(days=days_ago))
+        for days_ago in (150, 120, 90)
+    ]
+    assert run(rows)["recurring"] == []
+
+
+def test_card_suffixes_are_one_merchant():
+    rows = [
+        (description, "spending", "entertainment", 12.99, TODAY - timedelta(days=days_ago))
+        for description, days_ago in (
+            ("NETFLIX.COM 1234", 95), ("Netflix.com 5678", 65),
+            ("NETFLIX.COM 1234", 35), ("Netflix.com  5678", 5),
+        )
+    ]
+    assert forecast.merchant_key("NETFLIX.COM 1234") == forecast.merchant_key("Netflix.com 5678")
+    [netflix] = run(rows)["recurring"]
+    assert netflix["description"] == "Netflix.com  5678"
+    assert netflix["interval_days"] == 30
+
+
+def test_overdue_payment_is_expected_tomorrow():
+    series = {"period": 30.0, "last_date": TODAY - timedelta(days=31)}
+    assert forecast.project(series, TODAY) == [
+        TODAY + timedelta(days=1),
+        TODAY + timedelta(days=29),
+    ]
+
+
+def test_smoothing_matches_the_recursive_definition():
+    rng = np.random.default_rng(0)
+    matrix = rng.uniform(0, 50, size=(3, 40))
+    alpha = 0.1
+    level = matrix.mean(axis=1)
+    for day in range(matrix.shape[1]):
+        level = alpha * matrix[:, day] + (1 - alpha) * level
+    assert np.allclose(forecast.smoothed_daily(matrix, alpha), level)
+
+
+def test_short_history_is_not_diluted_by_empty_days():
+    rows = [("Coffee", "spending", "food", 4.0, TODAY - timedelta(days=d)) for d in range(10)]
+    result = run(rows)
+    assert result["spending_by_category"]["food"] == 120.0
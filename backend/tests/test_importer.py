@@ -0,0 +1,86 @@
+import io
+import sys
+import os
+from datetime import date
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+import importer
+from app import app, db
+from importer import detect_format, read_ofx, read_qif, validate
+from models.transaction_model import Transaction
+from models.user_model import User
+
+OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRSRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20250603120000[-5:EST]
+<TRNAMT>-12.50
+<NAME>Lunch Subway
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250601<TRNAMT>1500.00<NAME>Monthly salary</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRSRS></BANKMSGSRSV1></OFX>
+"""
+
+QIF = """!Type:Bank
+D6/3/25
+T-12.50
+PLunch Subway
+^
+D06/01'2025
+T1,500.00
+PMonthly salary
+^
+"""
+
+
+def test_ofx_and_qif_yield_signed_rows():
+    for rows in (list(read_ofx(io.StringIO(OFX))), list(read_qif(io.StringIO(QIF)))):
+        clean = [validate(row) for row in rows]
+        assert clean == [
+            {"description": "Lunch Subway", "date": date(2025, 6, 3), "amount": 12.5, "type": "spending"},
+            {"description": "Monthly salary", "date": date(2025, 6, 1), "amount": 1500.0, "type": "income"},
+        ]
+
+
+def test_validation_errors():
+    assert detect_format("export.OFX") == "ofx"
+    with pytest.raises(ValueError):
+        detect_format("export.xlsx")
+    with pytest.raises(ValueError):
+        validate({"description": "x", "amount": "abc", "date": "2025-06-01"})
+    with pytest.raises(ValueError):
+        validate({"description": "x", "amount": "1", "date": "yesterday"})
+    with pytest.raises(ValueError):
+        validate({"description": " ", "amount": "1", "date": "2025-06-01"})
+
+
+def test_duplicates_are_found_across_chunks():
+    # Two coffees on the same day are real repeats, not duplicates
+    records = [
+        {"description": f"Shop {n % 3}", "amount": "10", "date": "2025-06-01",
+         "category": "groceries"}
+        for n in range(7)
+    ]
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(username="importer", password_hash="x")
+            db.session.add(user)
+            db.session.commit()
+            report = importer.import_records(user.id, records, chunk_size=2)
+            assert (report["inserted"], report["duplicates"]) == (7, 0)
+
+            # Re-importing the same file is a no-op
+            report = importer.import_records(user.id, records, chunk_size=2)
+            assert (report["inserted"], report["duplicates"]) == (0, 7)
+
+            # A longer export only adds the occurrences beyond what is stored
+            report = importer.import_records(user.id, records + records[:2], chunk_size=3)
+            assert (report["inserted"], report["duplicates"]) == (2, 7)
+            assert Transaction.query.filter_by(user_id=user.id).count() == 9
+        finally:
+            db.session.rollback()
+            db.drop_all()
@@ -0,0 +1,66 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import instrumentation
+from inference_queue import MicroBatcher
+
+
+def test_concurrent_rows_share_a_model_call():
+    calls = []
+
+    def predict(rows):
+        calls.append(len(rows))
+        return [row * 2 for row in rows]
+
+    batches_before, rows_before = instrumentation.INFERENCE_BATCH_SIZE.snapshot(())
+    delays_before = instrumentation.INFERENCE_QUEUE_SECONDS.snapshot(())[0]
+    batcher = MicroBatcher(predict, window_ms=50, max_batch=8, max_wait_ms=2000)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(batcher.predict, range(8)))
+
+    assert results == [row * 2 for row in range(8)]
+    assert sum(calls) == 8
+    assert len(calls) < 8
+    stats = batcher.stats()
+    assert stats["items"] == 8
+    assert stats["batches"] == len(calls)
+    assert stats["batch_size_max"] == max(calls)
+    # Also exported on GET /metrics
+    assert instrumentation.INFERENCE_BATCH_SIZE.snapshot(()) == (
+        batches_before + len(calls), rows_before + 8
+    )
+    assert instrumentation.INFERENCE_QUEUE_SECONDS.snapshot(())[0] == delays_before + 8
+    assert "budgethelper_inference_batch_size_bucket{le=\"8\"}" in instrumentation.render()
+
+
+def test_slow_queue_falls_back_to_inline_prediction():
+    release = threading.Event()
+
+    def predict(rows):
+        if threading.current_thread().name == "inference-batcher":
+            release.wait(2)
+        return ["inline" if not release.is_set() else "queued" for _ in rows]
+
+    batcher = MicroBatcher(predict, window_ms=1, max_wait_ms=20)
+    started = time.perf_counter()
+    assert batcher.predict("row") == "inline"
+    assert time.perf_counter() - started < 1
+    assert batcher.stats()["fallbacks"] == 1
+    release.set()
+
+
+def test_model_errors_reach_the_caller():
+    def predict(rows):
+        raise RuntimeError("model exploded")
+
+    batcher = MicroBatcher(predict, window_ms=1, max_wait_ms=1000)
+    with pytest.raises(RuntimeError):
+        batcher.submit("row").result(timeout=1)
+    assert batcher.stats()["errors"] == 1
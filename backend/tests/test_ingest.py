@@ -0,0 +1,236 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import threading
+import time
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+import aggregates
+import ingest
+import shards
+from app import app, db
+from models.transaction_model import Transaction
+from models.user_model import User
+
+
+def test_concurrent_appends_share_fsyncs_and_queue_in_order(tmp_path):
+    log = ingest.IngestLog(str(tmp_path))
+    queued = []
+    threads = [
+        threading.Thread(
+            target=lambda n=n: [
+                log.append({"n": n * 100 + i}, then=lambda seq, r: queued.append(seq))
+                for i in range(50)
+            ]
+        )
+        for n in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert queued == list(range(1, 401))
+    assert [record["seq"] for record in ingest.read_log(log.path)] == queued
+    assert log.synced == 400 and 0 < log.fsyncs <= 400
+    assert log.truncate(399) is False
+    assert log.truncate(400) is True and os.path.getsize(log.path) == 0
+    log.close()
+
+
+@pytest.fixture
+def client(tmp_path):
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        user = User(username="ingester")
+        user.set_password("12345")
+        db.session.add(user)
+        db.session.commit()
+    # A long flush interval: only the read barrier makes writes visible quickly
+    ingest.configure(str(tmp_path), app.app_context, flush_ms=5000)
+    try:
+        with app.test_client() as client:
+            yield client
+    finally:
+        ingest.configure(None)
+        with app.app_context():
+            db.drop_all()
+
+
+def test_logged_transactions_are_read_back_by_their_user(client):
+    # Nothing logged yet in this worker
+    assert client.get("/metrics").status_code == 200
+    assert client.post(
+        "/login", json={"username": "ingester", "password": "12345"}
+    ).status_code == 200
+    today = date.today().isoformat()
+    started = time.monotonic()
+    for amount in (10.0, 20.0, 1000.0):
+        response = client.post("/transactions", json={
+            "amount": amount,
+            "description": "Salary" if amount > 100 else "Lunch Subway",
+            "type": "income" if amount > 100 else "spending",
+            "date": today,
+        })
+        assert response.status_code == 202
+        assert response.get_json()["id"] is None
+    bad = client.post("/transactions", json={"amount": "x", "description": "Bad"})
+    assert bad.status_code == 400
+    too_long = client.post("/transactions", json={"amount": 1.0, "description": "x" * 201})
+    assert too_long.status_code == 400
+    assert ingest.writer.stats()["pending"] == 3
+
+    rows = client.get("/transactions").get_json()
+    assert sorted(row["amount"] for row in rows) == [10.0, 20.0, 1000.0]
+    assert all(row["id"] is not None for row in rows)
+    assert time.monotonic() - started < 4
+    assert client.get("/predict").get_json()["total_income"] == 1000.0
+
+    stats = ingest.writer.stats()
+    assert stats["pending"] == 0 and stats["committed"] == 3
+    with app.app_context():
+        assert aggregates.check(db.session.connection()) == []
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'budgethelper_ingest_rows_total{state="committed"} 3' in body
+
+
+def test_reads_wait_for_writes_logged_by_every_worker(client):
+    assert client.post(
+        "/login", json={"username": "ingester", "password": "12345"}
+    ).status_code == 200
+    assert client.post("/transactions", json={
+        "amount": 7.0, "description": "Coffee", "date": date.today().isoformat()
+    }).status_code == 202
+    own_log = ingest.writer.log_id
+    # A write the same session made through another worker, not committed yet
+    other = os.path.join(ingest.directory, "other-worker.log")
+    open(other, "wb").close()
+    ingest._write_watermark(ingest.directory, "other-worker", 1)
+    with client.session_transaction() as session:
+        session["ingest"]["other-worker"] = 2
+        assert set(session["ingest"]) == {own_log, "other-worker"}
+
+    timeout = app.config["INGEST_READ_TIMEOUT_MS"]
+    app.config["INGEST_READ_TIMEOUT_MS"] = 50
+    try:
+        assert len(client.get("/transactions").get_json()) == 1
+        with client.session_transaction() as session:
+            assert session["ingest"] == {"other-worker": 2}
+
+        ingest._write_watermark(ingest.directory, "other-worker", 2)
+        client.get("/transactions")
+        with client.session_transaction() as session:
+            assert "ingest" not in session
+    finally:
+        app.config["INGEST_READ_TIMEOUT_MS"] = timeout
+        os.remove(other)
+
+
+def logged(user_id, amount=5.0):
+    return {"user_id": user_id, "description": "Logged", "amount": amount,
+            "category": "food", "type": "spending", "date": "2025-05-01"}
+
+
+def test_retried_batch_skips_shards_that_committed(tmp_path, monkeypatch):
+    shard_set = shards.configure([f"sqlite:///{tmp_path / f'shard{i}.db'}" for i in range(2)])
+    first = next(n for n in range(1, 100) if shard_set.index_for(n) == 0)
+    second = next(n for n in range(1, 100) if shard_set.index_for(n) == 1)
+    failing = shard_set.sessions[1]
+    commit = failing.commit
+    calls = []
+
+    def fail_once():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OperationalError("COMMIT", {}, Exception("disk I/O error"))
+        return commit()
+
+    monkeypatch.setattr(failing, "commit", fail_once)
+    writer = ingest.IngestWriter(str(tmp_path / "log"), app.app_context, flush_ms=5000)
+    try:
+        for user_id in (first, second, first):
+            _, seq = writer.submit(logged(user_id))
+        assert writer.wait(seq, timeout=5)
+        assert writer.errors == 1
+        for engine, user_id, rows in ((shard_set.engines[0], first, 2),
+                                      (shard_set.engines[1], second, 1)):
+            with engine.connect() as conn:
+                assert conn.execute(
+                    select(func.count()).where(aggregates.transaction_table.c.user_id == user_id)
+                ).scalar() == rows
+    finally:
+        writer.close()
+        shards.configure(())
+
+
+def test_rejected_records_are_dead_lettered(tmp_path):
+    with app.app_context():
+        db.create_all()
+        user = User(username="rejected", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    writer = ingest.IngestWriter(str(tmp_path), app.app_context, flush_ms=5000)
+    try:
+        for amount in (5.0, None, 6.0):
+            log_id, seq = writer.submit(logged(user_id, amount))
+        assert writer.wait(seq, timeout=5)
+        assert writer.stats()["rejected"] == 1 and writer.errors == 0
+        with open(tmp_path / f"{log_id}.dead-letter") as f:
+            dead = [json.loads(line) for line in f]
+        assert [entry["record"]["seq"] for entry in dead] == [2]
+        with app.app_context():
+            assert ingest.checkpoint(db.session, log_id) == 3
+            amounts = db.session.execute(
+                select(Transaction.amount).where(Transaction.user_id == user_id)
+            ).scalars().all()
+            assert sorted(amounts) == [5.0, 6.0]
+    finally:
+        writer.close()
+        with app.app_context():
+            db.drop_all()
+
+
+def test_dead_workers_log_is_replayed_once(tmp_path):
+    with app.app_context():
+        db.create_all()
+        user = User(username="crashed", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    try:
+        records = [
+            {"seq": seq, "user_id": user_id, "description": f"Logged {seq}", "amount": 5.0,
+             "category": "food", "type": "spending", "date": "2025-05-01"}
+            for seq in (1, 2, 3)
+        ]
+        with app.app_context():
+            # The worker committed the first two records, then died
+            ingest.commit_records("dead-worker", records[:2])
+        path = tmp_path / "dead-worker.log"
+        path.write_bytes(
+            b"".join(json.dumps(r).encode() + b"\n" for r in records) + b'{"seq": 4, "us'
+        )
+
+        ingest.configure(str(tmp_path), app.app_context)
+        assert not path.exists()
+        with app.app_context():
+            descriptions = db.session.execute(
+                select(Transaction.description).where(Transaction.user_id == user_id)
+            ).scalars().all()
+            assert sorted(descriptions) == ["Logged 1", "Logged 2", "Logged 3"]
+            assert db.session.execute(
+                select(func.count()).select_from(aggregates.aggregate_table)
+                .where(aggregates.aggregate_table.c.user_id == user_id)
+            ).scalar() == 1
+    finally:
+        ingest.configure(None)
+        with app.app_context():
+            db.drop_all()
@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+
+import instrumentation
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = instrumentation.Histogram("demo_seconds", "Demo.", ("route",), (0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(("/x",), value)
+    lines = histogram.render()
+    assert 'demo_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/x",le="1.0"} 3' in lines
+    assert 'demo_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'demo_seconds_count{route="/x"} 4' in lines
+    assert histogram.snapshot(("/x",)) == (4, 4.05)
+
+
+def test_stage_is_labelled_with_the_current_route():
+    token = instrumentation.set_route("/demo")
+    try:
+        with instrumentation.stage("work"):
+            pass
+    finally:
+        instrumentation.reset_route(token)
+    assert instrumentation.STAGE_SECONDS.snapshot(("/demo", "work"))[0] == 1
+    assert instrumentation.current_route() == "-"
+
+
+def slow_leaf():
+    time.sleep(0.1)
+
+
+def test_profiler_dumps_folded_stacks_only_for_slow_requests(tmp_path):
+    profiler = instrumentation.SamplingProfiler(str(tmp_path), slow=0.05, interval=0.001)
+
+    handle = profiler.start()
+    started = time.perf_counter()
+    slow_leaf()
+    path = profiler.finish(handle, time.perf_counter() - started, "GET /slow")
+    assert os.path.basename(path).endswith("ms.folded")
+    assert "GET_slow" in os.path.basename(path)
+    with open(path) as f:
+        stacks = [line.rsplit(" ", 1) for line in f.read().splitlines()]
+    assert any("slow_leaf (test_instrumentation.py" in stack for stack, _ in stacks)
+    assert all(int(count) > 0 for _, count in stacks)
+
+    fast = profiler.start()
+    assert profiler.finish(fast, 0.001, "GET /fast") is None
+    assert profiler.dumps == 1
+
+    assert instrumentation.SamplingProfiler(str(tmp_path), rate=0).start() is None
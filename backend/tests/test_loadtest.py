@@ -0,0 +1,47 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from benchmarks import loadtest
+
+
+def report(rps, p50, p99, errors=0, **config):
+    stats = {"rps": rps, "p50_ms": p50, "p99_ms": p99, "errors": errors}
+    return {
+        "meta": {"commit": "abc"},
+        "config": dict({"server": "gunicorn", "workers": 2}, **config),
+        "totals": dict(stats),
+        "endpoints": {"list": dict(stats)},
+        "database": {"bytes_after": 1000},
+    }
+
+
+def test_parse_mix_and_summary():
+    assert loadtest.parse_mix("list=3, post=1") == {"list": 3.0, "post": 1.0}
+    with pytest.raises(ValueError):
+        loadtest.parse_mix("delete=1")
+
+    summary = loadtest.summarize([float(ms) for ms in range(1, 101)], errors=2, duration=10)
+    assert summary["requests"] == 100
+    assert summary["rps"] == 10.0
+    assert summary["p50_ms"] == 50.0
+    assert summary["p99_ms"] == 99.0
+    assert summary["max_ms"] == 100.0
+    assert loadtest.summarize([], 0, 1)["p99_ms"] is None
+
+
+def test_compare_flags_regressions_past_threshold():
+    base = report(rps=100, p50=10, p99=50)
+    _lines, regressions = loadtest.compare(base, report(rps=95, p50=10.5, p99=54))
+    assert regressions == []
+
+    lines, regressions = loadtest.compare(base, report(rps=80, p50=10, p99=80, errors=3, workers=4))
+    assert "list rps" in regressions
+    assert "list p99_ms" in regressions
+    assert "list errors" in regressions
+    assert any(line.startswith("warning: workers differs") for line in lines)
+
+    # Getting faster is never a regression
+    assert loadtest.compare(base, report(rps=200, p50=1, p99=5))[1] == []
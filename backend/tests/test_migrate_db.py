@@ -0,0 +1,38 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, inspect, text
+
+from migrate_db import upgrade
+
+
+def make_legacy_db(path):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE "transaction" (id INTEGER PRIMARY KEY, '
+            "description VARCHAR(200) NOT NULL, amount FLOAT NOT NULL, "
+            "category VARCHAR(100) NOT NULL, type VARCHAR(50) NOT NULL, "
+            "date VARCHAR(100) NOT NULL, user_id INTEGER NOT NULL)"
+        ))
+        conn.execute(text(
+            "INSERT INTO \"transaction\" VALUES "
+            "(1, 'Rent', 500, 'housing', 'spending', '2025-01-01', 1), "
+            "(2, 'Salary', 1500, 'income', 'income', '2025-01-02 09:30:00', 1)"
+        ))
+    return engine
+
+
+def test_upgrade_converts_dates_and_adds_indexes(tmp_path):
+    engine = make_legacy_db(tmp_path / "legacy.db")
+
+    assert "transaction.date -> DATE" in upgrade(engine)
+    assert upgrade(engine) == []
+
+    inspector = inspect(engine)
+    indexes = {ix["name"] for ix in inspector.get_indexes("transaction")}
+    assert {"ix_transaction_user_date", "ix_transaction_user_type_date"} <= indexes
+    with engine.connect() as conn:
+        dates = conn.execute(text('SELECT date FROM "transaction" ORDER BY id')).scalars().all()
+    assert dates == ["2025-01-01", "2025-01-02"]
@@ -0,0 +1,95 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import threading
+import time
+
+import pytest
+
+import overrides
+from app import app, db
+from models.category_override_model import CategoryOverride
+from models.user_model import User
+from overrides import OverrideIndex
+
+
+def test_exact_rules_beat_prefix_rules():
+    index = OverrideIndex([
+        ("Uber", "prefix", "transport"),
+        ("uber eats", "prefix", "food"),
+        ("Uber ride home", "exact", "commute"),
+    ])
+    assert index.lookup("UBER ride home") == "commute"
+    assert index.lookup("Uber Eats order") == "food"
+    assert index.lookup("uber ride to mall") == "transport"
+    assert index.lookup("Lyft") is None
+    assert len(index) == 3
+
+
+def test_long_descriptions_fit_the_pattern_column():
+    description = "Card payment " + "x" * 237
+    assert len(description) == 250
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(username="verbose", password_hash="x")
+            db.session.add(user)
+            db.session.commit()
+            rule = overrides.remember(user.id, description, "shopping")
+            db.session.commit()
+            overrides.invalidate(user.id)
+            assert len(rule.pattern) == overrides.MAX_PATTERN_LENGTH
+            assert overrides.index_for(user.id).lookup(description) == "shopping"
+
+            with pytest.raises(ValueError):
+                overrides.remember(user.id, description, "shopping", pattern=description)
+        finally:
+            db.session.rollback()
+            overrides.invalidate()
+            db.drop_all()
+
+
+def test_concurrent_remembers_of_one_merchant_upsert():
+    with app.app_context():
+        db.create_all()
+        user = User(username="corrector", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    first_written, commit_first = threading.Event(), threading.Event()
+    errors = []
+
+    def correct(category, hold):
+        try:
+            with app.app_context():
+                overrides.remember(user_id, "Kaufland 123", category)
+                if hold:
+                    # Keep this write uncommitted while the other one starts
+                    first_written.set()
+                    commit_first.wait(5)
+                db.session.commit()
+        except Exception as e:
+            errors.append(e)
+
+    try:
+        first = threading.Thread(target=correct, args=("groceries", True))
+        first.start()
+        assert first_written.wait(5)
+        second = threading.Thread(target=correct, args=("shopping", False))
+        second.start()
+        time.sleep(0.2)
+        commit_first.set()
+        first.join(10)
+        second.join(10)
+
+        assert errors == []
+        with app.app_context():
+            rules = CategoryOverride.query.filter_by(user_id=user_id).all()
+            assert [(rule.pattern, rule.category) for rule in rules] == [
+                ("kaufland 123", "shopping")
+            ]
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
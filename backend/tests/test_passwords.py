@@ -0,0 +1,47 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import threading
+
+import pytest
+
+from passwords import HasherBusy, PasswordHasher
+
+FAST = "pbkdf2:sha256:1000"
+
+
+def test_hash_verify_and_rehash_detection():
+    hasher = PasswordHasher(FAST, workers=1, max_queue=1)
+    pwhash = hasher.hash("secret")
+    assert pwhash.startswith(FAST + "$")
+    assert hasher.verify(pwhash, "secret")
+    assert not hasher.verify(pwhash, "wrong")
+    assert not hasher.needs_rehash(pwhash)
+    assert PasswordHasher("pbkdf2:sha256:2000").needs_rehash(pwhash)
+    # Short method names are compared by the parameters werkzeug expands them to
+    assert not PasswordHasher("scrypt").needs_rehash(PasswordHasher("scrypt").hash("x"))
+    assert hasher.stats()["completed"] == 3
+
+
+def test_full_queue_rejects_instead_of_waiting():
+    hasher = PasswordHasher(FAST, workers=1, max_queue=0)
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    worker = threading.Thread(target=hasher._run, args=(block,))
+    worker.start()
+    started.wait(5)
+    try:
+        assert hasher.stats()["in_flight"] == 1
+        with pytest.raises(HasherBusy):
+            hasher.hash("secret")
+        assert hasher.stats()["rejected"] == 1
+    finally:
+        release.set()
+        worker.join()
+    assert hasher.verify(hasher.hash("secret"), "secret")
+    hasher.shutdown()
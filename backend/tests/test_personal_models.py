@@ -0,0 +1,121 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from datetime import date
+
+import personal_models
+from app import app, db
+from models.transaction_model import Transaction
+from models.user_model import User
+from personal_models import ModelCache, PersonalModel
+
+
+def fitted():
+    samples = [("Uber ride", "transport", 20), ("Netflix subscription", "fun", 5)]
+    # Two corrections: this user files Kaufland and Lidl under groceries
+    samples += [("kaufland mladost", "groceries", 1 + personal_models.CORRECTION_WEIGHT)]
+    samples += [("lidl", "groceries", 1 + personal_models.CORRECTION_WEIGHT)]
+    return PersonalModel.fit(samples)
+
+
+def test_personal_model_generalizes_corrections_and_defers_when_unsure():
+    model = fitted()
+    assert model.predict("KAUFLAND Varna 0231") == "groceries"
+    assert model.predict("uber  RIDE home") == "transport"
+    # Nothing known about these words: the global model decides
+    assert model.predict("Dentist appointment") is None
+    assert model.predict("") is None
+
+
+def test_single_category_history_gets_no_personal_model():
+    # Confident about everything it knows a word of, so it must never answer
+    model = PersonalModel.fit([("Lunch at the office", "food", 30)])
+    assert model.predict("Office chair") is None
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(username="onecategory", password_hash="x")
+            db.session.add(user)
+            db.session.commit()
+            db.session.add_all(
+                Transaction(user_id=user.id, description=f"Lunch {n}", amount=10.0,
+                            category="food", type="spending", date=date(2025, 5, 1))
+                for n in range(personal_models.MIN_ROWS)
+            )
+            db.session.commit()
+            assert personal_models.train(db.session, user.id) is None
+        finally:
+            db.session.rollback()
+            db.drop_all()
+
+
+def test_a_correction_during_a_retrain_keeps_the_model_stale(monkeypatch):
+    from models.personal_categorizer_stale_model import PersonalCategorizerStale
+
+    personal_models.configure(True)
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(username="busycorrector", password_hash="x")
+            db.session.add(user)
+            db.session.commit()
+            personal_models.mark_stale(db.session, user.id)
+            db.session.commit()
+
+            train = personal_models.train
+
+            def correct_meanwhile(session, user_id):
+                personal_models.mark_stale(session, user_id)
+                return train(session, user_id)
+
+            monkeypatch.setattr(personal_models, "train", correct_meanwhile)
+            assert personal_models.retrain_stale(db.session) == 1
+            assert db.session.get(PersonalCategorizerStale, user.id).corrections == 2
+
+            monkeypatch.setattr(personal_models, "train", train)
+            assert personal_models.retrain_stale(db.session) == 1
+            assert personal_models.retrain_stale(db.session) == 0
+        finally:
+            db.session.rollback()
+            db.drop_all()
+            personal_models.configure(False)
+
+
+def test_personal_model_round_trips_compactly():
+    model = fitted()
+    payload = model.to_bytes()
+    assert len(payload) < 300
+    loaded = PersonalModel.from_bytes(payload)
+    assert loaded.counts is None
+    assert loaded.nbytes < model.nbytes * 2
+    for description in ("Kaufland Varna", "Uber ride", "Netflix", "Dentist"):
+        assert loaded.predict(description) == model.predict(description)
+
+
+def test_model_cache_bounds_entries_bytes_and_age():
+    now = [0.0]
+    model = fitted()
+    cache = ModelCache(maxsize=3, max_bytes=model.nbytes * 2 + 500, ttl=10, clock=lambda: now[0])
+    cache.put(1, model, load_seconds=0.002)
+    cache.put(2, None)
+    assert cache.get(1) == (True, model)
+    assert cache.get(2) == (True, None)
+    assert cache.get(3) == (False, None)
+
+    # A second model fits; a third would exceed the byte cap, so the least
+    # recently used entry goes
+    cache.put(3, model)
+    cache.put(4, model)
+    assert cache.get(1) == (False, None)
+    assert cache.get(2) == (True, None)
+    assert cache.stats()["bytes"] <= cache.max_bytes
+    assert cache.stats()["evictions"] >= 1
+
+    now[0] = 11
+    assert cache.get(4) == (False, None)
+    stats = cache.stats()
+    assert stats["loads"] == 4
+    assert stats["load_seconds"] == 0.002
+    assert 0 < stats["hit_rate"] < 1
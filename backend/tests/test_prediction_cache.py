@@ -0,0 +1,93 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from datetime import date
+
+import categorizer
+from prediction_cache import PredictionCache
+
+
+def row(description, amount=10.0, day=date(2025, 6, 2)):
+    return {"description": description, "amount": amount, "date": day}
+
+
+def test_lru_eviction_and_counters():
+    cache = PredictionCache(maxsize=2)
+    cache.put("a", "food")
+    cache.put("b", "transport")
+    assert cache.get("a") == "food"
+    cache.put("c", "housing")  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_puts_from_before_a_clear_are_dropped():
+    cache = PredictionCache()
+    generation = cache.generation
+    cache.clear()
+    cache.put("a", "food", generation)
+    assert cache.get("a") is None
+    cache.put("a", "transport", cache.generation)
+    assert cache.get("a") == "transport"
+    assert cache.stats()["stale_puts"] == 1
+
+
+def test_key_modes():
+    features = PredictionCache(mode="features")
+    description = PredictionCache(mode="description")
+    assert features.key(row("  Uber   RIDE ")) == features.key(row("uber ride"))
+    assert features.key(row("uber ride", 10.0)) != features.key(row("uber ride", 12.0))
+    assert description.key(row("uber ride", 10.0)) == description.key(row("Uber ride", 12.0))
+
+
+def test_categorize_uses_cache_and_resets_on_model_change(monkeypatch):
+    calls = []
+
+    def fake_predict(rows):
+        calls.append(len(rows))
+        return ["transport"] * len(rows)
+
+    monkeypatch.setattr(categorizer, "predict_categories", fake_predict)
+    categorizer.configure(cache_size=16, cache_mode="description")
+    try:
+        assert categorizer.categorize([row("Uber ride")]) == ["transport"]
+        assert categorizer.categorize([row("uber  ride", 99.0)]) == ["transport"]
+        assert calls == [1]
+
+        monkeypatch.setattr(categorizer, "_model_signature", lambda path: ("changed",))
+        monkeypatch.setattr("joblib.load", lambda path, **kwargs: object())
+        # Put the real model back afterwards, even if this test loaded the first one
+        for name in ("model", "model_signature", "predictor", "_loaded"):
+            monkeypatch.setattr(categorizer, name, getattr(categorizer, name))
+        categorizer.get_model()
+        assert categorizer.refresh_model(force=True)
+        categorizer.categorize([row("Uber ride")])
+        assert calls == [1, 1]
+    finally:
+        categorizer.configure()
+
+
+def test_prediction_from_a_replaced_model_is_not_cached(monkeypatch):
+    calls = []
+
+    def predict_during_reload(rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            # A reload swaps the model in and clears the cache meanwhile
+            categorizer.cache.clear()
+            return ["old model"] * len(rows)
+        return ["new model"] * len(rows)
+
+    monkeypatch.setattr(categorizer, "predict_categories", predict_during_reload)
+    monkeypatch.setattr(categorizer, "refresh_model", lambda **kwargs: False)
+    categorizer.configure(cache_size=16, cache_mode="description")
+    try:
+        assert categorizer.categorize([row("Uber ride")]) == ["old model"]
+        assert categorizer.categorize([row("Uber ride")]) == ["new model"]
+        assert categorizer.categorize([row("Uber ride")]) == ["new model"]
+        assert calls == [1, 1]
+    finally:
+        categorizer.configure()
@@ -0,0 +1,138 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from collections import Counter
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select
+
+import aggregates
+import rebalance_shards
+import shards
+from app import app, db
+from models.user_model import User
+
+
+def test_shard_index_is_stable_balanced_and_moves_few_users():
+    users = range(1, 20001)
+    four = [shards.shard_index(user_id, 4) for user_id in users]
+    assert four == [shards.shard_index(user_id, 4) for user_id in users]
+    assert all(abs(n - 5000) < 300 for n in Counter(four).values())
+
+    # Growing to five shards moves about a fifth of the users, all onto the new one
+    five = [shards.shard_index(user_id, 5) for user_id in users]
+    moved = [new for old, new in zip(four, five) if old != new]
+    assert set(moved) == {4}
+    assert abs(len(moved) - 4000) < 300
+    assert all(shards.shard_index(user_id, 1) == 0 for user_id in users)
+
+
+def count_rows(engine, user_id):
+    with engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).where(aggregates.transaction_table.c.user_id == user_id)
+        ).scalar()
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    urls = [f"sqlite:///{tmp_path / f'shard{i}.db'}" for i in range(2)]
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+    shards.configure(urls)
+    try:
+        yield shards.shards
+    finally:
+        shards.configure(())
+        with app.app_context():
+            db.drop_all()
+
+
+def test_requests_use_the_users_shard(sharded):
+    # Two users who land on different shards
+    users = {}
+    with app.app_context():
+        n = 0
+        while len(users) < 2:
+            n += 1
+            user = User(username=f"sharded{n}")
+            user.set_password("12345")
+            db.session.add(user)
+            db.session.commit()
+            users.setdefault(sharded.index_for(user.id), (user.id, user.username))
+
+    recent = [(date.today() - timedelta(days=n)).isoformat() for n in range(3)]
+    for index, (user_id, username) in users.items():
+        with app.test_client() as client:
+            assert client.post(
+                "/login", json={"username": username, "password": "12345"}
+            ).status_code == 200
+            created = client.post("/transactions", json={
+                "amount": 1000.0, "description": "Salary", "type": "income", "date": recent[0]
+            })
+            assert created.status_code == 201
+            batch = client.post("/transactions/batch", json=[
+                {"amount": 20.0, "description": "Kaufland", "date": recent[1]},
+                {"amount": 30.0, "description": "Shell", "date": recent[2]},
+            ])
+            assert batch.status_code == 201
+
+            listed = client.get("/transactions")
+            assert listed.status_code == 200
+            assert {row["user_id"] for row in listed.get_json()} == {user_id}
+            assert len(listed.get_json()) == 3
+            prediction = client.get("/predict").get_json()
+            assert prediction["total_income"] == 1000.0
+
+            transaction_id = created.get_json()["id"]
+            response = client.patch(
+                f"/transactions/{transaction_id}/category",
+                json={"category": "salary", "remember": False},
+            )
+            assert response.status_code == 200
+
+        assert count_rows(sharded.engines[index], user_id) == 3
+        assert count_rows(sharded.engines[1 - index], user_id) == 0
+        with app.app_context():
+            assert count_rows(db.engine, user_id) == 0
+        with sharded.engines[index].connect() as conn:
+            assert aggregates.check(conn, user_id) == []
+
+
+def test_rebalance_moves_users_and_can_be_rerun(tmp_path):
+    old = shards.ShardSet([f"sqlite:///{tmp_path / 'shard0.db'}"])
+    new = shards.ShardSet([f"sqlite:///{tmp_path / f'shard{i}.db'}" for i in range(3)])
+    old.create_all()
+    new.create_all()
+    with old.engines[0].begin() as conn:
+        for user_id in range(1, 31):
+            conn.execute(insert(aggregates.transaction_table), [
+                {"user_id": user_id, "description": f"Row {n}", "amount": 10.0 + n,
+                 "category": "food", "type": "spending", "date": date(2025, 5, 1 + n)}
+                for n in range(user_id % 4 + 1)
+            ])
+        aggregates.rebuild(conn)
+
+    report = rebalance_shards.rebalance(old.engines, new)
+    expected = [u for u in range(1, 31) if new.index_for(u) != 0]
+    assert report["users_seen"] == 30
+    assert report["users_moved"] == len(expected) > 0
+    assert report["transactions_moved"] == sum(u % 4 + 1 for u in expected)
+    for user_id in range(1, 31):
+        shard = new.engines[new.index_for(user_id)]
+        assert count_rows(shard, user_id) == user_id % 4 + 1
+        with shard.connect() as conn:
+            assert aggregates.check(conn, user_id) == []
+            assert aggregates.data_version(conn, user_id) != 0
+        # shard0.db is both the old and a new shard: only its own users stay
+        if user_id in expected:
+            assert count_rows(new.engines[0], user_id) == 0
+
+    # Everyone is in place now
+    again = rebalance_shards.rebalance(new.engines, new)
+    assert again["users_seen"] == 30 and again["users_moved"] == 0
+    old.dispose()
+    new.dispose()
@@ -0,0 +1,141 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import random
+import threading
+import time
+from datetime import datetime
+
+import joblib
+import pytest
+from sqlalchemy import create_engine, insert
+
+import categorizer
+import train_expense_model as training
+from aggregates import transaction_table
+from generate_training_data import generate_history
+from models.user_model import User
+
+
+@pytest.fixture
+def conn():
+    engine = create_engine("sqlite://")
+    User.__table__.create(engine)
+    transaction_table.create(engine)
+    with engine.connect() as connection:
+        yield connection
+    engine.dispose()
+
+
+def add_rows(conn, start, end, seed):
+    rows = [
+        {**row, "date": datetime.fromisoformat(row["date"]).date(), "user_id": 1}
+        for row in generate_history(start, end, rng=random.Random(seed))
+    ]
+    conn.execute(insert(transaction_table), rows)
+    conn.commit()
+    return len(rows)
+
+
+def test_full_then_incremental_training(conn, tmp_path):
+    path = str(tmp_path / "model.joblib")
+    add_rows(conn, datetime(2025, 1, 1), datetime(2025, 6, 30), seed=1)
+
+    metadata = training.train(conn, path=path, n_estimators=10, n_jobs=1)
+    assert metadata["mode"] == "full"
+    assert metadata["n_estimators"] == 10
+    assert metadata["accuracy"] > 0.9
+    assert "income" not in metadata["classes"]
+    pipeline = joblib.load(path)
+    assert pipeline.metadata_ == metadata
+    # Fitted on every core, but served single-threaded
+    assert pipeline.steps[-1][1].n_jobs is None
+    assert [p for p in os.listdir(tmp_path) if p.endswith(".tmp")] == []
+
+    assert training.train(conn, path=path, incremental=True) is None
+
+    add_rows(conn, datetime(2025, 7, 1), datetime(2025, 7, 31), seed=2)
+    updated = training.train(conn, path=path, incremental=True, add_trees=5, n_jobs=1)
+    assert updated["mode"] == "incremental"
+    assert updated["n_estimators"] == 15
+    assert updated["incremental_updates"] == 1
+    assert updated["last_transaction_id"] > metadata["last_transaction_id"]
+    assert len(joblib.load(path).steps[-1][1].estimators_) == 15
+
+
+def test_main_reads_the_default_database_from_the_instance_folder(tmp_path, monkeypatch):
+    instance = tmp_path / "instance"
+    instance.mkdir()
+    engine = create_engine(f"sqlite:///{instance / 'transactions.db'}")
+    User.__table__.create(engine)
+    transaction_table.create(engine)
+    with engine.connect() as connection:
+        add_rows(connection, datetime(2025, 1, 1), datetime(2025, 3, 31), seed=3)
+    engine.dispose()
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.delenv("SHARD_DATABASE_URLS", raising=False)
+    monkeypatch.setattr(training, "INSTANCE_DIR", str(instance))
+    monkeypatch.chdir(tmp_path)
+
+    model = tmp_path / "model.joblib"
+    assert training.main(["--output", str(model), "--trees", "5", "--jobs", "1"]) == 0
+    assert model.exists()
+    # Nothing created next to the working directory
+    assert not (tmp_path / "transactions.db").exists()
+
+
+def test_incremental_falls_back_to_full_fit_on_new_category(conn, tmp_path):
+    path = str(tmp_path / "model.joblib")
+    add_rows(conn, datetime(2025, 1, 1), datetime(2025, 3, 31), seed=1)
+    training.train(conn, path=path, n_estimators=10, n_jobs=1)
+
+    conn.execute(
+        insert(transaction_table),
+        [
+            {
+                "description": f"Vet visit {i}",
+                "amount": 40.0,
+                "category": "pets",
+                "type": "spending",
+                "date": datetime(2025, 4, 1 + i).date(),
+                "user_id": 1,
+            }
+            for i in range(10)
+        ],
+    )
+    conn.commit()
+    metadata = training.train(conn, path=path, incremental=True, n_estimators=10, n_jobs=1)
+    assert metadata["mode"] == "full"
+    assert "pets" in metadata["classes"]
+
+
+def test_changed_model_is_swapped_in_the_background(monkeypatch):
+    gate = threading.Event()
+    new_model = object()
+
+    def slow_read():
+        gate.wait(5)
+        return ("new",), (new_model, None)
+
+    monkeypatch.setattr(categorizer, "model", object())
+    monkeypatch.setattr(categorizer, "model_signature", ("old",))
+    monkeypatch.setattr(categorizer, "_loaded", (categorizer.model, None))
+    monkeypatch.setattr(categorizer, "_model_signature", lambda path: ("new",))
+    monkeypatch.setattr(categorizer, "_read_model", slow_read)
+    monkeypatch.setattr(categorizer, "_warm_up", lambda loaded: None)
+    old_model = categorizer.model
+    reloads = categorizer.reloads
+
+    assert categorizer.refresh_model(force=True, background=True)
+    # Requests keep the current model while the new one loads, and a second
+    # check does not start another load
+    assert categorizer.model is old_model
+    assert not categorizer.refresh_model(force=True, background=True)
+
+    gate.set()
+    deadline = time.monotonic() + 5
+    while categorizer.model is not new_model and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert categorizer.model is new_model
+    assert categorizer.reloads == reloads + 1
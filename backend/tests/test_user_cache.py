@@ -0,0 +1,41 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from user_cache import UserCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_lru_and_invalidation():
+    clock = FakeClock()
+    cache = UserCache(maxsize=2, ttl=10, clock=clock)
+    cache.put(1, {"id": 1})
+    cache.put(2, {"id": 2})
+    assert cache.get(1) == {"id": 1}
+    cache.put(3, {"id": 3})  # evicts 2, the least recently used
+    assert cache.get(2) is None
+
+    clock.now = 11
+    assert cache.get(1) is None
+    cache.put(3, {"id": 3})
+    cache.invalidate(3)
+    assert cache.get(3) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == stats["queries_saved"] == 1
+    assert stats["misses"] == 3
+    assert stats["expirations"] == 1
+    assert stats["invalidations"] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = UserCache(maxsize=0)
+    cache.put(1, {"id": 1})
+    assert cache.get(1) is None
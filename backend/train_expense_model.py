@@ -1,104 +1,405 @@
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.pipeline import make_pipeline
-from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-import joblib
-
-# 1. Simulated dataset
-data = [
-    {"amount": 5.20, "description": "Coffee at Starbucks", "category": "food", "date": "2025-05-02"},
-    {"amount": 12.00, "description": "Lunch at Subway", "category": "food", "date": "2025-05-03"},
-    {"amount": 7.50, "description": "Breakfast at McDonald's", "category": "food", "date": "2025-05-04"},
-    {"amount": 20.00, "description": "Dinner at Pizza Hut", "category": "food", "date": "2025-05-10"},
-    {"amount": 35.00, "description": "Groceries from Lidl", "category": "food", "date": "2025-05-05"},
-    {"amount": 50.00, "description": "Groceries from Billa", "category": "food", "date": "2025-05-19"},
-    {"amount": 100.00, "description": "Monthly grocery shopping", "category": "food", "date": "2025-05-01"},
-    {"amount": 2.60, "description": "Bus ticket", "category": "transport", "date": "2025-05-07"},
-    {"amount": 15.00, "description": "Monthly metro fee", "category": "transport", "date": "2025-05-01"},
-    {"amount": 18.00, "description": "Train to Plovdiv", "category": "transport", "date": "2025-05-18"},
-    {"amount": 22.00, "description": "Taxi ride downtown", "category": "transport", "date": "2025-05-15"},
-    {"amount": 35.00, "description": "Fuel at OMV", "category": "transport", "date": "2025-05-12"},
-    {"amount": 12.00, "description": "Uber ride to mall", "category": "transport", "date": "2025-05-09"},
-    {"amount": 9.99, "description": "Spotify monthly subscription", "category": "entertainment", "date": "2025-05-01"},
-    {"amount": 19.99, "description": "Netflix subscription", "category": "entertainment", "date": "2025-05-01"},
-    {"amount": 8.00, "description": "Movie ticket", "category": "entertainment", "date": "2025-05-11"},
-    {"amount": 25.00, "description": "Bowling night", "category": "entertainment", "date": "2025-05-17"},
-    {"amount": 30.00, "description": "Theatre play", "category": "entertainment", "date": "2025-05-23"},
-    {"amount": 65.00, "description": "Concert ticket", "category": "entertainment", "date": "2025-05-26"},
-    {"amount": 70.00, "description": "New running shoes", "category": "shopping", "date": "2025-05-06"},
-    {"amount": 120.00, "description": "Jacket from Zara", "category": "shopping", "date": "2025-05-08"},
-    {"amount": 35.00, "description": "T-shirt and jeans", "category": "shopping", "date": "2025-05-10"},
-    {"amount": 25.00, "description": "Cosmetics from DM", "category": "shopping", "date": "2025-05-15"},
-    {"amount": 200.00, "description": "Smartwatch from Technopolis", "category": "shopping", "date": "2025-05-20"},
-    {"amount": 49.00, "description": "Bluetooth speaker", "category": "shopping", "date": "2025-05-21"},
-    {"amount": 85.00, "description": "Electric bill", "category": "utilities", "date": "2025-05-04"},
-    {"amount": 60.00, "description": "Water bill", "category": "utilities", "date": "2025-05-08"},
-    {"amount": 45.00, "description": "Internet service", "category": "utilities", "date": "2025-05-10"},
-    {"amount": 30.00, "description": "Mobile phone plan", "category": "utilities", "date": "2025-05-11"},
-    {"amount": 110.00, "description": "Heating for the month", "category": "utilities", "date": "2025-05-05"},
-    {"amount": 35.00, "description": "Clinic check-up", "category": "health", "date": "2025-05-13"},
-    {"amount": 15.00, "description": "Pharmacy meds", "category": "health", "date": "2025-05-14"},
-    {"amount": 70.00, "description": "Dental cleaning", "category": "health", "date": "2025-05-16"},
-    {"amount": 55.00, "description": "Optician visit", "category": "health", "date": "2025-05-21"},
-    {"amount": 25.00, "description": "Therapy session", "category": "health", "date": "2025-05-28"},
-    {"amount": 400.00, "description": "Monthly rent", "category": "housing", "date": "2025-05-01"},
-    {"amount": 850.00, "description": "Apartment rental payment", "category": "housing", "date": "2025-05-01"},
-    {"amount": 200.00, "description": "Property tax", "category": "housing", "date": "2025-05-02"},
-    {"amount": 60.00, "description": "Maintenance fee", "category": "housing", "date": "2025-05-03"},
-    {"amount": 250.00, "description": "Home insurance", "category": "housing", "date": "2025-05-04"},
-    {"amount": 1500.00, "description": "Monthly salary", "category": "income", "date": "2025-05-01"},
-    {"amount": 400.00, "description": "Freelance payment", "category": "income", "date": "2025-05-15"},
-    {"amount": 800.00, "description": "Project bonus", "category": "income", "date": "2025-05-22"},
-    {"amount": 200.00, "description": "Sold old laptop", "category": "income", "date": "2025-05-19"},
-    {"amount": 100.00, "description": "Refund from Amazon", "category": "income", "date": "2025-05-14"},
-    {"amount": 25.00, "description": "Online course fee", "category": "education", "date": "2025-05-06"},
-    {"amount": 12.00, "description": "Textbook purchase", "category": "education", "date": "2025-05-07"},
-    {"amount": 150.00, "description": "Tuition payment", "category": "education", "date": "2025-05-10"},
-    {"amount": 9.99, "description": "Coursera subscription", "category": "education", "date": "2025-05-01"},
-    {"amount": 35.00, "description": "Language course", "category": "education", "date": "2025-05-11"},
-    {"amount": 18.00, "description": "Haircut", "category": "personal", "date": "2025-05-12"},
-    {"amount": 40.00, "description": "Gym membership", "category": "personal", "date": "2025-05-01"},
-    {"amount": 25.00, "description": "Massage session", "category": "personal", "date": "2025-05-20"},
-    {"amount": 70.00, "description": "Manicure and pedicure", "category": "personal", "date": "2025-05-16"},
-    {"amount": 8.00, "description": "Barbershop", "category": "personal", "date": "2025-05-27"}
-]
-
-
-#df = pd.DataFrame(data)
-df = pd.read_csv("transactions.csv")
-
-# 2. Convert 'date' column to datetime
-df["date"] = pd.to_datetime(df["date"])
-
-# 3. Extract temporal features
-df["day"] = df["date"].dt.day
-df["weekday"] = df["date"].dt.weekday  # 0 = Monday
-df["month"] = df["date"].dt.month
-
-# 4. Select features and target
-X = df[["amount", "description", "day", "weekday", "month"]]
-y = df["category"]
-
-# 5. Define column transformer (numeric + text + time features)
-preprocessor = ColumnTransformer(
-    transformers=[
-        ("num", StandardScaler(), ["amount", "day", "weekday", "month"]),
-        ("text", TfidfVectorizer(), "description")
-    ]
-)
-
-# 6. Build pipeline: preprocess + classifier
-pipeline = make_pipeline(preprocessor, RandomForestClassifier(n_estimators=100, random_state=42))
-
-# 7. Train/test split
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# 8. Fit model
-pipeline.fit(X_train, y_train)
-
-# 9. Save trained model
-joblib.dump(pipeline, "model.joblib")
-print("✅ Model trained with temporal and textual features. Saved as model.joblib.")
\ No newline at end of file
+"""Train the expense categorization model and publish it to running servers.
+
+    python train_expense_model.py                  # full fit from DATABASE_URL
+                                                   # (or every SHARD_DATABASE_URLS shard)
+    python train_expense_model.py --incremental    # add trees for new transactions
+    python train_expense_model.py --csv transactions.csv
+    python train_expense_model.py --engine linear  # train the hashing + SGD engine
+    python train_expense_model.py --info           # show the current model's metadata
+
+Transactions are streamed from the database ``CHUNK_ROWS`` at a time into
+compact columns, so the ORM never holds the table. ``--engine`` picks what is
+trained (see engines.py) and each engine has its own model file. The fit
+uses every core (``n_jobs=-1``) and the model is saved with ``n_jobs`` reset,
+so serving does not fan single-row predictions out to a thread pool.
+
+``--incremental`` keeps the fitted preprocessor and updates the classifier
+(``--add-trees`` more trees for the forest, a ``partial_fit`` pass for the
+linear engine) on the transactions added since the last run, mixed with a
+sample of older ones so every category stays represented.
+If a category appears or disappears, or after ``MAX_INCREMENTAL_UPDATES``
+updates in a row, it falls back to a full fit. So does a sharded database:
+ids are per shard, so "added since the last run" has no single cut-off.
+
+Every run holds back one transaction in ``HOLDOUT_MODULUS`` (by id, so runs
+agree on the split), reports accuracy on it and stores the training
+metadata on the model (``categorizer.model_info()``). The file is written
+next to the target and moved into place with ``os.replace``. Running workers
+notice the new file within ``categorizer.MODEL_CHECK_INTERVAL`` seconds and
+swap it in from a background thread (see ``categorizer.refresh_model``).
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import create_engine, select
+
+import database
+import engines
+from features import FEATURE_COLUMNS, temporal_features
+
+CHUNK_ROWS = 10_000
+N_ESTIMATORS = 100
+# Trees added per incremental update and older transactions replayed with
+# the new ones
+ADD_TREES = 20
+REPLAY_ROWS = 5_000
+MAX_INCREMENTAL_UPDATES = 10
+# Transactions whose id is a multiple of this are held out for accuracy
+HOLDOUT_MODULUS = 5
+# Relative SQLite paths are resolved here, as the app's instance_path does
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance")
+
+
+class Columns:
+    """Training rows accumulated chunk by chunk as flat arrays."""
+
+    def __init__(self):
+        self.ids = []
+        self.amounts = []
+        self.descriptions = []
+        self.dates = []
+        self.categories = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def extend(self, rows):
+        for id_, description, amount, category, day in rows:
+            self.ids.append(id_)
+            self.descriptions.append(description)
+            self.amounts.append(amount)
+            self.categories.append(category)
+            self.dates.append(day)
+
+    def take(self, indexes):
+        taken = Columns()
+        for name in ("ids", "amounts", "descriptions", "dates", "categories"):
+            values = getattr(self, name)
+            setattr(taken, name, [values[i] for i in indexes])
+        return taken
+
+    def frame(self):
+        """The model input frame and the category labels."""
+        import pandas as pd
+
+        day, weekday, month = temporal_features(self.dates)
+        frame = pd.DataFrame(
+            {
+                "amount": np.asarray(self.amounts, dtype=np.float64),
+                "description": self.descriptions,
+                "day": day,
+                "weekday": weekday,
+                "month": month,
+            }
+        )
+        return frame[FEATURE_COLUMNS], np.asarray(self.categories, dtype=object)
+
+
+def stream_transactions(conn, after_id=0, chunk_rows=CHUNK_ROWS):
+    """Yield lists of (id, description, amount, category, date) rows with id > ``after_id``.
+
+    Income rows are left out: ``categorizer.categorize`` never asks the
+    model about them.
+    """
+    from aggregates import transaction_table
+
+    t = transaction_table.c
+    stmt = (
+        select(t.id, t.description, t.amount, t.category, t.date)
+        .where(t.id > after_id, t.type != "income")
+        .order_by(t.id)
+    )
+    result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(stmt)
+    for chunk in result.partitions():
+        yield chunk
+
+
+def stream_csv(path, chunk_rows=CHUNK_ROWS):
+    """Yield the same rows from a CSV export; ids are 1-based data line numbers."""
+    import pandas as pd
+
+    next_id = 1
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        dates = [datetime.fromisoformat(value).date() for value in chunk["date"].astype(str)]
+        ids = range(next_id, next_id + len(chunk))
+        next_id += len(chunk)
+        rows = zip(
+            ids, chunk["description"], chunk["amount"].astype(float), chunk["category"], dates
+        )
+        yield [row for row in rows if row[3] != "income"]
+
+
+def load_columns(chunks, replay=None, rng=None):
+    """Collect ``chunks`` into Columns.
+
+    With ``replay`` set, keep a uniform reservoir sample of that many rows
+    instead of all of them, so memory stays bounded on any table size.
+    """
+    columns = Columns()
+    if replay is None:
+        for chunk in chunks:
+            columns.extend(chunk)
+        return columns
+    rng = rng or random.Random(0)
+    sample = []
+    seen = 0
+    for chunk in chunks:
+        for row in chunk:
+            seen += 1
+            if len(sample) < replay:
+                sample.append(row)
+            else:
+                j = rng.randrange(seen)
+                if j < replay:
+                    sample[j] = row
+    columns.extend(sample)
+    return columns
+
+
+def split_holdout(columns):
+    """(train, test) split on transaction id."""
+    test = [i for i, id_ in enumerate(columns.ids) if id_ % HOLDOUT_MODULUS == 0]
+    held = set(test)
+    train = [i for i in range(len(columns)) if i not in held]
+    return columns.take(train), columns.take(test)
+
+
+def accuracy(pipeline, test):
+    if not len(test):
+        return None
+    features, labels = test.frame()
+    return float(np.mean(pipeline.predict(features) == labels))
+
+
+def fit_full(columns, engine, n_estimators=N_ESTIMATORS, n_jobs=-1, random_state=42):
+    train, test = split_holdout(columns)
+    features, labels = train.frame()
+    pipeline = engine.build(n_estimators=n_estimators, n_jobs=n_jobs, random_state=random_state)
+    started = time.perf_counter()
+    pipeline.fit(features, labels)
+    seconds = time.perf_counter() - started
+    return pipeline, {
+        "mode": "full",
+        "rows": len(train),
+        "holdout_rows": len(test),
+        "train_seconds": round(seconds, 3),
+        "accuracy": accuracy(pipeline, test),
+        "incremental_updates": 0,
+    }
+
+
+def fit_incremental(pipeline, engine, new, replay, add_trees=ADD_TREES, n_jobs=-1):
+    """Update ``pipeline`` with ``new`` plus ``replay``; None if a full fit is needed."""
+    classifier = pipeline.steps[-1][1]
+    previous = getattr(pipeline, "metadata_", None) or {}
+    if previous.get("incremental_updates", 0) >= MAX_INCREMENTAL_UPDATES:
+        return None
+    train, test = split_holdout(new)
+    old_train, old_test = split_holdout(replay)
+    for target, extra in ((train, old_train), (test, old_test)):
+        for name in ("ids", "amounts", "descriptions", "dates", "categories"):
+            getattr(target, name).extend(getattr(extra, name))
+    # Existing trees (or weight rows) score classifier.classes_, so the
+    # update must use the same set
+    if set(train.categories) != set(classifier.classes_):
+        return None
+
+    features, labels = train.frame()
+    started = time.perf_counter()
+    engine.grow(pipeline, features, labels, add_trees=add_trees, n_jobs=n_jobs)
+    seconds = time.perf_counter() - started
+    return pipeline, {
+        "mode": "incremental",
+        "rows": len(train),
+        "holdout_rows": len(test),
+        "train_seconds": round(seconds, 3),
+        "accuracy": accuracy(pipeline, test),
+        "incremental_updates": previous.get("incremental_updates", 0) + 1,
+    }
+
+
+def save(pipeline, metadata, path, engine):
+    """Write ``pipeline`` with ``metadata`` to ``path`` atomically."""
+    import joblib
+
+    engine.finalize(pipeline)
+    classifier = pipeline.steps[-1][1]
+    pipeline.metadata_ = {
+        **metadata,
+        "engine": engine.name,
+        "n_estimators": getattr(classifier, "n_estimators", None),
+        "classes": [str(c) for c in classifier.classes_],
+        "trained_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".model-", suffix=".tmp", dir=directory)
+    try:
+        # mkstemp creates the file owner-only; servers may run as another user
+        umask = os.umask(0)
+        os.umask(umask)
+        os.fchmod(fd, 0o666 & ~umask)
+        with os.fdopen(fd, "wb") as f:
+            joblib.dump(pipeline, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return pipeline.metadata_
+
+
+def train(
+    conn=None,
+    csv_path=None,
+    path=None,
+    engine=engines.DEFAULT_ENGINE,
+    incremental=False,
+    n_estimators=N_ESTIMATORS,
+    add_trees=ADD_TREES,
+    replay_rows=REPLAY_ROWS,
+    n_jobs=-1,
+):
+    """Train ``engine`` from ``conn`` (or ``csv_path``) and save it; return the metadata.
+
+    ``conn`` may be a list with a connection per shard. ``path`` defaults to
+    the engine's model file. Returns None when an incremental run finds no
+    new transactions.
+    """
+    import joblib
+
+    engine = engines.get(engine)
+    path = path or engine.path
+    conns = conn if isinstance(conn, (list, tuple)) else [conn]
+
+    def chunks(after_id=0):
+        if csv_path:
+            return (
+                [row for row in chunk if row[0] > after_id] for chunk in stream_csv(csv_path)
+            )
+        return (chunk for c in conns for chunk in stream_transactions(c, after_id))
+
+    source = csv_path or "database"
+    if incremental and len(conns) == 1 and os.path.exists(path):
+        pipeline = joblib.load(path)
+        last_id = (getattr(pipeline, "metadata_", None) or {}).get("last_transaction_id")
+        if last_id is not None and engines.for_pipeline(pipeline) is engine:
+            new = load_columns(chunks(last_id))
+            if not len(new):
+                return None
+            replay = load_columns(
+                ([row for row in chunk if row[0] <= last_id] for chunk in chunks()),
+                replay=max(replay_rows, len(new)),
+            )
+            fitted = fit_incremental(pipeline, engine, new, replay, add_trees, n_jobs)
+            if fitted is not None:
+                pipeline, metadata = fitted
+                return save(
+                    pipeline,
+                    {**metadata, "source": source, "last_transaction_id": max(new.ids)},
+                    path,
+                    engine,
+                )
+
+    columns = load_columns(chunks())
+    if not len(columns):
+        raise ValueError("No transactions to train on")
+    pipeline, metadata = fit_full(columns, engine, n_estimators, n_jobs)
+    return save(
+        pipeline,
+        {**metadata, "source": source, "last_transaction_id": max(columns.ids)},
+        path,
+        engine,
+    )
+
+
+def _print_metadata(metadata):
+    for key, value in metadata.items():
+        if key != "classes":
+            print(f"  {key}: {value}")
+    print(f"  classes: {', '.join(metadata.get('classes', []))}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", help="train from this CSV instead of DATABASE_URL")
+    parser.add_argument(
+        "--engine",
+        choices=sorted(engines.ENGINES),
+        default=engines.DEFAULT_ENGINE,
+        help="model to train (see engines.py)",
+    )
+    parser.add_argument("--output", help="model file to write (default: the engine's)")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="warm-start the existing model with transactions added since it was trained",
+    )
+    parser.add_argument("--trees", type=int, default=N_ESTIMATORS, help="trees in a full fit")
+    parser.add_argument(
+        "--add-trees", type=int, default=ADD_TREES, help="trees added by --incremental"
+    )
+    parser.add_argument("--jobs", type=int, default=-1, help="fitting processes (-1 = all cores)")
+    parser.add_argument("--info", action="store_true", help="print the model's metadata and exit")
+    args = parser.parse_args(argv)
+
+    output = args.output or engines.get(args.engine).path
+    if args.info:
+        import joblib
+
+        metadata = getattr(joblib.load(output), "metadata_", None)
+        if metadata is None:
+            print(f"{output} has no training metadata (trained before it was recorded).")
+            return 1
+        print(f"{output}:")
+        _print_metadata(metadata)
+        return 0
+
+    options = dict(
+        csv_path=args.csv,
+        path=output,
+        engine=args.engine,
+        incremental=args.incremental,
+        n_estimators=args.trees,
+        add_trees=args.add_trees,
+        n_jobs=args.jobs,
+    )
+    try:
+        if args.csv:
+            metadata = train(**options)
+        else:
+            import shards
+
+            urls = shards.parse_urls(os.environ.get("SHARD_DATABASE_URLS")) or [
+                database.database_url()
+            ]
+            urls = [shards.resolve_url(url, INSTANCE_DIR) for url in urls]
+            sources = [create_engine(url, **database.engine_options(url)) for url in urls]
+            try:
+                with contextlib.ExitStack() as stack:
+                    conns = [stack.enter_context(e.connect()) for e in sources]
+                    metadata = train(conns if len(conns) > 1 else conns[0], **options)
+            finally:
+                for source in sources:
+                    source.dispose()
+    except ValueError as exc:
+        print(f"❌ {exc}.")
+        return 1
+    if metadata is None:
+        print("✅ No new transactions since the last training run; model unchanged.")
+        return 0
+    print(f"✅ Model trained ({metadata['engine']}, {metadata['mode']}). Saved as {output}.")
+    _print_metadata(metadata)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
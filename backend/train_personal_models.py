@@ -0,0 +1,69 @@
+"""Train or refresh every user's personal categorization model.
+
+    python train_personal_models.py              # every user
+    python train_personal_models.py --user NAME  # one user
+    python train_personal_models.py --stale      # users with new corrections
+
+Users with fewer than personal_models.MIN_ROWS transactions get no model
+(and lose any stored one). Corrections mark a user's model stale and the
+serving workers retrain it in the background; ``--stale`` does that here,
+e.g. with PERSONAL_MODEL_RETRAIN_INTERVAL=0. Train everyone after bulk
+imports or when turning PERSONAL_MODELS on.
+"""
+
+import argparse
+import sys
+import time
+
+import personal_models
+from app import app, db
+from models.personal_categorizer_model import PersonalCategorizer
+from models.user_model import User
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    which = parser.add_mutually_exclusive_group()
+    which.add_argument("--user", help="username to limit the operation to")
+    which.add_argument(
+        "--stale", action="store_true", help="only retrain models marked stale by corrections"
+    )
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        db.create_all()
+        if args.stale:
+            started = time.perf_counter()
+            retrained = personal_models.retrain_stale(db.session)
+            print(
+                f"✅ Retrained {retrained} stale models in "
+                f"{time.perf_counter() - started:.2f} s."
+            )
+            return 0
+        query = db.select(User.id)
+        if args.user:
+            query = query.where(User.username == args.user)
+        user_ids = db.session.execute(query).scalars().all()
+        if args.user and not user_ids:
+            print(f"❌ No user found with username '{args.user}'.")
+            return 1
+
+        started = time.perf_counter()
+        trained = 0
+        for user_id in user_ids:
+            if personal_models.train(db.session, user_id) is not None:
+                trained += 1
+            db.session.commit()
+        elapsed = time.perf_counter() - started
+        stored = db.session.execute(
+            db.select(db.func.count(), db.func.sum(db.func.length(PersonalCategorizer.payload)))
+        ).one()
+    print(
+        f"✅ Trained {trained} of {len(user_ids)} users in {elapsed:.2f} s; "
+        f"{stored[0]} models stored, {(stored[1] or 0) / 1024:.1f} KB in total."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Short-lived cache of the users flask-login loads on every request.
+
+``load(session, user_id)`` answers from the cache by merging a detached copy
+of the user into the session with ``load=False``, which costs no query. Any
+flushed change to a user (a new password, a deletion) drops its entry, and
+logout drops it too. Entries expire after ``ttl`` seconds, which bounds how
+long other worker processes can serve a stale copy.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from models.user_model import User
+
+
+def snapshot(user):
+    """The user's column values, enough to rebuild it without a query."""
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+class UserCache:
+    """Thread-safe LRU of user id -> column values, with a time-to-live."""
+
+    def __init__(self, maxsize=1024, ttl=30.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, user_id):
+        now = self.clock()
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is not None and entry[0] <= now:
+                del self._data[user_id]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id, values):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[user_id] = (self.clock() + self.ttl, values)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._data.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                # Every hit is a SELECT the user loader did not run
+                "queries_saved": self.hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+cache = UserCache()
+
+
+def configure(maxsize=1024, ttl=30.0):
+    """Replace the cache; a size of 0 or a ttl of 0 turns it off."""
+    global cache
+    cache = UserCache(maxsize, ttl) if maxsize > 0 and ttl > 0 else None
+
+
+def load(session, user_id):
+    """Return the User with ``user_id`` attached to ``session``, or None."""
+    if cache is None:
+        return session.get(User, user_id)
+    values = cache.get(user_id)
+    if values is not None:
+        user = User(**values)
+        make_transient_to_detached(user)
+        return session.merge(user, load=False)
+    user = session.get(User, user_id)
+    if user is not None:
+        cache.put(user_id, snapshot(user))
+    return user
+
+
+def invalidate(user_id):
+    if cache is not None:
+        cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_flushed_users(session, flush_context):
+    # New users too, in case an id is reused after the table was reset
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            invalidate(obj.id)
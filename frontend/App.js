@@ -19,7 +19,7 @@ const defaultFetchOptions = {
 // Get current user information
 async function getCurrentUser() {
   try {
-    const response = await fetch(`${API_BASE_URL}/transactions`, {
+    const response = await fetch(`${API_BASE_URL}/transactions?limit=1&fields=id`, {
       method: "GET",
       headers: {
         "Content-Type": "application/json",
@@ -57,10 +57,43 @@ async function handleResponse(response) {
   return response;
 }
 
-// Load and display transactions
-async function loadTransactions() {
+// Columns rendered by the transaction list; keeps list responses small
+const TRANSACTION_FIELDS = "id,description,amount,category,type,date";
+const TRANSACTION_PAGE_SIZE = 50;
+
+function renderTransaction(transaction) {
+  const row = document.createElement("tr");
+  row.className = `transaction-row ${transaction.type}`;
+  const amount = Math.abs(transaction.amount).toFixed(2);
+  const date = new Date(transaction.date).toLocaleDateString('en-US', {
+    year: 'numeric',
+    month: 'short',
+    day: 'numeric'
+  });
+
+  row.innerHTML = `
+    <td class="transaction-description">
+      <span class="description">${transaction.description}</span>
+      <span class="category">${transaction.category || "Uncategorized"}</span>
+    </td>
+    <td class="transaction-amount ${transaction.type}">
+      ${transaction.type === "income" ? "+" : "-"}$${amount}
+    </td>
+    <td class="transaction-date">${date}</td>
+  `;
+  return row;
+}
+
+// Load and display transactions; pass a cursor to append the next page
+async function loadTransactions(cursor = null) {
   try {
-    const response = await fetch(`${API_BASE_URL}/transactions`, {
+    const params = new URLSearchParams({
+      limit: TRANSACTION_PAGE_SIZE,
+      fields: TRANSACTION_FIELDS
+    });
+    if (cursor) params.set("after", cursor);
+
+    const response = await fetch(`${API_BASE_URL}/transactions?${params}`, {
       method: "GET",
       headers: {
         "Content-Type": "application/json",
@@ -72,10 +105,13 @@ async function loadTransactions() {
     if (!handledResponse) return;
 
     const transactions = await handledResponse.json();
+    const nextCursor = handledResponse.headers.get("X-Next-Cursor");
     const transactionList = document.getElementById("transactionList");
-    transactionList.innerHTML = "";
+    const loadMore = document.getElementById("loadMoreTransactions");
+    if (loadMore) loadMore.remove();
+    if (!cursor) transactionList.innerHTML = "";
 
-    if (transactions.length === 0) {
+    if (!cursor && transactions.length === 0) {
       transactionList.innerHTML = `
         <div class="empty-state">
           <p>No transactions found. Add your first transaction!</p>
@@ -84,27 +120,18 @@ async function loadTransactions() {
     }
 
     transactions.forEach((transaction) => {
-      const row = document.createElement("tr");
-      row.className = `transaction-row ${transaction.type}`;
-      const amount = Math.abs(transaction.amount).toFixed(2);
-      const date = new Date(transaction.date).toLocaleDateString('en-US', {
-        year: 'numeric',
-        month: 'short',
-        day: 'numeric'
-      });
-
-      row.innerHTML = `
-        <td class="transaction-description">
-          <span class="description">${transaction.description}</span>
-          <span class="category">${transaction.category || "Uncategorized"}</span>
-        </td>
-        <td class="transaction-amount ${transaction.type}">
-          ${transaction.type === "income" ? "+" : "-"}$${amount}
-        </td>
-        <td class="transaction-date">${date}</td>
-      `;
-      transactionList.appendChild(row);
+      transactionList.appendChild(renderTransaction(transaction));
     });
+
+    if (nextCursor) {
+      const button = document.createElement("button");
+      button.id = "loadMoreTransactions";
+      button.className = "load-more-btn";
+      button.textContent = "Load more";
+      button.addEventListener("click", () => loadTransactions(nextCursor));
+      // Below the list, not inside it: only transaction rows go in there
+      transactionList.after(button);
+    }
   } catch (error) {
     console.error("Error loading transactions:", error);
     const transactionList = document.getElementById("transactionList");